@@ -0,0 +1,212 @@
+"""
+Headless batch report for the JV analysis (no Voila session needed).
+
+Examples:
+    python jv_report.py --folder D:/Data/Experiment --plots Bav,Bap,Hp,Cy
+    python jv_report.py --batch-ids UMR_Batch_1 UMR_Batch_2 --url http://localhost/nomad-oasis/api/v1 --per-batch
+
+The plot codes are the same as in gather_wanted_plots (B=Boxplot, J=Boxplot(omitted), H=Histogram, C=JV curve).
+Independent plots are rendered in a process pool, every worker writes its HTML/PNG files directly
+and the Excel sheets of all plots are collected into one 0_numerical_results.xlsx at the end.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly.io as pio
+
+import main
+from main import (
+    ExcelExport,
+    create_new_results_folder,
+    data_filter_setup,
+    find_and_list_files,
+    find_unique_values,
+    jv_frames_from_measurements,
+    load_files,
+    name_by_condition,
+    plotting_string_action,
+)
+
+DEFAULT_PLOTS = ["Bav", "Baj", "Baf", "Bap", "Hp", "Cy"]
+DEFAULT_FORMATS = ["html"]
+
+# Data of the report, set once per worker process by _init_worker
+_worker_state = {}
+
+
+def load_folder(folder):
+    return load_files(find_and_list_files(folder))
+
+
+def load_batches(url, token, batch_ids, store_path=None):
+    # api_calls and local_store live in the parent folder (voila_scripts)
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from api_calls import get_ids_in_batch
+    from local_store import LocalStore
+
+    sample_ids = get_ids_in_batch(url, token, batch_ids)
+    with LocalStore(store_path) if store_path else LocalStore.for_user(url, token) as store:
+        downloaded, removed = store.refresh(url, token, sample_ids, "jv")
+        print(f"{downloaded} JV measurements downloaded, {removed} removed.")
+        return jv_frames_from_measurements(store.iter_measurements("jv", sample_ids))
+
+
+def expand_plot_tasks(plot_list, samples):
+    # Plots per sample (Cx, Cd) are split into one task per sample, all other codes are one task each
+    tasks = []
+    for code in plot_list:
+        if "Cx" in code or "Cd" in code:
+            tasks.extend((code, [s]) for s in samples)
+        else:
+            tasks.append((code, samples))
+    return tasks
+
+
+def _init_worker(data, supp, output_folder, formats):
+    # Outputs are written by _render_task, the plot functions must not write on their own
+    main.WRITE_OUTPUT_FILES = False
+    # The grouped statistics are shared by all tasks of this worker
+    _worker_state.update(data=data, supp=supp, output_folder=output_folder, formats=formats, stats_cache={})
+
+
+def _safe_file_name(name):
+    return name.replace("/", "_").replace("\\", "_").replace(":", "_")
+
+
+def _render_task(task):
+    code, samples = task
+    data = _worker_state["data"]
+    omitted_jv, filter_pars, is_conditions, path, _ = _worker_state["supp"]
+    supp = [omitted_jv, filter_pars, is_conditions, path, samples]
+
+    # Every task gets its own export, the sheets are merged in the main process
+    wb = ExcelExport()
+    written = []
+    try:
+        figs, names, wb = plotting_string_action([code], wb, data, supp, stats_cache=_worker_state["stats_cache"])
+        for fig, name in zip(figs, names):
+            base = os.path.join(_worker_state["output_folder"], _safe_file_name(name).rsplit(".", 1)[0])
+            if "html" in _worker_state["formats"]:
+                fig.write_html(base + ".html")
+                written.append(base + ".html")
+            if "png" in _worker_state["formats"]:
+                try:
+                    pio.write_image(fig, base + ".png")  # needs kaleido
+                    written.append(base + ".png")
+                except Exception as e:
+                    print(f"Note: Could not save {name} as PNG: {e}")
+    except Exception as e:
+        return code, written, ExcelExport(), f"{type(e).__name__}: {e}"
+
+    return code, written, wb, None
+
+
+def create_report(jvc_data, cur_data, output_folder, plot_list=None, filter_list=None, conditions=None,
+                  formats=None, max_workers=None):
+    """
+    Renders all requested plots of one data set and writes them to output_folder.
+
+    Returns:
+    - list of written files and list of (plot code, error) for plots that failed.
+    """
+    plot_list = plot_list or DEFAULT_PLOTS
+    formats = formats or DEFAULT_FORMATS
+    os.makedirs(output_folder, exist_ok=True)
+
+    if jvc_data.empty:
+        print(f"No JV data found, nothing written to {output_folder}")
+        return [], []
+
+    unique_vals = find_unique_values(jvc_data)
+    is_conditions = bool(conditions)
+    if is_conditions:
+        if len(conditions) != len(unique_vals):
+            raise ValueError(f"{len(conditions)} conditions given for {len(unique_vals)} samples")
+        jvc_data = name_by_condition(jvc_data, unique_vals, conditions)
+        cur_data = name_by_condition(cur_data, unique_vals, conditions)
+    jvc_filtered, junk, filter_vals = data_filter_setup(jvc_data, filter_list)
+
+    data = [jvc_filtered, jvc_data, cur_data]
+    samples = cur_data["sample"].unique().tolist()
+    supp = [junk, filter_vals, is_conditions, output_folder, samples]
+    tasks = expand_plot_tasks(plot_list, samples)
+
+    written, errors = [], []
+    export = ExcelExport(os.path.join(output_folder, "0_numerical_results.xlsx"))
+    export.add_dataframe_sheet('All_data', jvc_data)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(data, supp, output_folder, formats)) as executor:
+        # map keeps the order of the plot list, so the Excel sheets are in the requested order
+        for code, files, task_export, error in executor.map(_render_task, tasks):
+            written.extend(files)
+            export.update(task_export)
+            if error:
+                errors.append((code, error))
+                print(f"Plot {code} failed: {error}")
+
+    if "excel" in formats:
+        export.save()
+        written.append(export.file_path)
+
+    return written, errors
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Create JV analysis reports without a Voila session.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--folder", help="Folder with JV_*.txt / *JV_*.csv exports")
+    source.add_argument("--batch-ids", nargs="+", help="Lab IDs of batches in NOMAD")
+    parser.add_argument("--url", help="NOMAD API url, e.g. http://localhost/nomad-oasis/api/v1")
+    parser.add_argument("--token", default=os.environ.get("NOMAD_TOKEN"),
+                        help="NOMAD access token (default: environment variable NOMAD_TOKEN)")
+    parser.add_argument("--store", help="Path of the local SQLite store for downloaded JV entries (default: one store per url and user)")
+    parser.add_argument("--per-batch", action="store_true", help="Write one report per batch into subfolders")
+    parser.add_argument("--plots", default=",".join(DEFAULT_PLOTS),
+                        help="Comma separated plot codes like in the interactive mode (default: %(default)s)")
+    parser.add_argument("--filter", nargs=3, action="append", metavar=("COLUMN", "OPERATOR", "VALUE"),
+                        help='Filter condition, can be repeated, e.g. --filter "PCE(%%)" "<" 40')
+    parser.add_argument("--conditions", help="Comma separated conditions in the order of the samples")
+    parser.add_argument("--formats", default="html,excel", help="Comma separated: html, png, excel")
+    parser.add_argument("--output", help="Output folder (default: <folder>/Results or ./Results)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    if args.batch_ids and not args.url:
+        parser.error("--url is required together with --batch-ids")
+    return args
+
+
+def run(args):
+    plot_list = args.plots.replace(" ", "").split(",")
+    formats = [f.strip().lower() for f in args.formats.split(",") if f.strip()]
+    conditions = [c.strip() for c in args.conditions.split(",")] if args.conditions else None
+    filter_list = [tuple(f) for f in args.filter] if args.filter else None
+    options = dict(plot_list=plot_list, filter_list=filter_list, conditions=conditions, formats=formats,
+                   max_workers=args.workers)
+
+    if args.folder:
+        output = args.output or create_new_results_folder(os.path.join(args.folder, ""))
+        jvc_data, cur_data = load_folder(args.folder)
+        reports = [(output, jvc_data, cur_data)]
+    elif args.per_batch:
+        output = args.output or "Results"
+        # Generator, so only the data of one batch is in memory at a time
+        reports = ((os.path.join(output, batch_id), *load_batches(args.url, args.token, [batch_id], args.store))
+                   for batch_id in args.batch_ids)
+    else:
+        output = args.output or "Results"
+        reports = [(output, *load_batches(args.url, args.token, args.batch_ids, args.store))]
+
+    failed = False
+    for output_folder, jvc_data, cur_data in reports:
+        written, errors = create_report(jvc_data, cur_data, output_folder, **options)
+        print(f"{len(written)} files written to {output_folder}")
+        failed = failed or bool(errors)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -1,12 +1,15 @@
 __author__ = "Edgar Nandayapa"
 __version__ = "v0.0.1 2023"
 
+import io
 import operator
 import os
 import re
 
 # from openpyxl.styles import Font
 import warnings
+import weakref
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
 
 import numpy as np
@@ -17,7 +20,6 @@ import openpyxl
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.io as pio
-from openpyxl import load_workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 from plotly.subplots import make_subplots
 
@@ -34,6 +36,31 @@ def is_running_in_jupyter():
 
 pio.renderers.default = 'notebook' if is_running_in_jupyter() else 'browser'
 
+# Plot and Excel functions write their files themselves when run as a script.
+# None -> only outside of Jupyter, headless reports (jv_report.py) set it to False and write the outputs on their own
+WRITE_OUTPUT_FILES = None
+
+
+def should_write_files():
+    if WRITE_OUTPUT_FILES is None:
+        return not is_running_in_jupyter()
+    return WRITE_OUTPUT_FILES
+
+
+# Parallel loading only pays off for larger folders, small ones are read in-process
+LOAD_FILES_MIN_PARALLEL = 50
+LOAD_FILES_MAX_WORKERS = None  # None -> os.cpu_count()
+
+# Large figures: above this number of points line plots are drawn with WebGL (Scattergl) instead of SVG
+WEBGL_POINT_THRESHOLD = 20000
+# Boxes with more values only show their outliers and a summary instead of every point (None -> always all points)
+BOXPLOT_MAX_POINTS_PER_BOX = 2000
+# Points of the common voltage grid for the hysteresis area (same as in the NOMAD plugin)
+HYSTERESIS_GRID_POINTS = 200
+
+# Rows of a DataFrame that are converted at once when writing the Excel results
+EXCEL_CHUNK_SIZE = 5000
+
 
 def find_and_list_files(folder_path):
     file_patterns = ["JV_*.txt", "**/*JV_*.csv", "**/*JV_*.txt"]
@@ -45,28 +72,36 @@ def find_and_list_files(folder_path):
     return file_list
 
 
-def load_files(file_list):
+def load_files(file_list, max_workers=LOAD_FILES_MAX_WORKERS):
     # Consolidate file patterns for searching
     file_list.sort(key=natural_keys)
     # file_list = sorted(file_list, key=lambda x: int(x.split('\\')[-1].replace('JV_', '').replace('.txt', '')))
 
-    # Initialize empty DataFrames for merged results
-    jv_chars_merged = pd.DataFrame()
-    curves_merged = pd.DataFrame()
-
-    # Process each file
-    for file_path in file_list:
-        try:
-            # Extract JV Characteristics and JV curve from the file
-            jv_chars, jv_curve = process_file(file_path)
-            # Merge data into cumulative DataFrames
-            jv_chars_merged = pd.concat([jv_chars_merged, jv_chars],
-                                        ignore_index=True) if not jv_chars.empty else jv_chars_merged
-            curves_merged = pd.concat([curves_merged, jv_curve]) if not jv_curve.empty else curves_merged
-
-        except Exception as e:  # Catch all exceptions to avoid stopping the loop
-            print(f"Error processing {file_path}: {e}")
+    # Parse files (in a process pool for large folders), results keep the order of file_list
+    if len(file_list) >= LOAD_FILES_MIN_PARALLEL:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_process_file_safe, file_list, chunksize=16))
+    else:
+        results = [_process_file_safe(file_path) for file_path in file_list]
+
+    # Collect all frames first and concatenate only once (concat inside the loop is quadratic)
+    jv_chars_list = []
+    curves_list = []
+    for file_path, jv_chars, jv_curve, error in results:
+        if error is not None:
+            print(f"Error processing {file_path}: {error}")
+            continue
+        if not jv_chars.empty:
+            jv_chars_list.append(jv_chars)
+        if not jv_curve.empty:
+            curves_list.append(jv_curve)
+
+    jv_chars_merged = pd.concat(jv_chars_list, ignore_index=True) if jv_chars_list else pd.DataFrame()
+    curves_merged = pd.concat(curves_list) if curves_list else pd.DataFrame()
     curves_merged = curves_merged.reset_index()
+    # The exported files have no hysteresis, it is calculated like in NOMAD
+    if not jv_chars_merged.empty:
+        jv_chars_merged = add_hysteresis(jv_chars_merged, curves_merged)
     # Check if data was successfully loaded
     if jv_chars_merged.empty and curves_merged.empty:
         print("One of the files has an issue.")
@@ -74,6 +109,146 @@ def load_files(file_list):
     return jv_chars_merged, curves_merged
 
 
+def _process_file_safe(file_path):
+    # Worker for load_files: errors are returned instead of raised so one broken file does not stop the pool
+    try:
+        jv_chars, jv_curve = process_file(file_path)
+        return file_path, jv_chars, jv_curve, None
+    except Exception as e:  # Catch all exceptions to avoid stopping the loop
+        return file_path, None, None, str(e)
+
+
+def jv_frames_from_measurements(measurements):
+    """
+    Builds the JV characteristics and JV curve DataFrames from NOMAD JV entries.
+
+    Parameters:
+    - measurements: iterable of (lab_id, data, metadata) as returned by LocalStore.iter_measurements.
+
+    Returns:
+    - DataFrames in the same layout as load_files.
+    """
+    columns_jvc = ['Voc(V)', 'Jsc(mA/cm2)', 'FF(%)', 'PCE(%)', 'V_mpp(V)', 'J_mpp(mA/cm2)',
+                   'P_mpp(mW/cm2)', 'R_series(Ohmcm2)', 'R_shunt(Ohmcm2)', 'sample', 'batch',
+                   'condition', 'cell', 'direction', 'ilum', 'HI(%)', 'Hysteresis_area(mW/cm2)']
+    columns_cur = ['index', 'sample', 'batch', 'condition', 'variable', 'cell', 'direction', 'ilum']
+    rows_jvc = []
+    rows_cur = []
+    max_points = 0
+    without_arrays = 0
+
+    for sid, jv_data, jv_md in measurements:
+        # Hysteresis is calculated per measurement (reverse vs. forward scan) when the entry is parsed in NOMAD,
+        # it is only given on the light reverse row, so every measurement counts once in the statistics
+        hysteresis_index = jv_data.get("hysteresis_index")
+        hysteresis = [100 * hysteresis_index if hysteresis_index is not None else np.nan,
+                      jv_data.get("hysteresis_area", np.nan)]
+        hysteresis_set = False
+        for c in jv_data["jv_curve"]:
+            file_name = os.path.join("../", jv_md["upload_id"], jv_data.get("data_file"))
+            illum = "Dark" if "dark" in c["cell_name"].lower() else "Light"
+            cell = c["cell_name"][0]
+            direction = "Forward" if "for" in c["cell_name"].lower() else "Reverse"
+            row_hysteresis = [np.nan, np.nan]
+            if illum == "Light" and direction == "Reverse" and not hysteresis_set:
+                row_hysteresis, hysteresis_set = hysteresis, True
+            # Parameters which could not be determined are not in the entry (NaN in the table)
+            p = {name: c.get(name, np.nan) for name in [
+                "open_circuit_voltage", "short_circuit_current_density", "fill_factor", "efficiency",
+                "potential_at_maximum_power_point", "current_density_at_maximun_power_point",
+                "series_resistance", "shunt_resistance"]}
+            row = [p["open_circuit_voltage"], -p["short_circuit_current_density"], 100 * p["fill_factor"],
+                   p["efficiency"], p["potential_at_maximum_power_point"],
+                   -p["current_density_at_maximun_power_point"],
+                   -p["potential_at_maximum_power_point"] * p["current_density_at_maximun_power_point"],
+                   p["series_resistance"], p["shunt_resistance"], file_name, file_name.split("/")[1], "w",
+                   cell, direction, illum] + row_hysteresis
+            rows_jvc.append(row)
+            # Arrays stored in HDF5 are already loaded by LocalStore / api_calls (load_hdf5_arrays)
+            if c.get("voltage") is None or c.get("current_density") is None:
+                without_arrays += 1
+                continue
+            row_v = ["_".join(["Voltage (V)", cell, direction, illum]), file_name, file_name.split("/")[1], "w",
+                     "Voltage (V)", cell, direction, illum]
+            row_v.extend(c["voltage"])
+            row_j = ["_".join(["Current Density(mA/cm2)", cell, direction, illum]), file_name,
+                     file_name.split("/")[1], "w", "Current Density(mA/cm2)", cell, direction, illum]
+            row_j.extend(c["current_density"])
+            max_points = max(max_points, len(c["voltage"]), len(c["current_density"]))
+
+            rows_cur.append(row_v)
+            rows_cur.append(row_j)
+
+    if without_arrays:
+        print(f"Note: {without_arrays} JV curves have no voltage or current density arrays and are not plotted.")
+    df_jvc = pd.DataFrame(rows_jvc, columns=columns_jvc)
+    df_cur = pd.DataFrame(rows_cur, columns=columns_cur + list(range(max_points)))
+    return df_jvc, df_cur
+
+
+def add_hysteresis(jvc, cur):
+    """
+    Adds the hysteresis index and area to JV characteristics from load_files, calculated like in NOMAD:
+    HI = (PCE_rev - PCE_for) / PCE_rev and the area between reverse and forward curve from 0 V to the larger Voc.
+
+    Both are only set on the light reverse row of each sample and cell (NaN on all other rows).
+    """
+    jvc = jvc.copy()
+    jvc['HI(%)'] = np.nan
+    jvc['Hysteresis_area(mW/cm2)'] = np.nan
+    if not {'sample', 'cell', 'direction', 'ilum', 'PCE(%)', 'Voc(V)'}.issubset(jvc.columns):
+        return jvc
+    if cur.empty:
+        curves = {}
+    else:
+        value_columns = [c for c in cur.columns
+                         if c not in ['index', 'sample', 'batch', 'condition', 'variable', 'cell', 'direction', 'ilum']]
+        light_curves = cur[cur['ilum'].astype(str).str.lower() == 'light']
+        curves = {key: pd.to_numeric(row[value_columns], errors='coerce').to_numpy(dtype=float)
+                  for key, row in light_curves.set_index(['sample', 'cell', 'direction', 'variable']).iterrows()}
+
+    light = jvc[jvc['ilum'].astype(str).str.lower() == 'light']
+    for (sample, cell), group in light.groupby(['sample', 'cell']):
+        reverse = group[group['direction'] == 'Reverse']
+        forward = group[group['direction'] == 'Forward']
+        if reverse.empty or forward.empty:
+            continue
+        pce_rev = pd.to_numeric(reverse['PCE(%)'].iloc[0], errors='coerce')
+        pce_for = pd.to_numeric(forward['PCE(%)'].iloc[0], errors='coerce')
+        if pce_rev > 0:
+            jvc.loc[reverse.index[0], 'HI(%)'] = 100 * (pce_rev - pce_for) / pce_rev
+
+        voc = np.nanmax(pd.to_numeric([reverse['Voc(V)'].iloc[0], forward['Voc(V)'].iloc[0]], errors='coerce'))
+        scans = [(curves.get((sample, cell, direction, 'Voltage (V)')),
+                  curves.get((sample, cell, direction, 'Current Density(mA/cm2)'))) for direction in ('Reverse', 'Forward')]
+        if any(v is None or j is None for v, j in scans):
+            continue
+        area = _hysteresis_area(*scans[0], *scans[1], voc)
+        if np.isfinite(area):
+            jvc.loc[reverse.index[0], 'Hysteresis_area(mW/cm2)'] = area
+    return jvc
+
+
+def _hysteresis_area(v_rev, j_rev, v_for, j_for, voc):
+    # Area between both curves on a common voltage grid from 0 V (or the start of the scans) to Voc
+    scans = []
+    for v, j in [(v_rev, j_rev), (v_for, j_for)]:
+        finite = np.isfinite(v) & np.isfinite(j)
+        order = np.argsort(v[finite])
+        scans.append((v[finite][order], j[finite][order]))
+    if any(len(v) < 2 for v, _ in scans):
+        return np.nan
+    low = max(scans[0][0][0], scans[1][0][0], 0.0)
+    high = min(scans[0][0][-1], scans[1][0][-1])
+    if np.isfinite(voc) and voc > low:
+        high = min(high, voc)
+    if high <= low:
+        return np.nan
+    grid = np.linspace(low, high, HYSTERESIS_GRID_POINTS)
+    difference = np.abs(np.interp(grid, *scans[0]) - np.interp(grid, *scans[1]))
+    return float(np.sum((difference[1:] + difference[:-1]) / 2 * np.diff(grid)))
+
+
 def replace_current_density_unit(idx):
     # This regular expression matches (mA/cm²) or (mA/cm^2) and captures the "mA/cm" part before the ² or ^2
     pattern = r'\(mA/cm(?:²|\^2)\)'
@@ -82,16 +257,19 @@ def replace_current_density_unit(idx):
 
 
 def process_file(file_path):
+    # Read the file only once, the sections are split in memory
+    with open(file_path) as file:
+        lines = file.readlines()
+    linepos = find_separators_in_lines(lines)
     # Determines delimiter based on file extension
-    linepos = find_separators_in_file(file_path)
     delimiter = '\t' if file_path.endswith('.txt') else ','
 
     try:
         # Initial attempt to read JV Characteristics
-        jv_chars = pd.read_csv(file_path, skiprows=linepos[0], header=0, index_col=0, nrows=9,
+        jv_chars = pd.read_csv(io.StringIO(''.join(lines[linepos[0]:])), header=0, index_col=0, nrows=9,
                                delimiter=delimiter).transpose()
         # Attempt to read JV Curve - adjust parameters as per your file structure
-        jv_curve = pd.read_csv(file_path, skiprows=linepos[1], header=0, index_col=None,
+        jv_curve = pd.read_csv(io.StringIO(''.join(lines[linepos[1]:])), header=0, index_col=None,
                                delimiter=delimiter).transpose()
 
         # Replace problematic character
@@ -143,6 +321,10 @@ def find_separators_in_file(file_path):
     with open(file_path) as file:
         lines = file.readlines()
 
+    return find_separators_in_lines(lines)
+
+
+def find_separators_in_lines(lines):
     positions = []
     for index, line in enumerate(lines):
         if line.strip() == "--":
@@ -168,41 +350,146 @@ def name_by_condition(data, key_list, value_list):
     return data
 
 
-def data_filter_setup(df, filter_list):
-    # Filter conditions
+# List of operators
+FILTER_OPERATORS = {"<": operator.lt, ">": operator.gt, "==": operator.eq,
+                    "<=": operator.le, ">=": operator.ge, "!=": operator.ne}
+
+DEFAULT_FILTERS = [("PCE(%)", "<", "40"), ("FF(%)", "<", "89"), ("FF(%)", ">", "24"), ("Voc(V)", "<", "2"),
+                   ("Jsc(mA/cm2)", ">", "-30")]
+
+# Number of removed rows printed with their filter reasons (None -> all)
+TRASH_ROWS_SHOWN = 200
+
+
+class FilterSpec:
+    """
+    Composable list of filter conditions (column, operator, value), every condition is one bit of the filter mask.
+
+    Specs can be combined with + and are hashable, so the masks of repeated filter requests are cached.
+    """
+
+    MAX_CONDITIONS = 64  # bits of the uint64 mask
+
+    def __init__(self, conditions=()):
+        unique = []
+        for col, op, va in conditions:
+            if op not in FILTER_OPERATORS:
+                raise ValueError(f"Unknown filter operator '{op}'")
+            condition = (col, op, str(va).strip())
+            if condition not in unique:
+                unique.append(condition)
+        if len(unique) > self.MAX_CONDITIONS:
+            raise ValueError(f"At most {self.MAX_CONDITIONS} filter conditions are supported")
+        self.conditions = tuple(unique)
+
+    def __add__(self, other):
+        other = other if isinstance(other, FilterSpec) else FilterSpec(other)
+        return FilterSpec(self.conditions + other.conditions)
+
+    def __eq__(self, other):
+        return isinstance(other, FilterSpec) and self.conditions == other.conditions
+
+    def __hash__(self):
+        return hash(self.conditions)
+
+    def __len__(self):
+        return len(self.conditions)
+
+    def __iter__(self):
+        return iter(self.conditions)
+
+    def labels(self):
+        return [f'{col} {op} {va}' for col, op, va in self.conditions]
+
+
+class FilterEngine:
+    """
+    Evaluates filter specs on one DataFrame, every single condition is only compared once.
+    The cached results of a column are dropped when its content changes (values, dtype or index).
+    """
+
+    def __init__(self, df):
+        self.df_ref = weakref.ref(df)
+        self.length = len(df)
+        self._failed = {}     # condition -> rows that do not meet the condition
+        self._masks = {}      # spec -> uint64 bit mask per row
+        self._snapshots = {}  # column -> copy of the column the cached results were computed from
+
+    def _refresh(self, columns):
+        # Comparing with a copy is a plain vectorised comparison, much cheaper than hashing the column again
+        df = self.df_ref()
+        for col in columns:
+            snapshot = self._snapshots.get(col)
+            if snapshot is None or not snapshot.equals(df[col]):
+                self._snapshots[col] = df[col].copy()
+                self._failed = {c: m for c, m in self._failed.items() if c[0] != col}
+                self._masks = {s: m for s, m in self._masks.items() if all(c[0] != col for c in s)}
+
+    def failed(self, condition):
+        if condition not in self._failed:
+            col, op, va = condition
+            mask = FILTER_OPERATORS[op](self.df_ref()[col], float(va))
+            # NaN does not meet any condition, like in the comparison itself
+            self._failed[condition] = ~mask.to_numpy(dtype=bool, na_value=False)
+        return self._failed[condition]
+
+    def mask(self, spec):
+        self._refresh({col for col, _, _ in spec})
+        if spec not in self._masks:
+            bits = np.zeros(self.length, dtype=np.uint64)
+            for i, condition in enumerate(spec):
+                bits[self.failed(condition)] |= np.uint64(1 << i)
+            self._masks[spec] = bits
+        return self._masks[spec]
+
+
+# One engine per DataFrame, so changing or repeating filters only evaluates new conditions
+_filter_engines = {}
+
+
+def get_filter_engine(df):
+    engine = _filter_engines.get(id(df))
+    if engine is None or engine.df_ref() is not df or engine.length != len(df):
+        engine = FilterEngine(df)
+        _filter_engines[id(df)] = engine
+        weakref.finalize(df, _filter_engines.pop, id(df), None)
+    return engine
+
+
+def decode_filter_reasons(masks, filtering_options):
+    """Filter reasons as text for the given masks, every distinct mask is decoded only once"""
+    codes, inverse = np.unique(np.asarray(masks, dtype=np.uint64), return_inverse=True)
+    texts = [', '.join(label for i, label in enumerate(filtering_options) if int(code) >> i & 1) for code in codes]
+    return [texts[i] for i in inverse.ravel()]
+
+
+def data_filter_setup(df, filter_list, max_rows_shown=TRASH_ROWS_SHOWN):
+    # Filter conditions: list of (column, operator, value) or a FilterSpec
     # par = ["PCE(%)", "FF(%)", "FF(%)", "Voc(V)", "Jsc(mA/cm2)", "ilum"]
     # ope = ["<", "<", ">", "<", ">", "=="]
     # val = [40, 89, 24, 2, -30, "Light"]
     if not filter_list:
-        filter_list = [("PCE(%)", "<", "40"), ("FF(%)", "<", "89"), ("FF(%)", ">", "24"), ("Voc(V)", "<", "2"),
-                       ("Jsc(mA/cm2)", ">", "-30")]
-
-    # List of operators
-    operat = {"<": operator.lt, ">": operator.gt, "==": operator.eq,
-              "<=": operator.le, ">=": operator.ge, "!=": operator.ne}
-
-    data = df.copy()
-
-    # Initialize the filter_reason column with empty strings
-    data['filter_reason'] = ''
-    filtering_options = []
-    # for col, op, va in zip(par, ope, val):
-    for col, op, va in filter_list:
-        # Update the filter_reason for rows that do not meet the condition
-        mask = operat[op](data[col], float(va))
-        data.loc[~mask, 'filter_reason'] += f'{col} {op} {va}, '
-        filtering_options.append(f'{col} {op} {va}')
-
-    # Filter out rows that have any filter_reason
-    trash = data[data['filter_reason'] != ''].copy()
-    # Remove rows from data that were moved to trash
-    data = data[data['filter_reason'] == '']
-    # Clean up the filter_reason string by removing the trailing comma and space
-    trash['filter_reason'] = trash['filter_reason'].str.rstrip(', ')
+        filter_list = DEFAULT_FILTERS
+    spec = filter_list if isinstance(filter_list, FilterSpec) else FilterSpec(filter_list)
+    filtering_options = spec.labels()
+
+    # Every condition sets one bit, rows with any bit set are removed
+    bits = get_filter_engine(df).mask(spec)
+    removed = bits != 0
+
+    data = df[~removed]
+    trash = df[removed].copy()
+    # The reasons are only decoded when needed (decode_filter_reasons)
+    trash['filter_mask'] = bits[removed]
 
     print(f"\n {trash.shape[0]} of {df.shape[0]} samples were removed based on the specified filters: "
           f"{',  '.join(filtering_options)}.\n")
-    print(trash[['sample', 'cell', 'filter_reason']].to_string(index=False))
+    shown = trash if max_rows_shown is None else trash.head(max_rows_shown)
+    table = shown[['sample', 'cell']].copy()
+    table['filter_reason'] = decode_filter_reasons(shown['filter_mask'], filtering_options)
+    print(table.to_string(index=False))
+    if len(shown) < len(trash):
+        print(f"... and {len(trash) - len(shown)} more")
 
     return data, trash, filtering_options
 
@@ -345,7 +632,7 @@ def jv_plot_curve_best(path, jvc, cur):
 
     # Save figure if not in Jupyter
     sample_name = "JV_best_device.html"
-    if not is_running_in_jupyter():
+    if should_write_files():
         fig.write_html(path + sample_name)
         print("Saved JV curve of best device")
 
@@ -496,7 +783,7 @@ def jv_plot_by_cell_3x2(df, sample, path):
 
     # Save figure if not in Jupyter
     image_name = f"JV_cells_by_sample_{sample}.html"
-    if not is_running_in_jupyter():
+    if should_write_files():
         fig.write_html(path + image_name)
         print(f"Saved JV_cells_by_sample_{sample}.html")
 
@@ -607,14 +894,14 @@ def jv_plot_by_substrate(df, sample, path):
 
     # Save figure if not in Jupyter
     image_name = f"JV_combined_sample_{sample}.html"
-    if not is_running_in_jupyter():
+    if should_write_files():
         fig.write_html(path + image_name)
         print(f"Saved JV_combined_sample_{sample}.html")
 
     return fig, image_name
 
 
-def jv_plot_together(df1, df2, path, namestring):
+def jv_plot_together(df1, df2, path, namestring, webgl_threshold=WEBGL_POINT_THRESHOLD):
     """Plot all JV curves together using Plotly with full interactivity and individual legends"""
     # Prepare the data frame as before
     if namestring == "All":
@@ -636,6 +923,10 @@ def jv_plot_together(df1, df2, path, namestring):
         cols.append(f"{col} {counters[col]}")
     df2_plot.columns = cols
 
+    # SVG gets very slow with many points, switch to WebGL for large plots
+    n_points = int(df2_plot.notna().sum().sum()) // 2
+    scatter = go.Scattergl if webgl_threshold is not None and n_points > webgl_threshold else go.Scatter
+
     # Create Plotly figure
     fig = go.Figure()
 
@@ -678,9 +969,7 @@ def jv_plot_together(df1, df2, path, namestring):
     # Get PCE values for all samples if available
     pce_values = {}
     if 'PCE(%)' in df1.columns:
-        for _, row in df1.iterrows():
-            key = (row['sample'], row['cell'], row['direction'])
-            pce_values[key] = row['PCE(%)']
+        pce_values = dict(zip(zip(df1['sample'], df1['cell'], df1['direction']), df1['PCE(%)']))
     
     # Populate traces for all samples with distinct colors
     added_traces = {}  # To keep track of what we've already added
@@ -737,7 +1026,7 @@ def jv_plot_together(df1, df2, path, namestring):
             curve_name = f"Sample {sample_name} Cell {cell_name} ({direction}{pce_str})"
             
             # Add trace with hover info and legend entry
-            fig.add_trace(go.Scatter(
+            fig.add_trace(scatter(
                 x=df2_plot[f'Voltage (V) {i}'],
                 y=df2_plot[f'Current Density(mA/cm2) {i}'],
                 mode='lines',
@@ -831,7 +1120,7 @@ def jv_plot_together(df1, df2, path, namestring):
 
     # Save figure if not in Jupyter
     image_name = f"JV_together_{namestring}.html"
-    if not is_running_in_jupyter():
+    if should_write_files():
         fig.write_html(path + image_name)
         print(f"Saved JV_together_{namestring}.html")
 
@@ -848,7 +1137,113 @@ def drop_extra_cols_and_ready_to_plot(df):
     return df_clean
 
 
-def boxplot_all_cells(path, wb, data, var_x, var_y, filtered_info, datatype):
+JV_PARAMETERS = ['Voc(V)', 'Jsc(mA/cm2)', 'FF(%)', 'PCE(%)', 'V_mpp(V)', 'J_mpp(mA/cm2)', 'P_mpp(mW/cm2)',
+                 'R_series(Ohmcm2)', 'R_shunt(Ohmcm2)', 'HI(%)', 'Hysteresis_area(mW/cm2)']
+
+
+class GroupStatistics:
+    """
+    Statistics of one dataset grouped by one or more columns.
+
+    All JV parameters are described in one groupby pass and the row positions of every group are kept,
+    so the values of a category are taken directly instead of filtering the whole DataFrame per category.
+    """
+
+    def __init__(self, data, by):
+        grouped = data.groupby(by[0] if len(by) == 1 else list(by))
+        self.data = data
+        self.parameters = [p for p in JV_PARAMETERS if p in data.columns]
+        self.describe = grouped[self.parameters].describe()
+        self.indices = grouped.indices
+
+    def descriptor(self, parameter):
+        # Same as data.groupby(by)[parameter].describe()
+        return self.describe[parameter]
+
+    def groups(self):
+        return self.describe.index
+
+    def counts(self, parameter):
+        return self.describe[(parameter, 'count')].to_dict()
+
+    def values(self, group, parameter):
+        positions = self.indices.get(group)
+        if positions is None:
+            return self.data[parameter].iloc[0:0]
+        return self.data[parameter].iloc[positions].dropna()
+
+    def median(self, group, parameter):
+        return self.describe.loc[group, (parameter, '50%')]
+
+    def mean(self, group, parameter):
+        return self.describe.loc[group, (parameter, 'mean')]
+
+
+def _cached_by_group(cache, data, by, role, compute):
+    # The cache keeps the frame (so its id is not reused) and a copy of the used columns, a frame that was
+    # changed in place (e.g. "sample" converted to int by the boxplots) is computed again
+    columns = list(dict.fromkeys(list(by) + [p for p in JV_PARAMETERS if p in data.columns]))
+    key = role, id(data), by
+    entry = cache.get(key)
+    if entry is not None and entry[0] is data and entry[1].equals(data[columns]):
+        return entry[2]
+    result = compute()
+    cache[key] = (data, data[columns].copy(), result)
+    return result
+
+
+def get_group_statistics(data, by, cache=None):
+    """Returns the GroupStatistics of data, with a cache dict they are computed only once per plotting run"""
+    by = tuple(by) if isinstance(by, (list, tuple)) else (by,)
+    if cache is None:
+        return GroupStatistics(data, by)
+    return _cached_by_group(cache, data, by, 'stats', lambda: GroupStatistics(data, by))
+
+
+def _group_counts(data, by):
+    parameters = [p for p in JV_PARAMETERS if p in data.columns]
+    return data.groupby(by[0] if len(by) == 1 else list(by))[parameters].count()
+
+
+def get_group_counts(data, by, parameter, cache=None):
+    """Number of values of parameter per group (used for the removed data, where only counts are needed)"""
+    by = tuple(by) if isinstance(by, (list, tuple)) else (by,)
+    if data.empty or any(col not in data.columns for col in by):
+        return {}
+    if cache is None:
+        return _group_counts(data, by)[parameter].to_dict()
+    return _cached_by_group(cache, data, by, 'counts', lambda: _group_counts(data, by))[parameter].to_dict()
+
+
+def box_points_mode(n_values, max_points_per_box=BOXPLOT_MAX_POINTS_PER_BOX):
+    """Returns the boxpoints setting for a box with n_values and if the points were thinned"""
+    if max_points_per_box is not None and n_values > max_points_per_box:
+        return 'outliers', True
+    return 'all', False
+
+
+def add_box_summary(fig, x, top, count, median, mean):
+    # Summary overlay above a box whose points are not all drawn
+    fig.add_annotation(
+        x=x, y=top, xref="x", yref="y",
+        text=f"n={count}<br>median {median:.3f}<br>mean {mean:.3f}",
+        showarrow=False, yshift=25,
+        font=dict(size=9, color='rgba(0,0,0,0.7)'),
+        bgcolor="rgba(255,255,255,0.8)",
+    )
+
+
+def add_thinning_note(fig, max_points_per_box):
+    fig.add_annotation(
+        x=1, y=1.02, xref="paper", yref="paper",
+        text=f"Boxes with more than {max_points_per_box} values only show outliers",
+        showarrow=False, xanchor="right", yanchor="bottom",
+        font=dict(size=10, color='rgba(0,0,0,0.6)'),
+    )
+
+
+def boxplot_all_cells(path, wb, data, var_x, var_y, filtered_info, datatype, stats_cache=None,
+                      max_points_per_box=BOXPLOT_MAX_POINTS_PER_BOX):
     """Create a boxplot with all cells using Plotly with much wider boxes"""
     names_dict = {
         "voc": 'Voc(V)', "jsc": 'Jsc(mA/cm2)', "ff": 'FF(%)', "pce": 'PCE(%)',
@@ -865,8 +1260,9 @@ def boxplot_all_cells(path, wb, data, var_x, var_y, filtered_info, datatype):
 
     data['Jsc(mA/cm2)'] = data['Jsc(mA/cm2)'].abs()
 
-    # Calculate statistics 
-    descriptor = data.groupby(var_x)[var_name_y].describe()
+    # Calculate statistics (one groupby pass per dataset, shared by all figures of a run)
+    stats = get_group_statistics(data, var_x, stats_cache)
+    descriptor = stats.descriptor(var_name_y)
 
     # Ordering
     order_parameter = "alphabetic"
@@ -876,8 +1272,8 @@ def boxplot_all_cells(path, wb, data, var_x, var_y, filtered_info, datatype):
         orderc = descriptor.sort_index()["count"].index
 
     # Create dictionaries to map categories to their counts
-    data_counts = data.groupby(var_x)[var_name_y].count().to_dict()
-    trash_counts = trash.groupby(var_x)[var_name_y].count().to_dict() if not trash.empty else {}
+    data_counts = stats.counts(var_name_y)
+    trash_counts = get_group_counts(trash, var_x, var_name_y, stats_cache)
 
     # Create figure
     fig = go.Figure()
@@ -893,24 +1289,31 @@ def boxplot_all_cells(path, wb, data, var_x, var_y, filtered_info, datatype):
     ]
     
     # Add each category's boxplot
+    any_thinned = False
     for i, category in enumerate(orderc):
         # Get data for this category
-        category_data = data[data[var_x] == category][var_name_y].dropna()
+        category_data = stats.values(category, var_name_y)
         if not category_data.empty:
             # Get counts and statistics
             data_count = data_counts.get(category, 0)
             trash_count = trash_counts.get(category, 0)
-            median = category_data.median()
-            mean = category_data.mean()
+            median = stats.median(category, var_name_y)
+            mean = stats.mean(category, var_name_y)
             
             # Format category name with count
             category_name = f"{category} (n={data_count})" if trash_count == 0 else f"{category} ({data_count}/{data_count + trash_count})"
+
+            # Very large boxes only draw their outliers (the box itself is still computed from all values)
+            boxpoints, thinned = box_points_mode(len(category_data), max_points_per_box)
+            if thinned:
+                any_thinned = True
+                add_box_summary(fig, category_name, category_data.max(), data_count, median, mean)
             
             # Add boxplot with improved styling - much wider boxes
             fig.add_trace(go.Box(
                 y=category_data,
                 name=category_name,
-                boxpoints='all',     # Show all points
+                boxpoints=boxpoints, # Show all points (or only outliers for very large boxes)
                 pointpos=0,          # Center points horizontally
                 jitter=0.5,          # Add jitter to points
                 whiskerwidth=0.4,    # Thicker whiskers
@@ -937,7 +1340,7 @@ def boxplot_all_cells(path, wb, data, var_x, var_y, filtered_info, datatype):
     
     # Create a title with data information
     title_text = f"Boxplot of {var_y} by {var_x}" + (" (filtered out)" if datatype == "junk" else "")
-    subtitle = f"Data from {len(data)} ({trash.shape[0]} removed) measurements across {data[var_x].nunique()} {var_x} categories"
+    subtitle = f"Data from {len(data)} ({trash.shape[0]} removed) measurements across {len(stats.groups())} {var_x} categories"
     
     # Update layout with MUCH more compressed spacing
     fig.update_layout(
@@ -970,6 +1373,9 @@ def boxplot_all_cells(path, wb, data, var_x, var_y, filtered_info, datatype):
         width=0.8,            # Make boxes very wide (80% of available space)
         quartilemethod="linear"  # Use linear method for quartiles
     )
+
+    if any_thinned:
+        add_thinning_note(fig, max_points_per_box)
     
     # Rotate x-axis labels if many categories
     if len(orderc) > 4:
@@ -1005,14 +1411,15 @@ def boxplot_all_cells(path, wb, data, var_x, var_y, filtered_info, datatype):
     else:
         sample_name = f"boxplot_{var_y}_by_{var_x}.html"
 
-    if not is_running_in_jupyter():
+    if should_write_files():
         fig.write_html(f"{path}{sample_name}")
         print(f"Saved boxplot of {var_y} by {var_x}")
 
     return fig, sample_name, wb
 
 
-def boxplot_paired_by_direction(path, wb, data, var_x, var_y, filtered_info, datatype):
+def boxplot_paired_by_direction(path, wb, data, var_x, var_y, filtered_info, datatype, stats_cache=None,
+                                max_points_per_box=BOXPLOT_MAX_POINTS_PER_BOX):
     """Create a paired boxplot with forward/backward direction using different colors"""
     names_dict = {
         "voc": 'Voc(V)', "jsc": 'Jsc(mA/cm2)', "ff": 'FF(%)', "pce": 'PCE(%)',
@@ -1034,19 +1441,21 @@ def boxplot_paired_by_direction(path, wb, data, var_x, var_y, filtered_info, dat
         print("Warning: 'direction' column not found in data. Creating dummy direction column.")
         data['direction'] = 'forward'  # Default fallback
 
-    # Calculate statistics for each direction
-    descriptor = data.groupby([var_x, 'direction'])[var_name_y].describe()
+    # Calculate statistics for each direction (one groupby pass per dataset, shared by all figures of a run)
+    stats = get_group_statistics(data, [var_x, 'direction'], stats_cache)
+    stats_x = get_group_statistics(data, var_x, stats_cache)
+    descriptor = stats.descriptor(var_name_y)
 
     # Ordering based on var_x categories
     order_parameter = "alphabetic"
     if order_parameter != "alphabetic":
-        orderc = data.groupby(var_x)[var_name_y].describe().sort_values(by=[order_parameter])["count"].index
+        orderc = stats_x.descriptor(var_name_y).sort_values(by=[order_parameter])["count"].index
     else:
-        orderc = data.groupby(var_x)[var_name_y].describe().sort_index()["count"].index
+        orderc = stats_x.descriptor(var_name_y).sort_index()["count"].index
 
     # Create dictionaries to map categories and directions to their counts
-    data_counts = data.groupby([var_x, 'direction'])[var_name_y].count().to_dict()
-    trash_counts = trash.groupby([var_x, 'direction'])[var_name_y].count().to_dict() if not trash.empty and 'direction' in trash.columns else {}
+    data_counts = stats.counts(var_name_y)
+    trash_counts = get_group_counts(trash, [var_x, 'direction'], var_name_y, stats_cache)
 
     # Create figure
     fig = go.Figure()
@@ -1061,26 +1470,28 @@ def boxplot_paired_by_direction(path, wb, data, var_x, var_y, filtered_info, dat
     directions = data['direction'].unique()
     
     # Add boxplots for each category and direction combination
+    any_thinned = False
     for category in orderc:
         for direction in directions:
             # Get data for this category and direction
-            category_direction_data = data[
-                (data[var_x] == category) & 
-                (data['direction'] == direction)
-            ][var_name_y].dropna()
+            category_direction_data = stats.values((category, direction), var_name_y)
             
             if not category_direction_data.empty:
                 # Get counts and statistics
                 data_count = data_counts.get((category, direction), 0)
                 trash_count = trash_counts.get((category, direction), 0)
-                median = category_direction_data.median()
-                mean = category_direction_data.mean()
+                median = stats.median((category, direction), var_name_y)
+                mean = stats.mean((category, direction), var_name_y)
                 
                 # Format category name with direction and count
                 if trash_count == 0:
                     category_name = f"{category} ({direction}, n={data_count})"
                 else:
                     category_name = f"{category} ({direction}, {data_count}/{data_count + trash_count})"
+
+                # Very large boxes only draw their outliers, median/mean/count are in the hover text
+                boxpoints, thinned = box_points_mode(len(category_direction_data), max_points_per_box)
+                any_thinned = any_thinned or thinned
                 
                 # Add boxplot with direction-specific styling
                 fig.add_trace(go.Box(
@@ -1088,7 +1499,7 @@ def boxplot_paired_by_direction(path, wb, data, var_x, var_y, filtered_info, dat
                     name=category_name,
                     legendgroup=direction,  # Group by direction for legend
                     legendgrouptitle_text=direction.capitalize(),
-                    boxpoints='all',     # Show all points
+                    boxpoints=boxpoints, # Show all points (or only outliers for very large boxes)
                     pointpos=0,          # Center points horizontally
                     jitter=0.5,          # Add jitter to points
                     whiskerwidth=0.4,    # Thicker whiskers
@@ -1118,7 +1529,7 @@ def boxplot_paired_by_direction(path, wb, data, var_x, var_y, filtered_info, dat
     
     # Create a title with data information
     title_text = f"Paired Boxplot of {var_y} by {var_x} (Forward vs Backward)" + (" (filtered out)" if datatype == "junk" else "")
-    subtitle = f"Data from {len(data)} ({trash.shape[0]} removed) measurements across {data[var_x].nunique()} {var_x} categories"
+    subtitle = f"Data from {len(data)} ({trash.shape[0]} removed) measurements across {len(stats_x.groups())} {var_x} categories"
     
     # Update layout for paired boxplots
     fig.update_layout(
@@ -1155,6 +1566,9 @@ def boxplot_paired_by_direction(path, wb, data, var_x, var_y, filtered_info, dat
         width=0.4,              # Narrower boxes to accommodate pairs
         quartilemethod="linear"  # Use linear method for quartiles
     )
+
+    if any_thinned:
+        add_thinning_note(fig, max_points_per_box)
     
     # Rotate x-axis labels if many categories
     if len(orderc) > 4:
@@ -1175,92 +1589,115 @@ def boxplot_paired_by_direction(path, wb, data, var_x, var_y, filtered_info, dat
     else:
         sample_name = f"boxplot_paired_{var_y}_by_{var_x}.html"
 
-    if not is_running_in_jupyter():
+    if should_write_files():
         fig.write_html(f"{path}{sample_name}")
         print(f"Saved paired boxplot of {var_y} by {var_x} (Forward vs Backward)")
 
     return fig, sample_name, wb
 
 
+def dataframe_rows(df, index=True, header=True, chunk_size=EXCEL_CHUNK_SIZE):
+    """Same rows as openpyxl's dataframe_to_rows, but the values are converted chunk by chunk"""
+    if header or index:
+        yield from dataframe_to_rows(df.iloc[:0], index=index, header=header)
+    for start in range(0, len(df), chunk_size):
+        rows = dataframe_to_rows(df.iloc[start:start + chunk_size], index=index, header=False)
+        if index:
+            next(rows)  # index names, already written above
+        yield from rows
+
+
+class ExcelExport:
+    """
+    Result tables for the Excel export.
+
+    The sheets are only kept as blocks of text rows and DataFrames. Cells are created while saving and
+    streamed into a write-only workbook, so large exports need no in-memory workbook.
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path
+        self.sheets = {}  # title -> list of blocks ('rows', list of rows) or ('frame', DataFrame)
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets)
+
+    def __delitem__(self, title):
+        del self.sheets[title]
+
+    def _set_sheet(self, title, blocks):
+        # An existing sheet with the same title is replaced
+        self.sheets.pop(title, None)
+        self.sheets[title] = blocks
+
+    def add_sheet(self, title, blocks):
+        # The DataFrames are copied: the export keeps the state of the moment the sheet was added,
+        # also if the frames of the analysis are changed later (e.g. name_by_condition, boxplots)
+        self._set_sheet(title, [(kind, content.copy() if kind == 'frame' else content) for kind, content in blocks])
+
+    def add_dataframe_sheet(self, title, df):
+        self.add_sheet(title, [('frame', df)])
+
+    def update(self, other):
+        # the frames of other are already copies
+        for title, blocks in other.sheets.items():
+            self._set_sheet(title, blocks)
+
+    def iter_rows(self, title):
+        for kind, content in self.sheets[title]:
+            if kind == 'frame':
+                yield from dataframe_rows(content)
+            else:
+                yield from content
+
+    def save(self, filename=None):
+        """Writes all sheets to filename (path or file object), default is the file_path of the export"""
+        wb = openpyxl.Workbook(write_only=True)
+        for title in self.sheets:
+            ws = wb.create_sheet(title=title)
+            for row in self.iter_rows(title):
+                ws.append(row)
+        wb.save(filename if filename is not None else self.file_path)
+
+
 def save_full_data_frame(path, data):
     file_path = path + "0_numerical_results.xlsx"
 
-    # Check if the Excel file already exists
-    if os.path.exists(file_path):
-        wb = load_workbook(file_path)
-    else:
-        wb = openpyxl.Workbook()
-        wb.remove(wb.active)  # Remove the default sheet
-
-    if not is_running_in_jupyter():
-        with pd.ExcelWriter(file_path) as writer:
-            # Write the DataFrame with earlier data to a sheet named 'Earlier'
-            data.to_excel(writer, sheet_name='All_data')
+    # The file is written once with all sheets (ExcelExport.save), not after every plot
+    wb = ExcelExport(file_path)
+    wb.add_dataframe_sheet('All_data', data)
     return wb
 
 
 def save_combined_excel_data(path, wb, data, filtered_info, var_x, name_y, var_y, other_df):
-    """Save data to Excel workbook - same functionality as the original but returning the workbook"""
+    """Adds the data of a boxplot as a sheet to the ExcelExport and returns it"""
     trash, filters = filtered_info
-    # Define the Excel file path
-    file_path = path + "0_numerical_results.xlsx"
 
     # Create a new sheet name based on var_x and var_y
     sheet_title = f"{var_y}-by-{var_x}"
 
-    # Check if the sheet already exists
-    if sheet_title in wb.sheetnames:
-        del wb[sheet_title]
-    ws = wb.create_sheet(title=sheet_title)
-
-    # Insert personalized string before the first DataFrame
-    ws.append([f"Contents of boxplot for {var_y} by {var_x}"])
-    ws.append([])  # Add an empty row for spacing
-
-    # Process and append data and other_df as before
+    # Process data and other_df as before
     combined_data = data.copy()
     combined_data['_index'] = combined_data.groupby(var_x).cumcount()
     pivot_table = combined_data.pivot_table(index='_index', columns=var_x, values=name_y, aggfunc="mean")
 
-    for r in dataframe_to_rows(pivot_table, index=True, header=True):
-        ws.append(r)
-
-    # Calculate starting row for the second personalized string
-    # It's the current number of rows plus 2 for spacing
-    next_row = ws.max_row + 3
-
-    # Insert personalized string before the second DataFrame
-    ws.cell(row=next_row, column=1, value="Statistical summary")
-    ws.append([])  # Add an empty row for spacing
-
-    for r in dataframe_to_rows(other_df.T, index=True, header=True):
-        ws.append(r)
-
-    next_row = ws.max_row + 3
-
-    # Insert personalized string before the second DataFrame
-    ws.cell(row=next_row, column=1, value="This is the filtered data")
-    ws.append([])  # Add an empty row for spacing
-
     combined_trash = trash.copy()
     combined_trash['_index'] = combined_trash.groupby(var_x).cumcount()
     pivot_table_trash = combined_trash.pivot_table(index='_index', columns=var_x, values=name_y, aggfunc="mean")
 
-    # Add rows from the second DataFrame (pivot table)
-    for r in dataframe_to_rows(pivot_table_trash, index=True, header=True):
-        ws.append(r)
-
-    next_row = ws.max_row + 3
-
-    # Insert personalized string before the second DataFrame
+    # Same layout as before: personalized strings, each table separated by two empty rows
     filter_words = ["Only data within these limits is shown:"] + filters
-    for cc, strings in enumerate(filter_words):
-        ws.cell(row=next_row + cc, column=1, value=strings)
-    ws.append([])  # Add an empty row for spacing
-
-    if not is_running_in_jupyter():
-        # Save the workbook
-        wb.save(filename=file_path)
+    blocks = [
+        ('rows', [[f"Contents of boxplot for {var_y} by {var_x}"], []]),
+        ('frame', pivot_table),
+        ('rows', [[], [], ["Statistical summary"], []]),
+        ('frame', other_df.T),
+        ('rows', [[], [], ["This is the filtered data"], []]),
+        ('frame', pivot_table_trash),
+        ('rows', [[], []] + [[strings] for strings in filter_words] + [[]]),
+    ]
+    wb.add_sheet(sheet_title, blocks)
     return wb
 
 
@@ -1428,7 +1865,7 @@ def histogram(path, df, var_y):
 
     # Save figure if not in Jupyter
     sample_name = f"histogram_{var_y}.html"
-    if not is_running_in_jupyter():
+    if should_write_files():
         fig.write_html(f"{path}{sample_name}")
         print(f"Saved histogram of {var_y}")
 
@@ -1484,7 +1921,7 @@ def plot_list_from_voila(plot_list):
     return new_list
 
 
-def plotting_string_action(plot_list, wb, data, supp, is_voila=False):
+def plotting_string_action(plot_list, wb, data, supp, is_voila=False, stats_cache=None):
     filtered_jv, complete_jv, complete_cur = data
     omitted_jv, filter_pars, is_conditions, path, samples = supp
 
@@ -1497,6 +1934,10 @@ def plotting_string_action(plot_list, wb, data, supp, is_voila=False):
                  "h": "rshu", }
     # varc_dict = {"w": "best device", "x": "all cells per sample", "y": "all together"}
 
+    # Grouped statistics are computed once and shared by all boxplots of this run
+    if stats_cache is None:
+        stats_cache = {}
+
     fig_list = []
     fig_names = []
     for pl in plot_list:
@@ -1522,9 +1963,11 @@ def plotting_string_action(plot_list, wb, data, supp, is_voila=False):
         # Check and plot varplot
         if "B" in pl and var_x is not None and var_y is not None:
             print(wb, var_x, var_y)
-            fig, fig_name, wb = boxplot_all_cells(path, wb, filtered_jv, var_x, var_y, [omitted_jv, filter_pars], "data")
+            fig, fig_name, wb = boxplot_all_cells(path, wb, filtered_jv, var_x, var_y, [omitted_jv, filter_pars], "data",
+                                                stats_cache)
         elif "J" in pl and var_x is not None and var_y is not None:
-            fig, fig_name, wb = boxplot_all_cells(path, wb, omitted_jv, var_x, var_y, [filtered_jv, filter_pars], "junk")
+            fig, fig_name, wb = boxplot_all_cells(path, wb, omitted_jv, var_x, var_y, [filtered_jv, filter_pars], "junk",
+                                                stats_cache)
         elif "H" in pl and var_y is not None:
             fig, fig_name = histogram(path, complete_jv, var_y)
         elif "Cw" in pl:  # Best device
@@ -1656,4 +2099,5 @@ if __name__ == "__main__":
         # list_plots = ["Cz"]
         plotting_string_action(list_plots, workbook, data_lists, extras)
 
+    workbook.save()
     print("Finished")
\ No newline at end of file
@@ -2,20 +2,205 @@
 # mthods to access the nomad api
 
 import getpass
+import io
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class NomadClient:
+    """
+    Client for the NOMAD API with one pooled session (keep-alive connections) and retries with backoff.
+    url is the api base url (e.g. http://localhost/nomad-oasis/api/v1), so the client can also be
+    pointed to a local stub server for testing.
+    """
+
+    def __init__(self, url, token=None, retries=3, backoff_factor=0.5, timeout=60, pool_maxsize=16):
+        self.url = url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,  # waits 0.5s, 1s, 2s, ...
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET', 'POST'),  # the NOMAD query endpoints are read-only POSTs
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _headers(self):
+        return {'Authorization': f'Bearer {self.token}'} if self.token else {}
+
+    def _url(self, path):
+        # 'entries/query' and '/entries/query' are the same endpoint
+        return f"{self.url}/{path.lstrip('/')}"
+
+    def get(self, path, params=None):
+        response = self.session.get(self._url(path), headers=self._headers(), params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def post(self, path, json=None):
+        response = self.session.post(self._url(path), headers=self._headers(), json=json, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def download(self, path, params=None):
+        # content of a file, e.g. /uploads/<upload_id>/raw/<path>
+        response = self.session.get(self._url(path), headers=self._headers(), params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    def query(self, query, path='/entries/archive/query'):
+        return self.post(path, json=query)["data"]
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# One pooled client per api url and token, shared by all functions below
+_clients = {}
+
+def get_client(url, token=None):
+    if (url, token) not in _clients:
+        _clients[(url, token)] = NomadClient(url, token)
+    return _clients[(url, token)]
+
+
+# Number of queries which are sent at the same time (below the pool_maxsize of the clients)
+MAX_WORKERS = 8
+_executor = None
+
+# Runs func(*args) on a worker thread and returns the future, e.g. to send a query while the notebook processes other data
+def submit(func, *args, **kwargs):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    return _executor.submit(func, *args, **kwargs)
+
+# Runs independent calls (func, *args) concurrently and returns their results in the same order,
+# so several queries cost one round-trip instead of the sum:
+#   descriptions, jvs = run_concurrently((get_sample_description, url, token, ids), (get_all_JV, url, token, ids))
+def run_concurrently(*calls):
+    futures = [submit(func, *args) for func, *args in calls]
+    return [future.result() for future in futures]
+
+
+# Default page size for the paginated queries below
+PAGE_SIZE = 1000
+
+# Walks through all results of a query with the page_after_value cursor and yields the entries one by one.
+# Nothing is truncated, only one page is kept in memory at a time.
+def iter_query(url, token, query, path="/entries/archive/query", page_size=PAGE_SIZE):
+    query = dict(query)
+    pagination = {**query.get('pagination', {}), 'page_size': page_size}
+    pagination.pop('page_after_value', None)
+    while True:
+        query['pagination'] = pagination
+        result = get_client(url, token).post(path, json=query)
+        yield from result["data"]
+        next_page_after_value = result.get("pagination", {}).get("next_page_after_value")
+        if not next_page_after_value or not result["data"]:
+            break
+        pagination = {**pagination, 'page_after_value': next_page_after_value}
+
+# entry_ids of the samples with the given lab_ids
+def get_entry_ids_of_samples(url, token, sample_ids, page_size=PAGE_SIZE):
+    query = {
+        'required': {
+            'metadata': '*'
+        },
+        'owner': 'visible',
+        'query': {'results.eln.lab_ids:any': sample_ids},
+    }
+    return [entry["entry_id"] for entry in iter_query(url, token, query, "/entries/query", page_size)]
+
+# Yields (lab_id, data, metadata) of all measurements referencing the samples and matching the query
+def iter_measurements_of_samples(url, token, sample_ids, measurement_query, page_size=PAGE_SIZE):
+    entry_ids = get_entry_ids_of_samples(url, token, sample_ids, page_size)
+    if not entry_ids:
+        return
+    query = {
+        'required': {
+            'data': '*',
+            'metadata': '*',
+        },
+        'owner': 'visible',
+        'query': {'entry_references.target_entry_id:any': entry_ids, **measurement_query},
+    }
+    for ldata in iter_query(url, token, query, page_size=page_size):
+        data, metadata = ldata["archive"]["data"], ldata["archive"]["metadata"]
+        yield data["samples"][0]["lab_id"], load_hdf5_arrays(url, token, metadata["upload_id"], data), metadata
+
+# Sections of entries with store_large_arrays_in_hdf5 only contain references (hdf5_arrays, "file#dataset") to their long arrays.
+# The HDF5 files are downloaded from the raw files of the upload and the arrays are put back into data (in place),
+# so data looks like the data of an entry without HDF5 storage. Returns data.
+def load_hdf5_arrays(url, token, upload_id, data):
+    sections = list(_sections_with_hdf5_arrays(data))
+    if not sections:
+        return data
+    import h5py
+
+    h5_files = {}
+    try:
+        for section in sections:
+            for reference in section["hdf5_arrays"]:
+                file_name, dataset = reference.split("#", 1)
+                if file_name not in h5_files:
+                    content = get_client(url, token).download(f'/uploads/{upload_id}/raw/{quote(file_name)}')
+                    h5_files[file_name] = h5py.File(io.BytesIO(content), 'r')
+                name = dataset.rsplit('/', 1)[-1]
+                if section.get(name) is None:
+                    section[name] = h5_files[file_name][dataset.lstrip('/')][()].tolist()
+    finally:
+        for h5 in h5_files.values():
+            h5.close()
+    return data
+
+def _sections_with_hdf5_arrays(data):
+    if isinstance(data, dict):
+        if data.get("hdf5_arrays"):
+            yield data
+        for value in data.values():
+            yield from _sections_with_hdf5_arrays(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from _sections_with_hdf5_arrays(value)
+
+# Collects the streamed measurements into a dict lab_id: [(data, metadata), ...]
+def group_by_lab_id(measurements):
+    res = {}
+    for lab_id, data, metadata in measurements:
+        res.setdefault(lab_id, []).append((data, metadata))
+    return res
 
 
-def init_cache():
-    import requests_cache
-    requests_cache.install_cache("my_local_cache", allowable_methods=('GET', 'POST'), ignored_parameters=['Authorization'])
+# Opens the local store of JV, EQE and MPPT entries (see local_store.py).
+# Replaces the former global requests_cache, which ignored the Authorization header and never expired.
+def init_cache(url, token, path=None):
+    from local_store import LocalStore
+    return LocalStore(path) if path else LocalStore.for_user(url, token)
+
+# user_id of the owner of the token (e.g. to keep local data of different users apart)
+def get_user_id(url, token):
+    return get_client(url, token).get('/users/me')["user_id"]
 
 #retreive information about all uploads of current user
 def get_all_uploads(url, token, number_of_uploads=20):
-    response = requests.get(f'{url}/uploads',
-                             headers={'Authorization': f'Bearer {token}'},params=dict(page_size=number_of_uploads,order_by='upload_create_time', order="desc"))
-    response.raise_for_status()
-    return response.json()["data"]
+    return get_client(url, token).get(
+        '/uploads', params=dict(page_size=number_of_uploads,order_by='upload_create_time', order="desc"))["data"]
 
 
 def get_template(url, token, upload_name, method):
@@ -29,10 +214,7 @@ def get_template(url, token, upload_name, method):
             'page_size': 100
         }
     }
-    response = requests.post(f'{url}/entries/archive/query',
-                             headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    return response.json()["data"]
+    return get_client(url, token).post('/entries/archive/query', json=query)["data"]
 
 def get_token(url, name=None):
     user = name if name is not None else input("Username")
@@ -40,27 +222,18 @@ def get_token(url, name=None):
     password = getpass.getpass()
     
     # Get a token from the api, login
-    response = requests.get(
-        f'{url}/auth/token', params=dict(username=user, password=password))  
-    response.raise_for_status()  
-    return response.json()['access_token']
+    return get_client(url).get('/auth/token', params=dict(username=user, password=password))['access_token']
 
-def get_batch_ids(url, token, batch_type="perolab_Batch"):
+def get_batch_ids(url, token, batch_type="perolab_Batch", page_size=PAGE_SIZE):
     query = {
         'required': {
             'data': '*'
         },
         'owner': 'visible',
         'query': {'entry_type':batch_type},
-        'pagination': {
-            'page_size': 10000
-        }
     }
-    response = requests.post(
-        f'{url}/entries/archive/query', headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    data = response.json()["data"]
-    return [d["archive"]["data"]["lab_id"] for d in data if "lab_id" in d["archive"]["data"]]
+    return [d["archive"]["data"]["lab_id"] for d in iter_query(url, token, query, page_size=page_size)
+            if "lab_id" in d["archive"]["data"]]
 
 def get_ids_in_batch(url, token,batch_ids, batch_type="perolab_Batch"):
     query = {
@@ -73,10 +246,7 @@ def get_ids_in_batch(url, token,batch_ids, batch_type="perolab_Batch"):
             'page_size': 100
         }
     }
-    response = requests.post(
-        f'{url}/entries/archive/query', headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    data = response.json()["data"]
+    data = get_client(url, token).post('/entries/archive/query', json=query)["data"]
     assert len(data) == len(batch_ids)
     sample_ids = []
     for d in data:
@@ -96,32 +266,23 @@ def get_entry_data(url, token, entry_id):
         'owner': 'visible',
         'query': row,
         'pagination': {
-            'page_size': 10000
+            'page_size': 1
         }
     }
-    response = requests.post(f'{url}/entries/archive/query',
-                             headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    assert len(response.json()["data"]) ==1, "Entry not found"
-    return response.json()["data"][0]["archive"]["data"]
+    result = get_client(url, token).post('/entries/archive/query', json=query)
+    assert len(result["data"]) ==1, "Entry not found"
+    return result["data"][0]["archive"]["data"]
 
-def get_sample_description(url, token, sample_ids):
+def get_sample_description(url, token, sample_ids, page_size=PAGE_SIZE):
     query = {
         'required': {
             'data': '*'
         },
         'owner': 'visible',
         'query': {'results.eln.lab_ids:any': sample_ids},
-        'pagination': {
-            'page_size': 10000
-        }
     }
-    response = requests.post(
-        f'{url}/entries/query', headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    entries = response.json()["data"]
     res = {}
-    for entry in entries:
+    for entry in iter_query(url, token, query, "/entries/query", page_size):
         data = entry["data"]
         if "description" in data and  data["description"] and data["description"].strip():
             res.update({data["lab_id"]:data["description"]})
@@ -140,10 +301,7 @@ def get_entryid(url, token, sample_id):  # give it a batch id
             'page_size': 100
         }
     }
-    response = requests.post(
-        f'{url}/entries/query', headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    data = response.json()["data"]
+    data = get_client(url, token).post('/entries/query', json=query)["data"]
     assert len(data) == 1
     return data[0]["entry_id"]
 
@@ -159,10 +317,7 @@ def get_nomad_ids_of_entry(url, token, sample_id):  # give it a batch id
             'page_size': 100
         }
     }
-    response = requests.post(
-        f'{url}/entries/query', headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    data = response.json()["data"]
+    data = get_client(url, token).post('/entries/query', json=query)["data"]
     assert len(data) == 1
     return data[0]["entry_id"], data[0]["upload_id"]
 
@@ -179,37 +334,61 @@ def get_entry_meta_data(url, token, entry_id):
             'page_size': 100
         }
     }
-    response = requests.post(f'{url}/entries/query',
-                             headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    assert len(response.json()["data"]) ==1, "Entry not found"
-    return response.json()["data"][0]
-
+    result = get_client(url, token).post('/entries/query', json=query)
+    assert len(result["data"]) ==1, "Entry not found"
+    return result["data"][0]
+
+
+
+# Fetches the data of many entries with one query per chunk (entry_id:any) instead of one request per entry.
+# required can be used to fetch only sub-paths of data, e.g. {'data': {'lab_id': '*', 'name': '*'}}
+def get_entries_data(url, token, entry_ids, required=None, chunk_size=1000):
+    required = required if required is not None else {'data': '*'}
+    entry_ids = list(dict.fromkeys(entry_ids))  # unique, order kept
+    queries = []
+    for i in range(0, len(entry_ids), chunk_size):
+        chunk = entry_ids[i:i + chunk_size]
+        queries.append({
+            'required': {**required, 'metadata': {'entry_id': '*'}},
+            'owner': 'visible',
+            'query': {'entry_id:any': chunk},
+            'pagination': {
+                'page_size': len(chunk)
+            }
+        })
+    # the chunks are sent concurrently
+    client = get_client(url, token)
+    results = run_concurrently(*[(client.post, '/entries/archive/query', query) for query in queries])
+    res = {}
+    for result in results:
+        for entry in result["data"]:
+            res[entry["entry_id"]] = entry["archive"].get("data", {})
+    return res
 
 
-def get_information(url, token, entry_id, path):
+def get_information(url, token, entry_id, path, required=None):
     mdata = get_entry_meta_data(url, token, entry_id)
-    res = []
-    for ref in mdata.get("entry_references"):
-        if path != ref.get("source_path"):
-            continue
-        res.append(get_entry_data(url, token, ref.get("target_entry_id")))
-        
-    return res
+    target_ids = [ref.get("target_entry_id") for ref in mdata.get("entry_references", [])
+                  if path == ref.get("source_path")]
+    # resolve all references with one query
+    entries = get_entries_data(url, token, target_ids, required)
+    missing = [target_id for target_id in target_ids if target_id not in entries]
+    assert not missing, f"Entries not found: {missing}"
+    return [entries[target_id] for target_id in target_ids]
 
 
-def get_setup(url, token, entry_id):
-    data = get_information(url, token, entry_id, "data.setup")
+def get_setup(url, token, entry_id, required=None):
+    data = get_information(url, token, entry_id, "data.setup", required)
     assert data and len(data) == 1, "No Setup found"
     return data[0]
 
-def get_environment(url, token, entry_id):
-    data = get_information(url, token, entry_id, "data.environment")
+def get_environment(url, token, entry_id, required=None):
+    data = get_information(url, token, entry_id, "data.environment", required)
     assert data and len(data) == 1, "No Environment found"
     return data[0]
     
-def get_samples(url, token, entry_id):
-    data = get_information(url, token, entry_id, "data.samples.reference")
+def get_samples(url, token, entry_id, required=None):
+    data = get_information(url, token, entry_id, "data.samples.reference", required)
     assert data and len(data) > 0, "No Samples found"
     return data
 
@@ -230,10 +409,7 @@ def get_specific_data_of_sample(url, token, sample_id, entry_type, with_meta=Fal
             'page_size': 100
         }
     }
-    response = requests.post(f'{url}/entries/archive/query',
-                             headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    linked_data = response.json()["data"]
+    linked_data = get_client(url, token).post('/entries/archive/query', json=query)["data"]
     res = []
     for ldata in linked_data:
         if "entry_type" not in ldata["archive"]["metadata"] or entry_type not in ldata["archive"]["metadata"]["entry_type"]:
@@ -244,209 +420,31 @@ def get_specific_data_of_sample(url, token, sample_id, entry_type, with_meta=Fal
             res.append(ldata["archive"]["data"])
     return res
 
-def get_all_JV(url, token, sample_ids, jv_type="perolab_JVmeasurement"):
-    # collect the results of the sample, in this case it are all the annealing temperatures
-    def process_jv_with_metadata(jv_data_with_metadata):
-        """
-        Process JV data including metadata for status extraction
-        Add this to your data processing pipeline
-        """
-        processed_data = []
-        
-        for sample_id, measurements in jv_data_with_metadata.items():
-            for data, metadata in measurements:
-                # Extract status from metadata
-                # status = extract_status_from_metadata(data, metadata)  # Function not defined
-                
-                # Add status to the data
-                # data['status'] = status
-                
-                processed_data.append(data)
-        
-        return processed_data
-    
-    query = {
-        'required': {
-            'metadata': '*'
-        },
-        'owner': 'visible',
-        'query': {'results.eln.lab_ids:any': sample_ids},
-        'pagination': {
-            'page_size': 10000
-        }
-    }
-    response = requests.post(
-        f'{url}/entries/query', headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    
-    entry_ids = [entry["entry_id"] for entry in response.json()["data"]]
-    
-    query = {
-        'required': {
-            'data': '*',
-            'metadata': '*',
-        },
-        'owner': 'visible',
-        'query': {'entry_references.target_entry_id:any': entry_ids,
-                 'entry_type':jv_type},
-        'pagination': {
-            'page_size': 10000
-        }
-    }
-    response = requests.post(f'{url}/entries/archive/query',
-                             headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    linked_data = response.json()["data"]
-    res = {}
-    for ldata in linked_data:
-        lab_id = ldata["archive"]["data"]["samples"][0]["lab_id"]
-        if lab_id not in res:
-            res[lab_id] = []
-        res[lab_id].append((ldata["archive"]["data"],ldata["archive"]["metadata"]))
-    return res
+def iter_all_JV(url, token, sample_ids, jv_type="perolab_JVmeasurement", page_size=PAGE_SIZE):
+    # stream of (lab_id, data, metadata), e.g. to build DataFrames without holding all archives in memory
+    yield from iter_measurements_of_samples(url, token, sample_ids, {'entry_type': jv_type}, page_size)
 
-def get_all_measurements_except_JV(url, token, sample_ids):
-    # collect the results of the sample, in this case it are all the annealing temperatures
-    query = {
-        'required': {
-            'metadata': '*'
-        },
-        'owner': 'visible',
-        'query': {'results.eln.lab_ids:any': sample_ids},
-        'pagination': {
-            'page_size': 10000
-        }
-    }
-    response = requests.post(
-        f'{url}/entries/query', headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    
-    entry_ids = [entry["entry_id"] for entry in response.json()["data"]]
-    
-    query = {
-        'required': {
-            'data': '*',
-            'metadata': '*',
-        },
-        'owner': 'visible',
-        'query': {'entry_references.target_entry_id:any': entry_ids,
-                 'section_defs.definition_qualified_name': 'baseclasses.BaseMeasurement'},
-        'pagination': {
-            'page_size': 10000
-        }
-    }
-    response = requests.post(f'{url}/entries/archive/query',
-                             headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    linked_data = response.json()["data"]
-    res = {}
-    for ldata in linked_data:
-        if "entry_type" not in ldata["archive"]["metadata"] or "JV" in ldata["archive"]["metadata"]["entry_type"]:
-            continue
-        lab_id = ldata["archive"]["data"]["samples"][0]["lab_id"]
-        if lab_id not in res:
-            res[lab_id] = []
-        res[lab_id].append((ldata["archive"]["data"],ldata["archive"]["metadata"]))
-    return res
+def get_all_JV(url, token, sample_ids, jv_type="perolab_JVmeasurement", page_size=PAGE_SIZE):
+    return group_by_lab_id(iter_all_JV(url, token, sample_ids, jv_type, page_size))
 
-def get_all_eqe(url, token, sample_ids, eqe_type="perolab_EQEmeasurement"):
-    query = {
-        'required': {
-            'metadata': '*'
-        },
-        'owner': 'visible',
-        'query': {'results.eln.lab_ids:any': sample_ids},
-        'pagination': {
-            'page_size': 100
-        }
-    }
-    response = requests.post(
-        f'{url}/entries/query', headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    
-    entry_ids = [entry["entry_id"] for entry in response.json()["data"]]
-    
-    query = {
-        'required': {
-            'data': '*',
-            'metadata': '*',
-        },
-        'owner': 'visible',
-        'query': {'entry_references.target_entry_id:any': entry_ids,
-                 'entry_type':eqe_type},
-        'pagination': {
-            'page_size': 100
-        }
-    }
-    response = requests.post(f'{url}/entries/archive/query',
-                             headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    linked_data = response.json()["data"]
-    res = {}
-    for ldata in linked_data:
-        lab_id = ldata["archive"]["data"]["samples"][0]["lab_id"]
-        if lab_id not in res:
-            res[lab_id] = []
-        res[lab_id].append((ldata["archive"]["data"],ldata["archive"]["metadata"]))
-    return res
+def get_all_measurements_except_JV(url, token, sample_ids, page_size=PAGE_SIZE):
+    measurements = iter_measurements_of_samples(
+        url, token, sample_ids, {'section_defs.definition_qualified_name': 'baseclasses.BaseMeasurement'}, page_size)
+    return group_by_lab_id(
+        (lab_id, data, metadata) for lab_id, data, metadata in measurements
+        if "entry_type" in metadata and "JV" not in metadata["entry_type"])
 
-def get_all_mppt(url, token, sample_ids, mppt_type="perolab_SimpleMPPTracking"):
-    query = {
-        'required': {
-            'metadata': '*'
-        },
-        'owner': 'visible',
-        'query': {'results.eln.lab_ids:any': sample_ids},
-        'pagination': {
-            'page_size': 100
-        }
-    }
-    response = requests.post(
-        f'{url}/entries/query', headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    entry_ids = [entry["entry_id"] for entry in response.json()["data"]]
-    
-    query = {
-        'required': {
-            'data': '*',
-            'metadata': '*',
-        },
-        'owner': 'visible',
-        'query': {'entry_references.target_entry_id:any': entry_ids,
-                 'entry_type':mppt_type},
-        'pagination': {
-            'page_size': 100
-        }
-    }
-    response = requests.post(f'{url}/entries/archive/query',
-                             headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    linked_data = response.json()["data"]
-    res = {}
-    for ldata in linked_data:
-        lab_id = ldata["archive"]["data"]["samples"][0]["lab_id"]
-        if lab_id not in res:
-            res[lab_id] = []
-        res[lab_id].append((ldata["archive"]["data"],ldata["archive"]["metadata"]))
-    return res
+def get_all_eqe(url, token, sample_ids, eqe_type="perolab_EQEmeasurement", page_size=PAGE_SIZE):
+    return group_by_lab_id(iter_measurements_of_samples(url, token, sample_ids, {'entry_type': eqe_type}, page_size))
 
-def get_processing_steps(url, token, sample_ids, process_type="baseclasses.BaseProcess"):
+def get_all_mppt(url, token, sample_ids, mppt_type="perolab_SimpleMPPTracking", page_size=PAGE_SIZE):
+    return group_by_lab_id(iter_measurements_of_samples(url, token, sample_ids, {'entry_type': mppt_type}, page_size))
+
+def get_processing_steps(url, token, sample_ids, process_type="baseclasses.BaseProcess", page_size=PAGE_SIZE):
     # collect the entry ids of the samples
-    query = {
-        'required': {
-            'metadata': '*'
-        },
-        'owner': 'visible',
-        'query': {'results.eln.lab_ids:any': sample_ids},
-        'pagination': {
-            'page_size': 10000
-        }
-    }
-    response = requests.post(
-        f'{url}/entries/query', headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    
-    entry_ids = [entry["entry_id"] for entry in response.json()["data"]]
+    entry_ids = get_entry_ids_of_samples(url, token, sample_ids, page_size)
+    if not entry_ids:
+        return []
     
     query = {
         'required': {
@@ -455,30 +453,21 @@ def get_processing_steps(url, token, sample_ids, process_type="baseclasses.BaseP
         'owner': 'visible',
         'query': {'entry_references.target_entry_id:any': entry_ids,
                  'section_defs.definition_qualified_name': process_type},
-        'pagination': {
-            'page_size': 10000
-        }
     }
-    response = requests.post(f'{url}/entries/archive/query',
-                             headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
-    data = list(map(lambda process : process["archive"]["data"], response.json()["data"]))
+    data = [process["archive"]["data"] for process in iter_query(url, token, query, page_size=page_size)]
     # delete entries for which "position_in_experimental_plan" is not defined, these are likely not proper processing steps
     data = [step for step in data if "positon_in_experimental_plan" in step]
     data.sort(key=lambda process : process["positon_in_experimental_plan"])
     return data
 
-def get_efficiencies(url, token, sample_ids):
+def get_efficiencies(url, token, sample_ids, page_size=PAGE_SIZE):
     query = {
         "required": {"results":{"properties":{"optoelectronic":{"solar_cell":{"efficiency":"*"}}}, "eln":{"lab_ids":"*"}}},
         'query': {'results.eln.lab_ids:any': sample_ids, "results.properties.optoelectronic.solar_cell.efficiency:gt":"0"},
         'owner': 'visible'
     }
-    response = requests.post(f'{url}/entries/archive/query',
-                             headers={'Authorization': f'Bearer {token}'}, json=query)
-    response.raise_for_status()
     #return dict with entries lab_id:efficiency
     return dict(map(lambda x:(x["archive"]["results"]["eln"]["lab_ids"][0],
                               x["archive"]["results"]["properties"]["optoelectronic"]["solar_cell"]["efficiency"]),
-                    response.json()["data"]
+                    iter_query(url, token, query, page_size=page_size)
                    ))
@@ -0,0 +1,155 @@
+# local store of measurement entries for the voila scripts
+
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+
+from api_calls import PAGE_SIZE, get_entry_ids_of_samples, get_user_id, group_by_lab_id, iter_query, load_hdf5_arrays
+
+# default folder of the stores (one file per NOMAD url and user)
+STORE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "nomad_perolab_umr")
+# maximum number of lab_ids in one "lab_id IN (...)" query (SQLite allows 999 variables in older versions)
+SQLITE_CHUNK_SIZE = 900
+
+# measurement kinds and the query to find their entries
+KINDS = {
+    "jv": {'entry_type': "perolab_JVmeasurement"},
+    "eqe": {'entry_type': "perolab_EQEmeasurement"},
+    "mppt": {'entry_type': "perolab_SimpleMPPTracking"},
+}
+
+
+class LocalStore:
+    """
+    SQLite store of JV, EQE and MPPT entries, keyed by entry_id and last_processing_time.
+
+    refresh() only lists entry_id and last_processing_time of the entries on the server and downloads
+    the entries that are new or were processed again since the last sync. Entries which are not visible anymore
+    are removed. The notebooks then read the measurements directly from the store:
+
+        store = LocalStore.for_user(url, token)
+        store.refresh(url, token, sample_ids, "jv")
+        all_jvs = store.get_measurements("jv", sample_ids)
+
+    The store only contains what was fetched with the token of the user. for_user() therefore opens one
+    store file per NOMAD url and user id, so users of one Voila deployment or different NOMAD instances
+    never share a store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                entry_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                lab_id TEXT,
+                upload_id TEXT,
+                last_processing_time TEXT,
+                data TEXT,
+                metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS entries_kind_lab_id ON entries (kind, lab_id);
+            CREATE TABLE IF NOT EXISTS sync (
+                kind TEXT PRIMARY KEY,
+                last_sync TEXT
+            );
+        """)
+
+    @classmethod
+    def for_user(cls, url, token, directory=None):
+        # store file of the user of the token on the NOMAD instance with this url
+        key = hashlib.sha1(f"{url.rstrip('/')}|{get_user_id(url, token)}".encode()).hexdigest()[:16]
+        directory = directory or STORE_DIRECTORY
+        os.makedirs(directory, exist_ok=True)
+        return cls(os.path.join(directory, f"nomad_local_store_{key}.sqlite"))
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _stored_processing_times(self, kind, sample_ids):
+        rows = self._select("SELECT entry_id, last_processing_time FROM entries", kind, sample_ids)
+        return dict(rows)
+
+    def _select(self, columns, kind, sample_ids):
+        # chunks of sorted lab_ids, so the rows of all chunks together are still ordered by lab_id
+        sample_ids = sorted(set(sample_ids))
+        rows = []
+        for i in range(0, len(sample_ids), SQLITE_CHUNK_SIZE):
+            chunk = sample_ids[i:i + SQLITE_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(self.connection.execute(
+                f"{columns} WHERE kind = ? AND lab_id IN ({placeholders}) ORDER BY lab_id",
+                [kind, *chunk]).fetchall())
+        return rows
+
+    def refresh(self, url, token, sample_ids, kind, measurement_query=None, page_size=PAGE_SIZE):
+        """
+        Synchronizes the entries of one kind for the samples. Returns (number of downloaded, number of removed entries).
+        """
+        measurement_query = measurement_query or KINDS[kind]
+        entry_ids = get_entry_ids_of_samples(url, token, sample_ids, page_size)
+
+        # 1. list entry_id and last_processing_time of the entries on the server (metadata only)
+        #    no visible samples -> no entries, all stored entries of the samples are removed below
+        server_times = {}
+        if entry_ids:
+            query = {
+                'required': {'include': ['entry_id', 'last_processing_time']},
+                'owner': 'visible',
+                'query': {'entry_references.target_entry_id:any': entry_ids, **measurement_query},
+            }
+            server_times = {entry["entry_id"]: entry.get("last_processing_time")
+                            for entry in iter_query(url, token, query, "/entries/query", page_size)}
+
+        # 2. download only new or changed entries
+        stored_times = self._stored_processing_times(kind, sample_ids)
+        changed = [entry_id for entry_id, time in server_times.items() if stored_times.get(entry_id) != time]
+        for i in range(0, len(changed), page_size):
+            query = {
+                'required': {'data': '*', 'metadata': '*'},
+                'owner': 'visible',
+                'query': {'entry_id:any': changed[i:i + page_size]},
+            }
+            rows = []
+            for entry in iter_query(url, token, query, page_size=page_size):
+                data, metadata = entry["archive"]["data"], entry["archive"]["metadata"]
+                # arrays stored in HDF5 files are stored in the local store like all other arrays
+                load_hdf5_arrays(url, token, metadata.get("upload_id"), data)
+                samples = data.get("samples") or [{}]
+                rows.append((
+                    entry["entry_id"], kind, samples[0].get("lab_id"), metadata.get("upload_id"),
+                    server_times.get(entry["entry_id"]), json.dumps(data), json.dumps(metadata)))
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+        # 3. remove entries which do not exist (or are not visible) anymore
+        removed = [entry_id for entry_id in stored_times if entry_id not in server_times]
+        with self.connection:
+            self.connection.executemany("DELETE FROM entries WHERE entry_id = ?", [(entry_id,) for entry_id in removed])
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sync VALUES (?, ?)", (kind, datetime.datetime.now().isoformat()))
+
+        return len(changed), len(removed)
+
+    def last_sync(self, kind):
+        row = self.connection.execute("SELECT last_sync FROM sync WHERE kind = ?", (kind,)).fetchone()
+        return row[0] if row else None
+
+    def iter_measurements(self, kind, sample_ids):
+        # stream of (lab_id, data, metadata), same format as api_calls.iter_all_JV
+        rows = self._select("SELECT lab_id, data, metadata FROM entries", kind, sample_ids)
+        for lab_id, data, metadata in rows:
+            yield lab_id, json.loads(data), json.loads(metadata)
+
+    def get_measurements(self, kind, sample_ids):
+        # dict lab_id: [(data, metadata), ...], same format as api_calls.get_all_JV
+        return group_by_lab_id(self.iter_measurements(kind, sample_ids))
@@ -18,8 +18,11 @@
 
 
 
+# Imports Python
+import numpy as np
+
 # Imports Nomad
-from nomad.datamodel.data import EntryData
+from nomad.datamodel.data import ArchiveSection, EntryData
 from nomad.datamodel.metainfo.basesections import Entity
 from nomad.metainfo import MEnum, Quantity, SchemaPackage, Section, SubSection
 
@@ -37,6 +40,133 @@ m_package = SchemaPackage(aliases=['UMR_schemas.batch'])
 
 
 
+################################ JV STATISTICS ################################
+# The light JV curves of all samples of a batch are stored as rows (arrays) in UMR_JVResults on the batch entry.
+# When a JV measurement is normalized it only replaces its own rows and recalculates the statistics of its group
+# and of the whole batch from these rows, the other JV measurements of the batch are not loaded again.
+# The batch is read again right before it is written and the own rows are checked after the write, so rows of
+# JV measurements which are processed in parallel are not lost (see update_batch_jv_statistics).
+# The button 'update_jv_statistics' of the batch rebuilds all rows from the search (repair, e.g. after deleted entries).
+
+# (quantity in UMR_SolarCellJVCurve, label, unit for conversion)
+JV_STATISTICS_PARAMETERS = [
+    ('efficiency', 'PCE (%)', None),
+    ('open_circuit_voltage', 'Voc (V)', 'V'),
+    ('short_circuit_current_density', 'Jsc (mA/cm²)', 'mA/cm^2'),
+    ('fill_factor', 'FF', None),
+]
+JV_STATISTICS_SCANS = ['All', 'Forward', 'Reverse']
+
+
+class UMR_ParameterStatistics(ArchiveSection):
+    '''Distribution of one JV parameter for one scan direction'''
+    m_def = Section(label_quantity='display_name')
+
+    display_name = Quantity(type=str)
+    parameter = Quantity(type=str)
+    scan = Quantity(type=MEnum(JV_STATISTICS_SCANS))
+    count = Quantity(type=int)
+    mean = Quantity(type=np.dtype(np.float64))
+    median = Quantity(type=np.dtype(np.float64))
+    lower_quartile = Quantity(type=np.dtype(np.float64))
+    upper_quartile = Quantity(type=np.dtype(np.float64))
+    best = Quantity(type=np.dtype(np.float64))
+
+
+class UMR_JVStatistics(ArchiveSection):
+    '''PCE, Voc, Jsc and FF statistics of a batch or group (per scan direction)'''
+    m_def = Section()
+
+    number_of_measurements = Quantity(type=int)
+    number_of_curves = Quantity(type=int)
+    statistics = SubSection(section_def=UMR_ParameterStatistics, repeats=True)
+
+    @classmethod
+    def from_rows(cls, rows):
+        '''Calculates the statistics from the rows of UMR_JVResults (dict of arrays, see UMR_JVResults.rows)'''
+        section = cls(
+            number_of_measurements=len(set(rows['entry_ids'])),
+            number_of_curves=len(rows['entry_ids']))
+        scans = np.asarray(rows['scans'], dtype=object)
+        for scan in JV_STATISTICS_SCANS:
+            in_scan = np.ones(len(scans), dtype=bool) if scan == 'All' else scans == scan
+            for quantity, label, _ in JV_STATISTICS_PARAMETERS:
+                values = rows[quantity][in_scan]
+                values = values[np.isfinite(values)]
+                if not len(values):
+                    continue
+                lower, median, upper = np.percentile(values, [25, 50, 75])
+                section.statistics.append(UMR_ParameterStatistics(
+                    display_name=f'{label} - {scan}', parameter=quantity, scan=scan,
+                    count=len(values), mean=values.mean(), median=median,
+                    lower_quartile=lower, upper_quartile=upper, best=values.max()))
+        return section
+
+
+class UMR_JVResults(ArchiveSection):
+    '''One row per light JV curve of the samples of a batch (basis of the JV statistics)'''
+    m_def = Section()
+
+    entry_ids = Quantity(type=str, shape=['*'], description='Entry id of the JV measurement of each curve')
+    group_numbers = Quantity(type=np.dtype(np.int64), shape=['*'], description='Group number of the sample (0 = no group)')
+    scans = Quantity(type=str, shape=['*'])
+    efficiency = Quantity(type=np.dtype(np.float64), shape=['*'])
+    open_circuit_voltage = Quantity(type=np.dtype(np.float64), shape=['*'], unit='V')
+    short_circuit_current_density = Quantity(type=np.dtype(np.float64), shape=['*'], unit='mA/cm^2')
+    fill_factor = Quantity(type=np.dtype(np.float64), shape=['*'])
+
+    def rows(self, mask=None):
+        '''Returns the rows as dict of numpy arrays (magnitudes), optionally only the rows in mask'''
+        rows = dict(
+            entry_ids=np.asarray(self.entry_ids if self.entry_ids is not None else [], dtype=object),
+            group_numbers=np.asarray(self.group_numbers if self.group_numbers is not None else [], dtype=np.int64),
+            scans=np.asarray(self.scans if self.scans is not None else [], dtype=object))
+        for quantity, _, unit in JV_STATISTICS_PARAMETERS:
+            values = getattr(self, quantity)
+            if values is None:
+                values = []
+            elif hasattr(values, 'to'):
+                values = values.to(unit).magnitude if unit else values.magnitude
+            rows[quantity] = np.asarray(values, dtype=np.float64)
+        if mask is not None:
+            rows = {key: value[mask] for key, value in rows.items()}
+        return rows
+
+    def replace_measurement(self, entry_id, group_number, new_rows):
+        '''
+        Replaces the rows of one JV measurement.
+        new_rows is a dict with the scans and parameter arrays of its curves.
+        Returns False if nothing changed (then the batch does not need to be written).
+        '''
+        rows = self.rows()
+        own = rows['entry_ids'] == entry_id
+        count = len(new_rows['scans'])
+        if own.sum() == count and np.all(rows['group_numbers'][own] == group_number) \
+                and list(rows['scans'][own]) == list(new_rows['scans']) \
+                and all(np.allclose(rows[q][own], new_rows[q], equal_nan=True) for q, _, _ in JV_STATISTICS_PARAMETERS):
+            return False
+
+        keep = ~own
+        self.entry_ids = list(rows['entry_ids'][keep]) + [entry_id] * count
+        self.group_numbers = np.concatenate([rows['group_numbers'][keep], np.full(count, group_number, dtype=np.int64)])
+        self.scans = list(rows['scans'][keep]) + list(new_rows['scans'])
+        for quantity, _, _ in JV_STATISTICS_PARAMETERS:
+            setattr(self, quantity, np.concatenate([rows[quantity][keep], np.asarray(new_rows[quantity], dtype=np.float64)]))
+        return True
+
+    @classmethod
+    def from_rows(cls, rows):
+        '''Creates the section from rows (dict of lists or arrays, keys like in rows())'''
+        section = cls(
+            entry_ids=list(rows['entry_ids']),
+            group_numbers=np.asarray(rows['group_numbers'], dtype=np.int64),
+            scans=list(rows['scans']))
+        for quantity, _, _ in JV_STATISTICS_PARAMETERS:
+            setattr(section, quantity, np.asarray(rows[quantity], dtype=np.float64))
+        return section
+
+
+
 ################################ Group ################################
 
 class UMR_Group(Entity, EntryData):
@@ -85,6 +215,9 @@ class UMR_Group(Entity, EntryData):
 
     substrates = SubSection(
         section_def = UMR_EntityReference, repeats=True)
+
+    jv_statistics = SubSection(
+        section_def = UMR_JVStatistics)
         
     def normalize(self, archive, logger):
         # Automatically generate display_name
@@ -118,6 +251,20 @@ class UMR_Batch(Entity):
     
     groups = SubSection(
         section_def = UMR_Group, repeats=True)
+
+    jv_statistics = SubSection(
+        section_def = UMR_JVStatistics)
+
+    jv_results = SubSection(
+        section_def = UMR_JVResults)
+
+    update_jv_statistics = Quantity(
+        type=bool,
+        label="Update JV statistics",
+        description="Collects the light JV curves of all samples of this batch again and recalculates the JV statistics of the batch and of its groups. "
+                    "The statistics are updated by every JV measurement, use this to repair them (e.g. after JV measurements were deleted).",
+        default=False,
+        a_eln=dict(component='ActionEditQuantity'))
     
     def normalize(self, archive, logger):
     
@@ -126,13 +273,48 @@ class UMR_Batch(Entity):
             self.samples = sort_and_deduplicate_subsection(self.samples)
         if self.substrates:
             self.selected_samples = sort_and_deduplicate_subsection(self.substrates)
+
+        # BUTTON: update JV statistics
+        if self.update_jv_statistics:
+            self.update_jv_statistics = False
+            self.recalculate_jv_statistics(archive, logger)
       
         super().normalize(archive, logger)
 
+    def merge_jv_measurement(self, entry_id, group_number, new_rows):
+        '''
+        Replaces the JV curves of one measurement and recalculates the statistics of the batch and of the
+        group of the sample. Returns False if nothing changed.
+        '''
+        if not self.jv_results:
+            self.jv_results = UMR_JVResults()
+        if not self.jv_results.replace_measurement(entry_id, group_number or 0, new_rows):
+            return False
+
+        rows = self.jv_results.rows()
+        self.jv_statistics = UMR_JVStatistics.from_rows(rows)
+        group = next((g for g in self.groups if g.group_number == group_number), None) if group_number else None
+        if group is not None:
+            group.jv_statistics = UMR_JVStatistics.from_rows(self.jv_results.rows(rows['group_numbers'] == group_number))
+        return True
+
+    def recalculate_jv_statistics(self, archive, logger):
+        '''
+        Collects the light JV curves of all samples of the batch and recalculates the statistics of the batch
+        and of its groups. Curves of deleted JV measurements or of samples which were moved to another batch
+        are not collected anymore and therefore removed.
+        '''
+        rows = collect_batch_jv_rows(self, archive, logger)
+        self.jv_results = UMR_JVResults.from_rows(rows)
+        rows = self.jv_results.rows()
+        self.jv_statistics = UMR_JVStatistics.from_rows(rows)
+        for group in self.groups:
+            in_group = rows['group_numbers'] == (group.group_number or 0)
+            group.jv_statistics = UMR_JVStatistics.from_rows(self.jv_results.rows(in_group)) if in_group.any() else None
+        log_info(self, logger, f"JV STATISTICS | {len(rows['entry_ids'])} curves of "
+                               f"{len(set(rows['entry_ids']))} JV measurements collected")
 
 
-    
-
 class UMR_ExternalBatch(UMR_Batch, EntryData):
     m_def = Section(
         categories=[UMRCollectionCategory],
@@ -208,4 +390,142 @@ class UMR_InternalBatch(UMR_Batch, EntryData):
 
 
 
+
+# How often a JV measurement writes the batch again if its rows were overwritten by a parallel write
+JV_STATISTICS_WRITE_ATTEMPTS = 3
+
+
+def update_batch_jv_statistics(entry, archive, logger):
+    '''
+    Updates the JV statistics of the batch of the referenced sample with the light JV curves of entry (UMR_JVMeasurement).
+    Only the batch entry is loaded and written, no other JV measurement.
+    The batch is read right before every write and the rows of entry are merged into it. After the write it is read
+    again: if another JV measurement wrote the batch in the meantime without these rows, they are merged and written
+    again. Nothing is written if the rows did not change.
+    '''
+    if not entry.samples or not entry.jv_curve:
+        return
+    try:
+        sample = entry.samples[0].reference
+        batch_resolved = sample.batch.m_resolved() if sample.batch is not None else None
+    except Exception as e:
+        log_warning(entry, logger, f"JV STATISTICS | Could not resolve the batch of the sample --- Exception {e}")
+        return
+    if batch_resolved is None:
+        return
+    batch_metadata = batch_resolved.m_root().metadata
+    if batch_metadata.upload_id != archive.metadata.upload_id:
+        log_info(entry, logger, "JV STATISTICS | The batch is in another upload and is not updated.")
+        return
+
+    new_rows = dict(scans=[])
+    for quantity, _, _ in JV_STATISTICS_PARAMETERS:
+        new_rows[quantity] = []
+    for curve in entry.jv_curve:
+        if curve.dark:
+            continue
+        new_rows['scans'].append(curve.scan or 'All')
+        for quantity, _, unit in JV_STATISTICS_PARAMETERS:
+            value = getattr(curve, quantity)
+            if value is not None and hasattr(value, 'to'):
+                value = value.to(unit).magnitude if unit else value.magnitude
+            new_rows[quantity].append(np.nan if value is None else float(value))
+
+    for attempt in range(JV_STATISTICS_WRITE_ATTEMPTS + 1):
+        # Read the batch again (no cache across attempts), rows written by other JV measurements are kept
+        cache = ArchiveCache(entry, archive, logger)
+        batch = cache.get(batch_resolved, batch_metadata.mainfile)
+        if not batch.merge_jv_measurement(archive.metadata.entry_id, sample.group_number, new_rows):
+            if attempt:
+                log_info(entry, logger, f"JV STATISTICS | Updated statistics of batch {batch.lab_id}")
+            return
+        if attempt == JV_STATISTICS_WRITE_ATTEMPTS:
+            break
+        cache.mark_dirty(batch_metadata.mainfile)
+        if not cache.flush():
+            return
+    log_warning(entry, logger, f"JV STATISTICS | The statistics of batch {batch.lab_id} were changed by other JV measurements "
+                               f"during {JV_STATISTICS_WRITE_ATTEMPTS} attempts. Use the button 'Update JV statistics' of the batch.")
+
+
+SAMPLE_ENTRY_TYPES = ['UMR_InternalSolarCell', 'UMR_ExternalSolarCell']
+JV_ENTRY_TYPE = 'UMR_JVMeasurement'
+SEARCH_CHUNK_SIZE = 100  # entry ids per search query
+
+
+def _search_all(archive, query, include):
+    # all search results of the query (page by page)
+    from nomad.app.v1.models.models import MetadataPagination, MetadataRequired
+    pagination = MetadataPagination(page_size=SEARCH_CHUNK_SIZE)
+    required = MetadataRequired(include=include)
+    results = []
+    while True:
+        search_result = UMR_search(archive, query, pagination, required)
+        results.extend(search_result.data)
+        next_value = search_result.pagination.next_page_after_value
+        if not search_result.data or not next_value:
+            return results
+        pagination.page_after_value = next_value
+
+
+def collect_batch_jv_rows(batch, archive, logger):
+    '''
+    Collects one row per light JV curve of the samples which reference the batch (see UMR_JVResults).
+    Only the group number of the samples and the scan, dark flag and figures of merit of the curves are read
+    from the archives of the entries, not the whole JV measurements.
+    '''
+    from nomad import files
+
+    from .characterization.jv_measurement import UMR_SolarCellJVCurve
+
+    rows = dict(entry_ids=[], group_numbers=[], scans=[])
+    for quantity, _, _ in JV_STATISTICS_PARAMETERS:
+        rows[quantity] = []
+
+    # Samples of the batch and their group numbers
+    samples = _search_all(
+        archive,
+        {'entry_references.target_entry_id': archive.metadata.entry_id, 'entry_type:any': SAMPLE_ENTRY_TYPES},
+        ['upload_id', 'entry_id'])
+    group_numbers = {}
+    for res in samples:
+        try:
+            with files.UploadFiles.get(res['upload_id']).read_archive(res['entry_id']) as sample_archive:
+                group_numbers[res['entry_id']] = sample_archive[res['entry_id']]['data'].get('group_number') or 0
+        except Exception as e:
+            log_warning(batch, logger, f"JV STATISTICS | Could not read sample {res['entry_id']} --- Exception {e}")
+    sample_ids = sorted(group_numbers)
+
+    # JV measurements of the samples (in chunks of sample ids)
+    curve_quantities = UMR_SolarCellJVCurve.m_def.all_quantities
+    for start in range(0, len(sample_ids), SEARCH_CHUNK_SIZE):
+        chunk = sample_ids[start:start + SEARCH_CHUNK_SIZE]
+        measurements = _search_all(
+            archive,
+            {'entry_references.target_entry_id:any': chunk, 'entry_type': JV_ENTRY_TYPE},
+            ['upload_id', 'entry_id', 'entry_references'])
+        for res in measurements:
+            sample_id = next((ref.get('target_entry_id') for ref in res.get('entry_references', [])
+                              if ref.get('target_entry_id') in group_numbers), None)
+            try:
+                with files.UploadFiles.get(res['upload_id']).read_archive(res['entry_id']) as jv_archive:
+                    curves = jv_archive[res['entry_id']]['data'].get('jv_curve') or []
+                    for curve in curves:
+                        if curve.get('dark'):
+                            continue
+                        rows['entry_ids'].append(res['entry_id'])
+                        rows['group_numbers'].append(group_numbers[sample_id])
+                        rows['scans'].append(curve.get('scan') or 'All')
+                        for quantity, _, unit in JV_STATISTICS_PARAMETERS:
+                            value = curve.get(quantity)
+                            definition_unit = curve_quantities[quantity].unit
+                            if value is not None and unit and definition_unit is not None:
+                                value = (value * definition_unit).to(unit).magnitude
+                            rows[quantity].append(np.nan if value is None else float(value))
+            except Exception as e:
+                log_warning(batch, logger, f"JV STATISTICS | Could not read JV measurement {res['entry_id']} --- Exception {e}")
+
+    return rows
+
+
 m_package.__init_metainfo__()
@@ -37,7 +37,11 @@ from ..categories import *
 from ..helper_functions import *
 
 # Imports UMR
-from .measurement_baseclasses import UMR_MeasurementBaseclass, UMR_TrackingData
+from .measurement_baseclasses import (
+    UMR_MeasurementBaseclass,
+    UMR_TrackingData,
+    finalize_array_storage,
+)
 
 m_package = SchemaPackage(aliases=['UMR_schemas.characterization.connection_test']) 
 
@@ -191,6 +195,8 @@ class UMR_ConnectionTest(UMR_MeasurementBaseclass, BaseMeasurement, PlotSection,
 
         super().normalize(archive, logger)
 
+        finalize_array_storage(self, archive, logger)
+
 
 class UMR_StabilizedShortCircuitCurrent(UMR_ConnectionTest):
     '''Extra Section for Mode "Short-Circuit Current"'''
@@ -84,6 +84,25 @@ class UMR_SolarCellEQE(ArchiveSection):
         description='Light Intensity Array in mW/cm²',
     )
 
+    # Results of the EQE analysis (read_and_parse/eqe_analysis.py)
+    integrated_short_circuit_current_density = Quantity(
+        type=np.dtype(np.float64),
+        unit='mA/cm^2',
+        description='Short circuit current density integrated over the AM1.5G spectrum',
+    )
+
+    bandgap = Quantity(
+        type=np.dtype(np.float64),
+        unit='eV',
+        description='Bandgap from the inflection point of the absorption edge (maximum of dEQE/dE)',
+    )
+
+    urbach_energy = Quantity(
+        type=np.dtype(np.float64),
+        unit='meV',
+        description='Urbach energy from the exponential EQE tail below the bandgap',
+    )
+
 
 class UMR_EQEMeasurement(BaseMeasurement, PlotSection, EntryData, UMR_MeasurementBaseclass):
     '''Main Section for EQE Measurement'''
@@ -162,7 +181,8 @@ class UMR_EQEMeasurement(BaseMeasurement, PlotSection, EntryData, UMR_Measuremen
     # Subsection with EQE data from cicci file
     eqe_data = SubSection(section_def=UMR_SolarCellEQE)
 
-    # Subsection with NOMAD baseclass -> Takes data automatically from file and calulates bandgap, ...
+    # Subsection with NOMAD baseclass (old entries) -> read the data file again and calulated bandgap, ...
+    # New entries are analyzed directly from eqe_data (see read_and_parse/eqe_analysis.py)
     advanced_eqe_data = SubSection(section_def=SolarCellEQE)
 
 
@@ -180,12 +200,14 @@ class UMR_EQEMeasurement(BaseMeasurement, PlotSection, EntryData, UMR_Measuremen
                 parse_general_info(self, f.name, encoding)
                 from ..read_and_parse.eqe_parser import parse_eqe_data_to_archive
                 parse_eqe_data_to_archive(self, f.name, encoding)
-            
-            # Normalize advanced eqe section
+
+        # EQE ANALYSIS (integrated Jsc, bandgap, Urbach energy) from the eqe_data arrays
+        if self.eqe_data:
+            from ..read_and_parse.eqe_analysis import fill_eqe_parameters
             try:
-                self.advanced_eqe_data.normalize(archive, logger)
+                fill_eqe_parameters([self.eqe_data])
             except Exception as e:
-                log_error(self, logger, f"An error occured during normalization of the advanced_eqe_data section. Please check: {e}")
+                log_error(self, logger, f"An error occured during the EQE analysis. Please check: {e}")
 
           
         # REFERENCE SAMPLE
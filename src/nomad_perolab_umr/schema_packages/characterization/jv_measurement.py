@@ -39,7 +39,12 @@ from Solar.plottemplate.umr_plot_template import umr
             
 # Imports UMR
 from ..categories import *
-from ..characterization.measurement_baseclasses import UMR_MeasurementBaseclass
+from ..characterization.measurement_baseclasses import (
+    UMR_HDF5ArrayStorage,
+    UMR_MeasurementBaseclass,
+    finalize_array_storage,
+    summarize_array,
+)
 from ..helper_functions import *
 
 m_package = SchemaPackage(aliases=['UMR_schemas.characterization.jv_measurement']) 
@@ -47,7 +52,7 @@ m_package = SchemaPackage(aliases=['UMR_schemas.characterization.jv_measurement'
 ################################ JV ################################
 
 
-class UMR_SolarCellJVCurve(SolarCellJV, EntryData):
+class UMR_SolarCellJVCurve(SolarCellJV, UMR_HDF5ArrayStorage, EntryData):
     '''JV Curve Section for JV Measurement'''
 
     m_def = Section(
@@ -128,11 +133,48 @@ class UMR_SolarCellJVCurve(SolarCellJV, EntryData):
         description='Voltage array of the of the JV curve.',
     )
 
+    # Summary scalars of the arrays (calculated in normalize, searchable without loading the arrays)
+    number_of_points = Quantity(
+        type=int,
+        description='Number of points of the JV curve.',
+    )
+    voltage_min = Quantity(
+        type=np.dtype(np.float64),
+        unit='V',
+        description='Start (minimum) voltage of the JV curve.',
+    )
+    voltage_max = Quantity(
+        type=np.dtype(np.float64),
+        unit='V',
+        description='End (maximum) voltage of the JV curve.',
+    )
+    current_density_min = Quantity(
+        type=np.dtype(np.float64),
+        unit='mA/cm^2',
+        description='Minimum current density of the JV curve.',
+    )
+    current_density_max = Quantity(
+        type=np.dtype(np.float64),
+        unit='mA/cm^2',
+        description='Maximum current density of the JV curve.',
+    )
+
 
     def normalize(self, archive, logger):
+        self.load_hdf5_arrays(archive)
+
         # fill "typo" quantity with the same value as new quantity
         self.current_density_at_maximun_power_point = self.current_density_at_maximum_power_point
 
+        # summary scalars of the arrays
+        if self.voltage is not None:
+            self.number_of_points = len(self.voltage)
+        for name, unit in [('voltage', 'V'), ('current_density', 'mA/cm^2')]:
+            summary = summarize_array(getattr(self, name), unit)
+            if summary:
+                setattr(self, f'{name}_min', summary['min'])
+                setattr(self, f'{name}_max', summary['max'])
+
         super().normalize(archive, logger)
 
 
@@ -155,6 +197,7 @@ class UMR_JVMeasurement(JVMeasurement, UMR_MeasurementBaseclass, PlotSection, En
                     'data_file', 'measurement_data_was_extracted_from_data_file', 'solar_cell_was_referenced',
                     'active_area', 'temperature',
                     'minimum_voltage', 'maximum_voltage', 'voltage_step', 'scan_rate', 'initial_delay', 'auto_detect_voc', 'scan_order',
+                    'hysteresis_index', 'hysteresis_area',
                     'description',
                     'jv_curve',])))
 
@@ -209,6 +252,18 @@ class UMR_JVMeasurement(JVMeasurement, UMR_MeasurementBaseclass, PlotSection, En
         type=MEnum('FW->RV', 'RV->FW'),
         a_eln=dict(component="EnumEditQuantity")
     )
+
+    # Hysteresis between reverse and forward scan (calculated in the parser, see jv_figures_of_merit.fill_hysteresis)
+    hysteresis_index = Quantity(
+        type=np.float64,
+        description="Hysteresis index (PCE_reverse - PCE_forward) / PCE_reverse.",
+    )
+
+    hysteresis_area = Quantity(
+        type=np.float64,
+        unit=('mW/cm^2'),
+        description="Area between reverse and forward JV curve between 0 V and Voc.",
+    )
     
     # JV Curve Subsection with JV Curve data and JV parameters
     jv_curve = SubSection(
@@ -291,8 +346,15 @@ class UMR_JVMeasurement(JVMeasurement, UMR_MeasurementBaseclass, PlotSection, En
         
         else:
             log_warning(self, logger, "No JV curve data available for plotting")
+
+        ### UPDATE JV STATISTICS OF THE BATCH ###
+        if self.jv_curve and self.samples:
+            from ..batch import update_batch_jv_statistics
+            update_batch_jv_statistics(self, archive, logger)
                       
         super().normalize(archive, logger)
 
+        finalize_array_storage(self, archive, logger)
+
 
 m_package.__init_metainfo__()
@@ -39,6 +39,63 @@ class UMR_AbsPLResult(AbsPLResult):
         a_eln=dict(component='NumberEditQuantity', label='iVoc'),
     )
 
+    # Calculated from the luminescence flux (see read_and_parse/luqy_analysis.py)
+    peak_wavelength = Quantity(
+        type=np.float64,
+        unit='nm',
+        description='Wavelength of the PL maximum (parabolic refinement around the highest point).',
+        a_eln=dict(component='NumberEditQuantity', defaultDisplayUnit='nm'),
+    )
+
+    peak_energy = Quantity(
+        type=np.float64,
+        unit='eV',
+        description='Photon energy of the PL maximum.',
+        a_eln=dict(component='NumberEditQuantity', defaultDisplayUnit='eV'),
+    )
+
+    fwhm = Quantity(
+        type=np.float64,
+        unit='meV',
+        description='Full width at half maximum of the PL peak in energy.',
+        a_eln=dict(component='NumberEditQuantity', defaultDisplayUnit='meV', label='FWHM'),
+    )
+
+    emitted_photon_flux = Quantity(
+        type=np.float64,
+        unit='1/(s*cm**2)',
+        description='Luminescence flux density integrated over the wavelength.',
+    )
+
+    # Calculated from the spectrum, the header values (luminescence_quantum_yield, quasi_fermi_level_splitting,
+    # i_voc, bandgap) are kept as they are. The luminescence flux is assumed to be given in 1/(s*cm**2*nm).
+    luminescence_quantum_yield_calculated = Quantity(
+        type=np.float64,
+        description='PLQY in % calculated from the emitted photon flux and the generation (header value Jsc).',
+        a_eln=dict(label='PLQY (calculated)'),
+    )
+
+    quasi_fermi_level_splitting_calculated = Quantity(
+        type=np.float64,
+        unit='eV',
+        description='QFLS calculated from the emitted photon flux and the radiative limit of bandgap_calculated.',
+        a_eln=dict(defaultDisplayUnit='eV', label='QFLS (calculated)'),
+    )
+
+    i_voc_calculated = Quantity(
+        type=np.float64,
+        unit='V',
+        description='iVoc calculated from the spectrum (QFLS / q).',
+        a_eln=dict(label='iVoc (calculated)'),
+    )
+
+    bandgap_calculated = Quantity(
+        type=np.float64,
+        unit='eV',
+        description='Bandgap used for the calculated QFLS: the header value or, if it is missing, the PL peak energy.',
+        a_eln=dict(defaultDisplayUnit='eV', label='Bandgap (calculated)'),
+    )
+
 
 
 class UMR_AbsPLMeasurement(AbsPLMeasurement, EntryData):
@@ -51,7 +108,7 @@ class UMR_AbsPLMeasurement(AbsPLMeasurement, EntryData):
 
         if self.data_file:
             try:
-                from nomad_perolab_umr.schema_packages.read_and_parse.luqy_parser import (
+                from ..read_and_parse.luqy_parser import (
                     parse_abspl_data,
                 )
 
@@ -76,14 +133,25 @@ class UMR_AbsPLMeasurement(AbsPLMeasurement, EntryData):
                     setattr(self.results[0], key, val)
 
                 # Set spectral array data
-                self.results[0].wavelength = np.array(wavelengths, dtype=float)
-                self.results[0].luminescence_flux_density = np.array(lum_flux, dtype=float)
-                self.results[0].raw_spectrum_counts = np.array(raw_counts, dtype=float)
-                self.results[0].dark_spectrum_counts = np.array(dark_counts, dtype=float)
+                self.results[0].wavelength = wavelengths
+                self.results[0].luminescence_flux_density = lum_flux
+                self.results[0].raw_spectrum_counts = raw_counts
+                self.results[0].dark_spectrum_counts = dark_counts
 
             except Exception as e:
                 logger.warning(f'Could not parse the data file "{self.data_file}": {e}')
                 print(e)
+
+        # PLQY, QFLS, iVoc, bandgap (*_calculated), peak and FWHM from the spectrum
+        if self.results:
+            try:
+                from ..read_and_parse.luqy_analysis import (
+                    fill_pl_parameters,
+                )
+
+                fill_pl_parameters(self.results)
+            except Exception as e:
+                logger.warning(f'Could not calculate the PL parameters: {e}')
         super().normalize(archive, logger)
 
 
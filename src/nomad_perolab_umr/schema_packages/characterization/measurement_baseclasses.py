@@ -18,12 +18,16 @@
 
 
 # Imports Python
+import base64
+import zlib
+
 import numpy as np
 from baseclasses import BaseMeasurement
 
 # Imports HZB
 from baseclasses.helper.utilities import get_encoding
 from nomad.datamodel.data import ArchiveSection, EntryData
+from nomad.datamodel.hdf5 import HDF5Reference
 from nomad.datamodel.metainfo.basesections import Measurement
 from nomad.datamodel.metainfo.plot import PlotSection
 
@@ -41,6 +45,152 @@ from ..categories import *
 # Imports UMR
 from ..helper_functions import *
 
+################################ HDF5 ARRAY STORAGE ################################
+
+HDF5_ARRAY_THRESHOLD = 1000      # arrays with more points are stored in HDF5
+HDF5_CHUNK_SIZE = 10000          # points per HDF5 chunk
+HDF5_COMPRESSION_LEVEL = 4       # gzip level
+
+
+class UMR_HDF5ArrayStorage(ArchiveSection):
+    '''Base section for sections whose 1-D arrays can be stored in an HDF5 file instead of the archive'''
+
+    m_def = Section()
+
+    hdf5_arrays = Quantity(
+        type=HDF5Reference,
+        shape=['*'],
+        description='References (file#dataset) of the arrays of this section which are stored in HDF5')
+
+    def array_quantities(self):
+        '''1-D quantities of this section (only float arrays are stored in HDF5)'''
+        return [quantity for quantity in self.m_def.all_quantities.values()
+                if list(quantity.shape) == ['*'] and quantity.name != 'hdf5_arrays']
+
+    def load_hdf5_arrays(self, archive):
+        '''Reads the arrays from HDF5 back into the quantities, so the plot functions see normal arrays'''
+        if not self.hdf5_arrays:
+            return
+        # Loaded values, an array which is unchanged at the end of normalize is not written again
+        self._hdf5_loaded = {}
+        for reference in self.hdf5_arrays:
+            name = reference.rsplit('/', 1)[-1]
+            if getattr(self, name) is None:
+                values = HDF5Reference.read_dataset(archive, reference)
+                setattr(self, name, values)
+                self._hdf5_loaded[name] = values
+
+
+def write_hdf5_datasets(archive, file_name, datasets):
+    '''
+    Writes the datasets {dataset path: values} into the HDF5 file file_name of the upload (chunked and gzip compressed).
+    An existing file is opened for appending and only these datasets are replaced.
+    '''
+    import h5py
+
+    mode = 'r+b' if archive.m_context.raw_path_exists(file_name) else 'wb'
+    with archive.m_context.raw_file(file_name, mode) as f, h5py.File(f, 'a') as h5:
+        for dataset, values in datasets.items():
+            if dataset in h5:
+                del h5[dataset]
+            h5.create_dataset(
+                dataset, data=values, chunks=(min(len(values), HDF5_CHUNK_SIZE),),
+                compression='gzip', compression_opts=HDF5_COMPRESSION_LEVEL, shuffle=True)
+
+
+def store_large_arrays_in_hdf5(entry, archive, logger):
+    '''
+    Moves all arrays with more than HDF5_ARRAY_THRESHOLD points of entry and its subsections into one HDF5 file
+    (<mainfile>.arrays.h5, chunked and gzip compressed). Only done for the root section of the archive if
+    store_large_arrays_in_hdf5 is set. The figures must already be created (called at the end of normalize).
+    Arrays which were loaded from the file and did not change are not written again.
+    '''
+    if archive.data is not entry:
+        return
+    file_name = f'{archive.metadata.mainfile}.arrays.h5'
+    if not getattr(entry, 'store_large_arrays_in_hdf5', False):
+        remove_hdf5_arrays(entry, archive, logger, file_name)
+        return
+
+    to_store = []  # (section, quantity name, reference)
+    to_write = {}  # dataset path: values (new or changed arrays)
+    for section in entry.m_all_contents(include_self=True):
+        if not isinstance(section, UMR_HDF5ArrayStorage):
+            continue
+        path = section.m_path().strip('/') or 'data'
+        loaded = getattr(section, '_hdf5_loaded', {})
+        for quantity in section.array_quantities():
+            values = getattr(section, quantity.name)
+            if values is None or len(values) <= HDF5_ARRAY_THRESHOLD:
+                continue
+            if hasattr(values, 'to'):
+                values = values.to(quantity.unit).magnitude if quantity.unit else values.magnitude
+            values = np.asarray(values)
+            if values.dtype.kind != 'f':
+                continue
+            dataset = f'{path}/{quantity.name}'
+            reference = f'{file_name}#{dataset}'
+            previous = loaded.get(quantity.name)
+            if reference not in (section.hdf5_arrays or []) or previous is None or not np.array_equal(previous, values, equal_nan=True):
+                to_write[dataset] = values
+            to_store.append((section, quantity.name, reference))
+
+    if to_write:
+        try:
+            write_hdf5_datasets(archive, file_name, to_write)
+        except Exception as e:
+            log_error(entry, logger, f"HDF5 STORAGE | Could not write {file_name}, arrays stay in the archive --- Exception {e}")
+            return
+
+    # References of arrays which are not stored anymore (e.g. shorter now) are removed
+    references = {}
+    for section, name, reference in to_store:
+        references.setdefault(id(section), []).append(reference)
+        setattr(section, name, None)
+    for section in entry.m_all_contents(include_self=True):
+        if isinstance(section, UMR_HDF5ArrayStorage) and (section.hdf5_arrays or id(section) in references):
+            section.hdf5_arrays = references.get(id(section))
+    if to_write:
+        log_info(entry, logger, f"HDF5 STORAGE | Stored {len(to_write)} of {len(to_store)} arrays in {file_name}")
+
+
+def remove_hdf5_arrays(entry, archive, logger, file_name):
+    '''
+    Option store_large_arrays_in_hdf5 was switched off: the arrays are read back into the archive and
+    the references are removed. The HDF5 file stays in the upload (raw files are not deleted while an entry is processed).
+    '''
+    sections = [section for section in entry.m_all_contents(include_self=True)
+                if isinstance(section, UMR_HDF5ArrayStorage) and section.hdf5_arrays]
+    if not sections:
+        return
+    try:
+        for section in sections:
+            section.load_hdf5_arrays(archive)
+    except Exception as e:
+        log_error(entry, logger, f"HDF5 STORAGE | Could not read the arrays back from {file_name} --- Exception {e}")
+        return
+    for section in sections:
+        section.hdf5_arrays = None
+    log_info(entry, logger, f"HDF5 STORAGE | Arrays moved back into the archive, {file_name} is not used anymore and can be deleted")
+
+
+def finalize_array_storage(entry, archive, logger):
+    '''
+    Called at the end of the normalize of the root entry (after the figures are created):
+    compact encoding of tracking data sections and opt-in HDF5 storage of the remaining long arrays.
+    '''
+    if archive.data is not entry:
+        return
+    for section in entry.m_all_contents(include_self=True):
+        if isinstance(section, UMR_TrackingData):
+            # Old encoding is removed first: arrays which are not encoded again stay float64 (also if switched off)
+            section.decode_compact_arrays()
+            section.clear_compact_arrays()
+            if section.compact_encoding:
+                section.encode_compact_arrays()
+    store_large_arrays_in_hdf5(entry, archive, logger)
+
+
 ################################ MEASUREMENT BASECLASS ################################
 
 # Class with general quantites which are needed for most Cicci measurements
@@ -96,13 +246,78 @@ class UMR_MeasurementBaseclass(ArchiveSection):
     # Helper variable to match JV Measurements to MPP Tracking or Stability Test Measureemnts
     directory = Quantity(type=str)
 
+    # Opt-in: long arrays are moved into an HDF5 file in the upload (see store_large_arrays_in_hdf5)
+    store_large_arrays_in_hdf5 = Quantity(
+        type=bool,
+        default=False,
+        description=f'Arrays with more than {HDF5_ARRAY_THRESHOLD} points are stored compressed in an HDF5 file next to the entry. Only references and summary values stay in the archive.',
+        a_eln=dict(component='BoolEditQuantity'))
+
     samples = SubSection(
         section_def=UMR_EntityReference, repeats=True)
     
 
+################################ SUMMARY SCALARS ################################
+
+# Light intensity to convert power density (mW/cm²) into PCE (%)
+SUMMARY_LIGHT_INTENSITY = 100.0
+
+def summarize_array(values, unit=None):
+    '''Min, max, mean and last finite value of an array quantity (None if there is no finite value)'''
+    if values is None:
+        return None
+    if hasattr(values, 'to'):
+        values = values.to(unit).magnitude if unit else values.magnitude
+    array = np.asarray(values, dtype=np.float64).ravel()
+    array = array[np.isfinite(array)]
+    if not len(array):
+        return None
+    return dict(min=float(array.min()), max=float(array.max()), mean=float(array.mean()), last=float(array[-1]))
+
+
+def array_duration(time, unit='hour'):
+    '''Time between the first and the last point of a time array'''
+    if time is None:
+        return None
+    array = np.asarray(time.to(unit).magnitude if hasattr(time, 'to') else time, dtype=np.float64)
+    array = array[np.isfinite(array)]
+    return float(array.max() - array.min()) if len(array) else None
+
+
+################################ COMPACT ENCODING OF TRACKING DATA ################################
+# Values are stored as float32 (byte-shuffled, zlib compressed, base64 text) and regularly sampled time
+# as start + step (plus float32 residuals if the steps are not exactly constant).
+
+COMPACT_TOLERANCE = 1e-5                                      # max. decoding error relative to the largest absolute value
+COMPACT_TIME_TOLERANCE = 1e-3                                 # max. decoding error of time relative to the time step
+COMPACT_ARRAYS = ['voltage', 'current_density', 'power_density']
+
+def encode_float32(values):
+    '''Encodes an array as float32 into a compressed text'''
+    raw = np.ascontiguousarray(values, dtype='<f4').view(np.uint8).reshape(-1, 4).T.tobytes()
+    return base64.b64encode(zlib.compress(raw)).decode('ascii')
+
+
+def decode_float32(text):
+    '''Decodes a text from encode_float32 into a float64 array'''
+    raw = np.frombuffer(zlib.decompress(base64.b64decode(text)), dtype=np.uint8)
+    return np.ascontiguousarray(raw.reshape(4, -1).T).view('<f4').ravel().astype(np.float64)
+
+
+def within_compact_tolerance(original, decoded):
+    scale = np.nanmax(np.abs(original)) if np.isfinite(original).any() else 0.0
+    return np.array_equal(np.isnan(original), np.isnan(decoded)) and \
+        bool(np.nanmax(np.abs(original - decoded), initial=0.0) <= COMPACT_TOLERANCE * scale)
+
+
+def within_time_tolerance(time, decoded, step):
+    # The error of the time axis is compared with the time step, not with the largest time value
+    return step > 0 and bool(np.max(np.abs(time - decoded), initial=0.0) <= COMPACT_TIME_TOLERANCE * step)
+
+
 ################################ TRACKING BASECLASS ################################
 
-class UMR_TrackingData(ArchiveSection):
+class UMR_TrackingData(UMR_HDF5ArrayStorage):
     '''Tracking Data Section for MPP Tracking, Stability Tracking and Connection Test'''
 
     m_def = Section()
@@ -131,10 +346,155 @@ class UMR_TrackingData(ArchiveSection):
         description='Power density array of the MPP tracking measurement',
         shape=['*'],
         unit='mW/cm**2')
-    
+
+    # Summary scalars (calculated in normalize, searchable without loading the arrays)
+    number_of_points = Quantity(
+        type=int,
+        description='Number of points of the tracking measurement')
+
+    duration = Quantity(
+        type=np.dtype(np.float64),
+        description='Duration of the tracking measurement',
+        unit='hour')
+
+    voltage_last = Quantity(
+        type=np.dtype(np.float64),
+        description='Last voltage of the tracking measurement',
+        unit='V')
+
+    current_density_last = Quantity(
+        type=np.dtype(np.float64),
+        description='Last current density of the tracking measurement',
+        unit='mA/cm^2')
+
+    power_density_min = Quantity(
+        type=np.dtype(np.float64),
+        description='Minimum power density of the tracking measurement',
+        unit='mW/cm**2')
+
+    power_density_max = Quantity(
+        type=np.dtype(np.float64),
+        description='Maximum power density of the tracking measurement',
+        unit='mW/cm**2')
+
+    power_density_mean = Quantity(
+        type=np.dtype(np.float64),
+        description='Mean power density of the tracking measurement',
+        unit='mW/cm**2')
+
+    power_density_last = Quantity(
+        type=np.dtype(np.float64),
+        description='Last power density of the tracking measurement (final MPP power)',
+        unit='mW/cm**2')
+
+    best_efficiency = Quantity(
+        type=np.dtype(np.float64),
+        description='Maximum PCE of the tracking measurement in % (power density at 100 mW/cm²)')
+
+    efficiency_last = Quantity(
+        type=np.dtype(np.float64),
+        description='Last PCE of the tracking measurement in % (power density at 100 mW/cm²)')
+
+    # Compact encoding (see encode_compact_arrays)
+    compact_encoding = Quantity(
+        type=bool,
+        default=False,
+        description=f'Store the arrays as float32 and the time as start + step. Decoding error below {COMPACT_TOLERANCE} of the largest value (time: {COMPACT_TIME_TOLERANCE} of the time step), otherwise the array stays float64.',
+        a_eln=dict(component='BoolEditQuantity'))
+
+    time_start = Quantity(
+        type=np.dtype(np.float64),
+        description='First time value of the compact encoding (in the unit of time)')
+
+    time_step = Quantity(
+        type=np.dtype(np.float64),
+        description='Time step of the compact encoding (in the unit of time)')
+
+    compact_time_residuals = Quantity(
+        type=str,
+        description='float32 deviations of time from start + i * step (empty for constant steps)')
+
+    compact_voltage = Quantity(type=str)
+    compact_current_density = Quantity(type=str)
+    compact_power_density = Quantity(type=str)
+
+    def encode_compact_arrays(self):
+        '''Replaces the float64 arrays by their compact encoding (only arrays within COMPACT_TOLERANCE)'''
+        for name in COMPACT_ARRAYS:
+            values = getattr(self, name)
+            if values is None:
+                continue
+            unit = self.m_def.all_quantities[name].unit
+            original = np.asarray(values.to(unit).magnitude if hasattr(values, 'to') else values, dtype=np.float64)
+            text = encode_float32(original)
+            if within_compact_tolerance(original, decode_float32(text)):
+                setattr(self, f'compact_{name}', text)
+                setattr(self, name, None)
+
+        if self.time is None or len(self.time) < 2:
+            return
+        unit = self.m_def.all_quantities['time'].unit
+        time = np.asarray(self.time.to(unit).magnitude if hasattr(self.time, 'to') else self.time, dtype=np.float64)
+        if not np.isfinite(time).all():
+            return
+        start, step = time[0], np.median(np.diff(time))
+        grid = start + step * np.arange(len(time))
+        text = None
+        if not within_time_tolerance(time, grid, step):
+            text = encode_float32(time - grid)
+            if not within_time_tolerance(time, grid + decode_float32(text), step):
+                return
+        self.time_start, self.time_step, self.compact_time_residuals = start, step, text
+        self.number_of_points = len(time)
+        self.time = None
+
+    def clear_compact_arrays(self):
+        '''Removes the compact encoding (the float64 arrays must be decoded before)'''
+        for name in COMPACT_ARRAYS:
+            setattr(self, f'compact_{name}', None)
+        self.time_start, self.time_step, self.compact_time_residuals = None, None, None
+
+    def decode_compact_arrays(self):
+        '''Restores the float64 arrays from the compact encoding'''
+        for name in COMPACT_ARRAYS:
+            text = getattr(self, f'compact_{name}')
+            if text and getattr(self, name) is None:
+                setattr(self, name, decode_float32(text))
+        if self.time is None and self.time_start is not None and self.time_step is not None and self.number_of_points:
+            time = self.time_start + self.time_step * np.arange(self.number_of_points)
+            if self.compact_time_residuals:
+                time = time + decode_float32(self.compact_time_residuals)
+            self.time = time
+
+    def load_stored_arrays(self, archive):
+        '''Arrays from HDF5 and/or the compact encoding, called before the arrays are used'''
+        self.load_hdf5_arrays(archive)
+        self.decode_compact_arrays()
+
+    def normalize(self, archive, logger):
+        self.load_stored_arrays(archive)
+        super().normalize(archive, logger)
+
+        ### SUMMARY SCALARS ###
+        if self.time is not None:
+            self.number_of_points = len(self.time)
+            self.duration = array_duration(self.time)
+        for name, unit in [('voltage', 'V'), ('current_density', 'mA/cm^2')]:
+            summary = summarize_array(getattr(self, name), unit)
+            if summary:
+                setattr(self, f'{name}_last', summary['last'])
+        summary = summarize_array(self.power_density, 'mW/cm**2')
+        if summary:
+            self.power_density_min = summary['min']
+            self.power_density_max = summary['max']
+            self.power_density_mean = summary['mean']
+            self.power_density_last = summary['last']
+            self.best_efficiency = summary['max'] / SUMMARY_LIGHT_INTENSITY * 100
+            self.efficiency_last = summary['last'] / SUMMARY_LIGHT_INTENSITY * 100
+
 ################################ PARAMETERS BASECLASS ################################
 
-class UMR_JVParameters(UMR_MeasurementBaseclass, BaseMeasurement, EntryData, PlotSection):
+class UMR_JVParameters(UMR_MeasurementBaseclass, UMR_HDF5ArrayStorage, BaseMeasurement, EntryData, PlotSection):
     ''' General JV Parameters Class for StabilityParameters and MPPTrackingParameters'''
 
     m_def = Section(
@@ -218,10 +578,75 @@ class UMR_JVParameters(UMR_MeasurementBaseclass, BaseMeasurement, EntryData, Plo
         shape=['*'],
         description="The shunt resistance as extracted from the JV curve in Ohm."
     )
-    
+
+    # Summary scalars (calculated in normalize, searchable without loading the arrays)
+    number_of_points = Quantity(
+        type=int,
+        description='Number of JV scans of the measurement')
+
+    duration = Quantity(
+        type=np.dtype(np.float64),
+        description='Time between the first and the last JV scan',
+        unit='hour')
+
+    best_efficiency = Quantity(
+        type=np.dtype(np.float64),
+        description='Maximum power conversion efficiency')
+
+    efficiency_min = Quantity(
+        type=np.dtype(np.float64),
+        description='Minimum power conversion efficiency')
+
+    efficiency_mean = Quantity(
+        type=np.dtype(np.float64),
+        description='Mean power conversion efficiency')
+
+    efficiency_last = Quantity(
+        type=np.dtype(np.float64),
+        description='Power conversion efficiency of the last JV scan')
+
+    open_circuit_voltage_last = Quantity(
+        type=np.dtype(np.float64),
+        unit='V',
+        description='Open circuit voltage of the last JV scan')
+
+    short_circuit_current_density_last = Quantity(
+        type=np.dtype(np.float64),
+        unit='mA / cm**2',
+        description='Short circuit current density of the last JV scan')
+
+    fill_factor_last = Quantity(
+        type=np.dtype(np.float64),
+        description='Fill factor of the last JV scan')
+
+    power_at_maximum_power_point_last = Quantity(
+        type=np.dtype(np.float64),
+        unit='mW / cm**2',
+        description='Power density at the maximum power point of the last JV scan')
+
+    def summarize_parameters(self):
+        '''Fills the summary scalars from the parameter arrays'''
+        if self.time is not None:
+            self.number_of_points = len(self.time)
+            self.duration = array_duration(self.time)
+        summary = summarize_array(self.efficiency)
+        if summary:
+            self.best_efficiency = summary['max']
+            self.efficiency_min = summary['min']
+            self.efficiency_mean = summary['mean']
+            self.efficiency_last = summary['last']
+        for name, unit in [
+                ('open_circuit_voltage', 'V'),
+                ('short_circuit_current_density', 'mA / cm**2'),
+                ('fill_factor', None),
+                ('power_at_maximum_power_point', 'mW / cm**2')]:
+            summary = summarize_array(getattr(self, name), unit)
+            if summary:
+                setattr(self, f'{name}_last', summary['last'])
+
     def normalize(self, archive, logger):
         #archive.metadata.entry_type = self.m_def.name
-
+        self.load_hdf5_arrays(archive)
         
         # READ DATA FROM DATA FILE
         if self.data_file and not self.measurement_data_was_extracted_from_data_file:
@@ -241,9 +666,14 @@ class UMR_JVParameters(UMR_MeasurementBaseclass, BaseMeasurement, EntryData, Plo
         if self.data_file and not self.solar_cell_was_referenced:
             from ..read_and_parse.general_parser import reference_sample
             reference_sample(self, logger, archive)
- 
+
+        # SUMMARY SCALARS
+        self.summarize_parameters()
+
         super().normalize(archive, logger)
 
+        finalize_array_storage(self, archive, logger)
+
 
 
 class UMR_CollectedJVMeasurements(ArchiveSection):
@@ -252,8 +682,13 @@ class UMR_CollectedJVMeasurements(ArchiveSection):
     jv_measurements= Quantity(
         type = Measurement,
         shape=['*'])
+
+    # True if the references were sorted with the datetime from the search index (no need to resolve every entry)
+    sorted_by_datetime = Quantity(
+        type=bool,
+        default=False)
     
     def normalize(self, archive, logger):
         super().normalize(archive,logger)
-        if self.jv_measurements:
+        if self.jv_measurements and not self.sorted_by_datetime:
             self.jv_measurements.sort(key=lambda x: x.datetime)
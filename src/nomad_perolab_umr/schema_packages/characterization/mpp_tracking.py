@@ -45,6 +45,7 @@ from ..characterization.measurement_baseclasses import (
     UMR_CollectedJVMeasurements,
     UMR_MeasurementBaseclass,
     UMR_TrackingData,
+    finalize_array_storage,
 )
 from ..characterization.stability_test import UMR_JVParameters
 from ..helper_functions import *
@@ -220,5 +221,7 @@ class UMR_MPPTracking(BaseMeasurement, PlotSection, EntryData, UMR_MeasurementBa
     
         super().normalize(archive, logger)
 
+        finalize_array_storage(self, archive, logger)
+
 
 m_package.__init_metainfo__()
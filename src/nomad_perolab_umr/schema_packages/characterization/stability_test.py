@@ -38,10 +38,11 @@ from nomad.metainfo import (
     Section,
     SubSection,
 )
+from nomad.units import ureg
 
 from ..categories import *
 from ..helper_functions import *
-from .jv_measurement import UMR_JVMeasurement
+from .jv_measurement import UMR_JVMeasurement, UMR_SolarCellJVCurve
 
 # Imports UMR
 from .measurement_baseclasses import (
@@ -49,12 +50,18 @@ from .measurement_baseclasses import (
     UMR_JVParameters,
     UMR_MeasurementBaseclass,
     UMR_TrackingData,
+    finalize_array_storage,
 )
 
 #from Solar.plotfunctions import plot_stability_parameter
 
 m_package = SchemaPackage(aliases=['UMR_schemas.characterization.stability_test']) 
 
+# Quantities of the JV curves which are collected into the parameter time series (if there is no parameters file)
+JV_CURVE_SERIES_QUANTITIES = [
+    'open_circuit_voltage', 'short_circuit_current_density', 'fill_factor', 'efficiency',
+    'potential_at_maximum_power_point', 'current_density_at_maximum_power_point']
+
 ################################ Stability Test (Ageing) ################################
 
 class UMR_StabilityJVMeasurement(UMR_JVMeasurement):
@@ -101,6 +108,61 @@ class UMR_StabilityParameters(UMR_JVParameters):
         super().normalize(archive, logger)
 
 
+def has_finite_values(values):
+    if values is None:
+        return False
+    values = values.magnitude if hasattr(values, 'magnitude') else values
+    return bool(np.isfinite(np.asarray(values, dtype=float)).any())
+
+
+def parameters_from_jv_curves(jv_rows, start_time=None):
+    """
+    Builds Forward and Reverse UMR_StabilityParameters sections from the indexed values of the JV measurements
+    (rows of collect_jv_curve_values). Time is given in hours since start_time (default: first JV measurement).
+    Only the first light curve of each scan direction of a measurement is used.
+    """
+    rows = [row for row in jv_rows if row['datetime'] is not None]
+    if not rows:
+        return []
+    origin = (start_time or rows[0]['datetime']).timestamp()
+    series = {scan: {name: [] for name in ['time'] + JV_CURVE_SERIES_QUANTITIES} for scan in ('Forward', 'Reverse')}
+
+    for row in rows:
+        curves = {}
+        for path, value in row['values'].items():
+            parts = path.split('.')
+            if len(parts) == 4 and parts[1] == 'jv_curve':
+                curves.setdefault(int(parts[2]), {})[parts[3]] = value
+        used_scans = set()
+        for index in sorted(curves):
+            curve = curves[index]
+            scan = curve.get('scan')
+            if scan not in series or scan in used_scans or curve.get('dark'):
+                continue
+            used_scans.add(scan)
+            series[scan]['time'].append((row['datetime'].timestamp() - origin) / 3600)
+            for name in JV_CURVE_SERIES_QUANTITIES:
+                series[scan][name].append(curve.get(name, np.nan))
+
+    curve_quantities = UMR_SolarCellJVCurve.m_def.all_quantities
+    parameters = []
+    for scan, values in series.items():
+        if not values['time']:
+            continue
+        section = UMR_StabilityParameters(scan=scan)
+        section.time = np.array(values['time']) * ureg('hour')
+        for name in JV_CURVE_SERIES_QUANTITIES:
+            array = np.array(values[name], dtype=float)
+            unit = curve_quantities[name].unit
+            setattr(section, name, array * unit if unit is not None else array)
+        # Current densities are negative in the power generating quadrant (like in the Cicci files), P_mpp is positive
+        section.power_at_maximum_power_point = -(
+            section.potential_at_maximum_power_point * section.current_density_at_maximum_power_point).to('mW/cm^2')
+        section.summarize_parameters()
+        parameters.append(section)
+    return parameters
+
+
 # Tracking SubSection for StabilityTest
 class UMR_StabilityTracking(UMR_TrackingData, PlotSection):    
     '''JV Parameters Section for Stability Test'''
@@ -121,6 +183,8 @@ class UMR_StabilityTracking(UMR_TrackingData, PlotSection):
 
     
     def normalize(self, archive, logger):
+        # Arrays stored in HDF5 or compact encoded are needed for the plots
+        self.load_stored_arrays(archive)
 
         ### PLOT STABILITY TRACKING CURVES ###
         fig_power, fig_voltage_current = plot_stability(self, step=100, toggle_grid_button=True)
@@ -152,6 +216,8 @@ class UMR_StabilityTest(UMR_MeasurementBaseclass, BaseMeasurement, PlotSection,
                     'data_file', 'measurement_data_was_extracted_from_data_file', 'solar_cell_was_referenced', 'parameter_sections_were_added',
                     'active_area',
                     'algorithm', 'voltage_step_track', 'track_delay', 'jv_interval', 'test_duration', 'start_up_time',
+                    'initial_efficiency', 'stabilized_efficiency', 'burn_in_time', 'burn_in_loss', 'linear_degradation_rate',
+                    't95', 't80', 't50',
                     'description',
                     'tracking_data','jv_parameters', 'jv_measurements',])))
     
@@ -194,12 +260,59 @@ class UMR_StabilityTest(UMR_MeasurementBaseclass, BaseMeasurement, PlotSection,
     #directory = Quantity(type=str)
 
     
+    # Degradation metrics calculated from the tracking data (scalars, so they are searchable)
+    initial_efficiency = Quantity(
+        type=np.float64,
+        description='Initial PCE in % (running median of the first tracking points).')
+
+    stabilized_efficiency = Quantity(
+        type=np.float64,
+        description='PCE in % at the end of the burn-in (linear fit of the second half of the test).')
+
+    burn_in_time = Quantity(
+        type=np.float64,
+        unit=('hour'),
+        description='Duration of the burn-in, until the PCE follows the linear degradation.')
+
+    burn_in_loss = Quantity(
+        type=np.float64,
+        description='Loss of PCE during the burn-in in % of the initial PCE.')
+
+    linear_degradation_rate = Quantity(
+        type=np.float64,
+        description='Linear degradation after the burn-in in % of the stabilized PCE per hour.')
+
+    t95 = Quantity(
+        type=np.float64,
+        unit=('hour'),
+        description='Time until the PCE dropped to 95 % of the initial PCE.')
+
+    t80 = Quantity(
+        type=np.float64,
+        unit=('hour'),
+        description='Time until the PCE dropped to 80 % of the initial PCE.')
+
+    t50 = Quantity(
+        type=np.float64,
+        unit=('hour'),
+        description='Time until the PCE dropped to 50 % of the initial PCE.')
+
     # Boolean for referencing parameter sections
     parameter_sections_were_added = Quantity(
         type=bool,
         default=False,
         a_eln=dict(component='BoolEditQuantity'))
 
+    # Parameter sections derived from the collected JV measurements (cached until the number of JV measurements changes)
+    parameters_were_derived_from_jv_curves = Quantity(
+        type=bool,
+        default=False,
+        description='Forward and reverse parameters were derived from the collected JV measurements (no Stability (Parameters) file).')
+
+    number_of_collected_jv_measurements = Quantity(
+        type=int,
+        description='Number of JV measurements used for the derived parameters')
+
     # Helper variables for filling subsections (Reference Section)
     helper_ref_params = Quantity(type=Reference(UMR_StabilityParameters.m_def))
     helper_ref_jv = Quantity(type=Reference(UMR_StabilityJVMeasurement.m_def))
@@ -236,11 +349,23 @@ class UMR_StabilityTest(UMR_MeasurementBaseclass, BaseMeasurement, PlotSection,
             from ..read_and_parse.general_parser import reference_sample
             reference_sample(self, logger, archive)
 
+        # DEGRADATION METRICS FROM TRACKING DATA
+        tracking = self.tracking_data
+        if tracking and tracking.time is not None and tracking.power_density is not None:
+            from ..read_and_parse.stability_metrics import compute_stability_metrics
+            metrics = compute_stability_metrics(
+                tracking.time.to('hour').magnitude, tracking.power_density.to('mW/cm^2').magnitude)
+            for key, value in metrics.items():
+                if value is not None and key in ('burn_in_time', 't95', 't80', 't50'):
+                    value = value * ureg('hour')
+                setattr(self, key, value)
+
         # REFERENCE THE 2 StabilityParameters ENTRIES
         if not self.parameter_sections_were_added:
-            self.jv_parameters = []
             parameters_references = collect_parameters(self, archive, logger, 'stability_test.UMR_StabilityParameters')
             if len(parameters_references) == 2:
+                self.jv_parameters = []
+                self.parameters_were_derived_from_jv_curves = False
                 for ref in parameters_references:
                     self.helper_ref_params = ref
                     entry = self.helper_ref_params.m_resolved().m_copy(deep=True)
@@ -249,8 +374,24 @@ class UMR_StabilityTest(UMR_MeasurementBaseclass, BaseMeasurement, PlotSection,
 
         
         # REFERENCE THE CORRESPONDING StabilityJVMeasurement ENTRIES
-        self.jv_measurements = UMR_CollectedJVMeasurements()
-        self.jv_measurements.jv_measurements = collect_jv_curves(self, archive, logger, 'stability_test.UMR_StabilityJVMeasurement')
+        # One batched search: references and figures of merit come from the search index (sorted by datetime)
+        jv_entry_type = 'stability_test.UMR_StabilityJVMeasurement'
+        jv_rows = collect_jv_curve_values(self, archive, logger, jv_entry_type)
+        self.jv_measurements = UMR_CollectedJVMeasurements(sorted_by_datetime=True)
+        self.jv_measurements.jv_measurements = [row['reference'] for row in jv_rows]
+
+        # PARAMETERS FROM THE JV MEASUREMENTS IF THE PARAMETERS FILE IS MISSING
+        if not self.parameter_sections_were_added and jv_rows:
+            if not self.parameters_were_derived_from_jv_curves or self.number_of_collected_jv_measurements != len(jv_rows):
+                log_info(self, logger, f"Derive Stability Parameters from {len(jv_rows)} JV measurements")
+                fill_missing_jv_curve_values(self, logger, jv_rows, jv_entry_type)
+                self.jv_parameters = parameters_from_jv_curves(jv_rows, self.datetime)
+                # Only cached if values were found, otherwise it is tried again in the next normalize
+                self.parameters_were_derived_from_jv_curves = any(
+                    has_finite_values(getattr(section, name)) for section in self.jv_parameters for name in JV_CURVE_SERIES_QUANTITIES)
+                if not self.parameters_were_derived_from_jv_curves:
+                    log_warning(self, logger, "No JV parameters found in the collected JV measurements")
+            self.number_of_collected_jv_measurements = len(jv_rows)
         
         
         #for ref in jv_curves_references:
@@ -265,7 +406,7 @@ class UMR_StabilityTest(UMR_MeasurementBaseclass, BaseMeasurement, PlotSection,
         # Append figure to list of plots (Clear list beforehand)   
         self.figures = []
         log_info(self, logger, f"{JVparameters_name_dict}|{JVparameters_list}")
-        for parameter in JVparameters_list:
+        for parameter in JVparameters_list if self.jv_parameters else []:
             # Plot first parameters object (Reverse or Forward)
             log_info(self, logger, f"{parameter}---{self.jv_parameters[0]}")
       #      fig = plot_stability_parameter(self.jv_parameters[0], parameter)
@@ -282,3 +423,5 @@ class UMR_StabilityTest(UMR_MeasurementBaseclass, BaseMeasurement, PlotSection,
 
         super().normalize(archive, logger)
 
+        finalize_array_storage(self, archive, logger)
+
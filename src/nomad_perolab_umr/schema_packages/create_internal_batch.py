@@ -1078,8 +1078,11 @@ class UMR_BatchPlan(BaseSection, EntryData):
                 groups=[]
             )
             
+            # All archives are staged in the bulk writer and written together at the end
+            writer = BulkArchiveWriter(self, archive, logger)
+
             # Get batch entry ID (will be created at the end)
-            batch_entry_id = get_entry_id_from_file_name(batch_file_name, archive)
+            batch_entry_id = writer.entry_id(batch_file_name)
             batch_reference = UMR_EntityReference(
                 name=batch.name,
                 reference=get_reference(archive.metadata.upload_id, batch_entry_id),
@@ -1087,8 +1090,11 @@ class UMR_BatchPlan(BaseSection, EntryData):
             )
             self.created_entities.append(batch_reference)
             
-            # Initialize process updates dictionary
-            process_updates = {}
+            # Cache of the selected processes (each mainfile is loaded once and written once)
+            process_cache = ArchiveCache(self, archive, logger)
+
+            # Cache for the substrate and sample templates of the groups
+            template_cache = {}
             
             # MAIN LOOP: Create all entities group by group
             for group_settings in self.groups_for_selection_of_processes:
@@ -1101,66 +1107,24 @@ class UMR_BatchPlan(BaseSection, EntryData):
                     substrates=[],
                     samples=[]
                 )
-                
-                # CREATE SUBSTRATES AND SAMPLES
-                for engraved_number in group_settings.substrate_engraved_numbers:
-                    # Substrate setup
-                    substrate_lab_id = f"{batch_abbreviation}_{str(self.batch_number).zfill(3)}_{str(engraved_number)}"
-                    substrate_file_name = f"Batch/Substrates/substrate_{substrate_lab_id}.archive.json"
-                    substrate_entry_id = get_entry_id_from_file_name(substrate_file_name, archive)
-
-                    substrate = UMR_InternalSubstrate()
-                    substrate.m_update_from_dict(group_settings.substrate.m_to_dict())
-                    substrate.name = f"Substrate {substrate_lab_id}"
-                    substrate.datetime = self.datetime
-                    substrate.lab_id = substrate_lab_id
-                    substrate.batch = get_reference(archive.metadata.upload_id, batch_entry_id)
-                    substrate.group_number = group_settings.group_number
-                    substrate.samples = []
-                    
-                    # Create sample
-                    sample_lab_id = f"{substrate_lab_id}_X"
-                    sample_file_name = f"Batch/Samples/sample_{sample_lab_id}.archive.json"
-                    sample = UMR_BasicSample(
-                        name=f"Sample {sample_lab_id}",
-                        datetime=self.datetime,
-                        lab_id=sample_lab_id,
-                        batch=get_reference(archive.metadata.upload_id, batch_entry_id),
-                        substrate = get_reference(archive.metadata.upload_id, substrate_entry_id),
-                        #substrate=get_reference(archive.metadata.upload_id, f"{archive.metadata.upload_id}/{substrate_file_name}"),
-                        group_number=group_settings.group_number,
-                        width=group_settings.substrate.width,
-                        length=group_settings.substrate.length,
-                        processes=[]
-                    )
-                    
-                    # Save sample and get reference
-                    create_archive(sample, archive, sample_file_name)
-                    sample_entry_id = get_entry_id_from_file_name(sample_file_name, archive)
-                    sample_reference = UMR_EntityReference(
-                        name=sample.name,
-                        reference=get_reference(archive.metadata.upload_id, sample_entry_id),
-                        lab_id=sample.lab_id
-                    )
-                    
 
+                # Templates of the group (serialized once)
+                substrate_template, sample_template = self._get_group_templates(archive, template_cache, group_settings, batch_entry_id)
 
+                try:
+                    built_substrates = [
+                        self._build_substrate_and_sample(archive, writer, substrate_template, sample_template, engraved_number, batch_abbreviation)
+                        for engraved_number in group_settings.substrate_engraved_numbers]
+                except Exception as e:
+                    log_error(self, logger, f"An error occurred when creating the substrates and samples of group {group_settings.group_number}. No entries were created. --- Exception {e}")
+                    self.created_entities = []
+                    return
+
+                # STAGE archives and add references in the original order
+                for substrate_file_name, substrate_dict, substrate_reference, sample_file_name, sample_dict, sample_reference in built_substrates:
+                    writer.stage_dict(sample_dict, sample_file_name)
+                    writer.stage_dict(substrate_dict, substrate_file_name)
 
-                    # Add sample to substrate
-                    substrate.samples.append(sample_reference)
-                    
-                    # Save substrate with sample reference
-                    #substrate.normalize(archive, logger)
-                    create_archive(substrate, archive, substrate_file_name)
-                    
-                    # Create substrate reference
-                    #substrate_entry_id = get_entry_id_from_file_name(substrate_file_name, archive)
-                    substrate_reference = UMR_EntityReference(
-                        name=substrate.name,
-                        reference=get_reference(archive.metadata.upload_id, substrate_entry_id),
-                        lab_id=substrate.lab_id
-                    )
-                    
                     # Add to batch, group, and created_entities
                     batch.substrates.append(substrate_reference)
                     batch.samples.append(sample_reference)
@@ -1168,48 +1132,45 @@ class UMR_BatchPlan(BaseSection, EntryData):
                     group.samples.append(sample_reference)
                     self.created_entities.append(substrate_reference)
                     self.created_entities.append(sample_reference)
-                    
+                
                     # UPDATE PROCESSES: Add sample to processes
                     for i, process in enumerate(group_settings.select_processes):
                         if process.present:
                             mainfile = process.selected_process.m_root().metadata.mainfile
-                            
-                            # Load process if not already in updates,, each process only once updated
-                            if mainfile not in process_updates:
-                                with archive.m_context.raw_file(mainfile, 'r') as file:
-                                    data = json.load(file)
-                                 # Get the process class from the selected_process reference
-                                process_class = type(process.selected_process.m_resolved())
-                                process_entry = process_class.m_from_dict(data['data'])
-                                #process_entry = self.m_from_dict(data['data'])  --> klappt nicht deserializierd in BatchPLan
-
-
+                        
+                            # Load process if not already in cache, each process is only loaded and updated once
+                            new_process = mainfile not in process_cache
+                            # Get the process class from the selected_process reference
+                            process_class = type(process.selected_process.m_resolved())
+                            process_entry = process_cache.get(process_class, mainfile)
+                            #process_entry = self.m_from_dict(data['data'])  --> klappt nicht deserializierd in BatchPLan
+
+                            if new_process:
                                 process_entry.selected_samples = []
                                 process_entry.samples = []
                                 process_entry.datetime = self.datetime
                                 process_entry.position_in_experimental_plan = i + 1
                                 process_entry.batch = get_reference(archive.metadata.upload_id, batch_entry_id)
-                                process_updates[mainfile] = process_entry
-                            
+                                process_cache.mark_dirty(mainfile)
+                        
                             # Add sample to process, but each sample added to process
-                            process_updates[mainfile].selected_samples.append(sample_reference)
-                
+                            process_entry.selected_samples.append(sample_reference)
+            
                 # Add group to batch
                 batch.groups.append(group)
-            
-            # SAVE BATCH (only once, at the end)
-            try:
-                create_archive(batch, archive, batch_file_name)
-                log_info(self, logger, f"Created batch archive: {batch_file_name} with lab_id '{batch_lab_id}'")
-            except Exception as e:
-                log_error(self, logger, f"An error occurred when creating an Internal Batch. --- Exception {e}")
+
+            # STAGE BATCH AND PROCESS UPDATES
+            writer.stage(batch, batch_file_name)
+            process_updates = process_cache.dirty_entries()
+            process_cache.stage(writer)
+
+            # WRITE EVERYTHING AT ONCE (rolled back completely if one write fails)
+            if not writer.flush():
+                log_error(self, logger, f"An error occurred when creating the Internal Batch {batch_lab_id}. No entries were created.")
+                self.created_entities = []
                 return
-            
-            # WRITE ALL PROCESS UPDATES (after normalize phase)
-            for mainfile, process_entry in process_updates.items():
-                create_archive(process_entry, archive, mainfile, overwrite=True)
-                #with archive.m_context.raw_file(mainfile, 'w') as file:
-                #    json.dump({'data': process_entry.m_to_dict()}, file)
+            log_info(self, logger, f"Created batch archive: {batch_file_name} with lab_id '{batch_lab_id}'")
+            for process_entry in process_updates.values():
                 log_info(self, logger, f"Updated process: {process_entry.name} with {len(process_entry.selected_samples)} samples")
             
             # Mark batch as created
@@ -1220,6 +1181,70 @@ class UMR_BatchPlan(BaseSection, EntryData):
         # Entweder Proxy not found oder fehlende oder defekte Referenz
 
 
+    def _get_group_templates(self, archive, template_cache, group_settings, batch_entry_id):
+        """Substrate and sample templates with all fields that are equal within one group"""
+        batch_reference = get_reference(archive.metadata.upload_id, batch_entry_id)
+
+        def create_substrate_prototype():
+            substrate = UMR_InternalSubstrate()
+            substrate.m_update_from_dict(group_settings.substrate.m_to_dict())
+            substrate.datetime = self.datetime
+            substrate.batch = batch_reference
+            substrate.group_number = group_settings.group_number
+            substrate.samples = []
+            return substrate
+
+        def create_sample_prototype():
+            return UMR_BasicSample(
+                datetime=self.datetime,
+                batch=batch_reference,
+                group_number=group_settings.group_number,
+                width=group_settings.substrate.width,
+                length=group_settings.substrate.length,
+                processes=[]
+            )
+
+        substrate_template = get_section_template(template_cache, ('substrate', group_settings.group_number), create_substrate_prototype)
+        sample_template = get_section_template(template_cache, ('sample', group_settings.group_number), create_sample_prototype)
+        return substrate_template, sample_template
+
+
+    def _build_substrate_and_sample(self, archive, writer, substrate_template, sample_template, engraved_number, batch_abbreviation):
+        """Build the serialized substrate and sample of one engraved number from the group templates"""
+        # Substrate setup
+        substrate_lab_id = f"{batch_abbreviation}_{str(self.batch_number).zfill(3)}_{str(engraved_number)}"
+        substrate_file_name = f"Batch/Substrates/substrate_{substrate_lab_id}.archive.json"
+        substrate_entry_id = writer.entry_id(substrate_file_name)
+        substrate_reference = UMR_EntityReference(
+            name=f"Substrate {substrate_lab_id}",
+            reference=get_reference(archive.metadata.upload_id, substrate_entry_id),
+            lab_id=substrate_lab_id
+        )
+
+        # Create sample
+        sample_lab_id = f"{substrate_lab_id}_X"
+        sample_file_name = f"Batch/Samples/sample_{sample_lab_id}.archive.json"
+        sample_reference = UMR_EntityReference(
+            name=f"Sample {sample_lab_id}",
+            reference=get_reference(archive.metadata.upload_id, writer.entry_id(sample_file_name)),
+            lab_id=sample_lab_id
+        )
+        sample_dict = sample_template.instantiate(
+            name=sample_reference.name,
+            lab_id=sample_lab_id,
+            substrate=get_reference(archive.metadata.upload_id, substrate_entry_id))
+
+        # Substrate with sample reference
+        substrate_dict = substrate_template.instantiate(
+            name=substrate_reference.name,
+            lab_id=substrate_lab_id,
+            samples=[sample_reference])
+
+        return (
+            substrate_file_name, substrate_dict, substrate_reference,
+            sample_file_name, sample_dict, sample_reference)
+
+
     def _validate_batch_plan(self, logger):
         """Validate all batch plan requirements before creation"""
         # Basic checks
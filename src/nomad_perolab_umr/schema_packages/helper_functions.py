@@ -150,12 +150,13 @@ def log_warning(plan_obj, logger, msg):
     else:
         raise Exception
 
-def UMR_search(archive, query, pagination=None):
+def UMR_search(archive, query, pagination=None, required=None):
     from nomad.search import search
     search_result = search(
         owner='all',
         query=query,
         pagination=pagination,
+        required=required,
         user_id=archive.metadata.main_author.user_id)
     return search_result
 
@@ -324,6 +325,97 @@ def collect_jv_curves(entry, archive, logger, entry_type):
         
     return references
 
+# Function to collect JV Measurements together with their indexed values (no archive is resolved)
+def collect_jv_curve_values(entry, archive, logger, entry_type, max_curves=2000):
+    """
+    Collects the JV measurements of the same directory like collect_jv_curves, but also returns the scalar
+    values of each measurement from the search index (search_quantities), e.g. the figures of merit of the curves.
+    Float values in the search index are magnitudes in the unit of the quantity definition.
+    Only the search index is used. If the values of the repeated jv_curve subsections are needed but not indexed,
+    call fill_missing_jv_curve_values on the rows (it opens the archives).
+
+    Returns:
+    - list of dicts sorted by datetime: upload_id, entry_id, reference, datetime, values {path in archive: value}
+      The paths are the path_archive of the search quantities, list indices are path segments
+      (e.g. values['data.jv_curve.0.efficiency'])
+    """
+    query = {
+        'search_quantities':
+            {'id': f'data.directory#UMR_schemas.characterization.{entry_type}',
+            'str_value': entry.directory}
+        }
+
+    from nomad.app.v1.models.models import MetadataPagination, MetadataRequired
+    pagination = MetadataPagination(page_size=100)
+    required = MetadataRequired(include=['upload_id', 'entry_id', 'search_quantities'])
+
+    rows = []
+    while len(rows) < max_curves:
+        search_result = UMR_search(archive, query, pagination, required)
+        if not search_result.data:
+            break
+        for res in search_result.data:
+            try:
+                values = {}
+                for quantity in res.get('search_quantities', []):
+                    path = quantity.get('path_archive')
+                    for key in ('float_value', 'int_value', 'bool_value', 'datetime_value', 'str_value'):
+                        if path and quantity.get(key) is not None:
+                            values[path] = quantity[key]
+                            break
+                datetime_value = values.get('data.datetime')
+                if isinstance(datetime_value, str):
+                    datetime_value = dt.datetime.fromisoformat(datetime_value.replace('Z', '+00:00'))
+                rows.append(dict(
+                    upload_id=res['upload_id'],
+                    entry_id=res['entry_id'],
+                    reference=get_reference(res['upload_id'], res['entry_id']),
+                    datetime=datetime_value,
+                    values=values))
+            except Exception as e:
+                log_error(entry, logger, f"Error during processing (Collecting {entry_type} Entries) --- EXEPTION:{e}")
+        next_value = search_result.pagination.next_page_after_value
+        if not next_value:
+            break
+        pagination.page_after_value = next_value
+
+    if not rows:
+        log_warning(entry, logger, f'INFORMATION ABOUT COLLECTED JV MEASUREMENTS | No {entry_type} Section was found for: {entry.name}')
+    rows = rows[:max_curves]
+    rows.sort(key=lambda row: row['datetime'].timestamp() if row['datetime'] else float('inf'))
+    return rows
+
+def fill_missing_jv_curve_values(entry, logger, rows, entry_type):
+    """
+    Fallback for rows of collect_jv_curve_values without indexed jv_curve values: the values are read from the
+    archives of the entries (see read_jv_curve_values). Every archive is opened, so only call this when
+    the values are really used.
+    """
+    not_indexed = [row for row in rows if not any(path.startswith('data.jv_curve.') for path in row['values'])]
+    if not_indexed:
+        log_info(entry, logger, f'JV curve values of {len(not_indexed)} {entry_type} entries are read from the archives')
+    for row in not_indexed:
+        try:
+            row['values'].update(read_jv_curve_values(row['upload_id'], row['entry_id']))
+        except Exception as e:
+            log_error(entry, logger, f"Error during processing (Reading JV curves of {row['entry_id']}) --- EXEPTION:{e}")
+
+def read_jv_curve_values(upload_id, entry_id):
+    """
+    Reads the scalar quantities of the jv_curve subsections of an entry from its archive (arrays are not loaded).
+    Returns {path in archive: value} like the search_quantities in collect_jv_curve_values, magnitudes in the unit
+    of the quantity definition.
+    """
+    from nomad import files
+    values = {}
+    with files.UploadFiles.get(upload_id).read_archive(entry_id) as archive:
+        curves = archive[entry_id]['data'].get('jv_curve') or []
+        for index, curve in enumerate(curves):
+            for name, value in curve.items():
+                if isinstance(value, (bool, int, float, str)):
+                    values[f'data.jv_curve.{index}.{name}'] = value
+    return values
+
 #def collect_measurement(entry, archive, logger, entry_type):
     
 
@@ -409,11 +501,15 @@ def collect_extra_data(entry, archive, logger):
     return references
 
 
-def get_entry_by_mainfile(entry, archive, mainfile):
+def get_entry_by_mainfile(entry, archive, mainfile, cache=None):
     """
     Loads and returns an entry object from the archive using the given mainfile path.
+    If an ArchiveCache is given, the mainfile is parsed only once per operation.
     """
 
+    if cache is not None:
+        return cache.get(entry, mainfile)
+
     # Open the archive file corresponding to the mainfile
     with archive.m_context.raw_file(mainfile, 'r') as file:
         data = json.load(file)
@@ -424,7 +520,89 @@ def get_entry_by_mainfile(entry, archive, mainfile):
     return entry
  
 
-def add_process_and_layer_to_sample(ELN_entry, archive, logger, sample_ref, process_entry):
+class ArchiveCache:
+    """
+    Per-operation cache of archives that are loaded from their mainfile (e.g. batch, substrates, processes).
+    Every mainfile is parsed at most once. Changed entries are marked as dirty and written
+    exactly once at the end with flush() (or staged into an existing BulkArchiveWriter with stage()).
+    """
+
+    def __init__(self, ELN_entry, archive, logger):
+        self.ELN_entry = ELN_entry
+        self.archive = archive
+        self.logger = logger
+        self._entries = {}  # {mainfile: entry}
+        self._dirty = []  # mainfiles in the order they were changed
+
+    def __contains__(self, mainfile):
+        return mainfile in self._entries
+
+    def get(self, entry, mainfile):
+        """
+        Returns the entry of mainfile. entry is the section (or section class) used for deserialization.
+        """
+        if mainfile not in self._entries:
+            with self.archive.m_context.raw_file(mainfile, 'r') as file:
+                data = json.load(file)
+            self._entries[mainfile] = entry.m_from_dict(data['data'])
+        return self._entries[mainfile]
+
+    def mark_dirty(self, mainfile):
+        if mainfile not in self._dirty:
+            self._dirty.append(mainfile)
+
+    def dirty_entries(self):
+        return {mainfile: self._entries[mainfile] for mainfile in self._dirty}
+
+    def stage(self, writer):
+        """Stages all changed entries in writer (overwrite=True)"""
+        for mainfile, entry in self.dirty_entries().items():
+            writer.stage(entry, mainfile, overwrite=True)
+        self._dirty = []
+
+    def flush(self):
+        """Writes all changed entries at once. Returns True on success."""
+        writer = BulkArchiveWriter(self.ELN_entry, self.archive, self.logger)
+        self.stage(writer)
+        return writer.flush()
+
+
+class SectionTemplate:
+    """
+    Prototype of a section which is serialized only once.
+    instantiate() returns a shallow copy of the serialized prototype in which only the given
+    per-entity fields (e.g. name, lab_id, samples) are replaced. The result can be staged with
+    BulkArchiveWriter.stage_dict(). Nested values are shared between all instances and must not be modified.
+    """
+
+    def __init__(self, prototype):
+        self.template_dict = prototype.m_to_dict(with_root_def=True)
+
+    def instantiate(self, **fields):
+        entity_dict = dict(self.template_dict)
+        for key, value in fields.items():
+            if value is None:
+                entity_dict.pop(key, None)
+            elif isinstance(value, list):
+                entity_dict[key] = [item.m_to_dict() if hasattr(item, 'm_to_dict') else item for item in value]
+            elif hasattr(value, 'm_to_dict'):
+                entity_dict[key] = value.m_to_dict()
+            else:
+                entity_dict[key] = value
+        return entity_dict
+
+
+def get_section_template(template_cache, key, create_prototype):
+    """
+    Returns the SectionTemplate for key from template_cache (a simple dict).
+    create_prototype() is only called if there is no template for this key yet.
+    """
+    if key not in template_cache:
+        template_cache[key] = SectionTemplate(create_prototype())
+    return template_cache[key]
+
+
+def add_process_and_layer_to_sample(ELN_entry, archive, logger, sample_ref, process_entry, cache=None):
     """
     Adds a process and associated layer(s) to a sample entry in the electronic lab notebook (ELN) archive.
 
@@ -440,6 +618,9 @@ def add_process_and_layer_to_sample(ELN_entry, archive, logger, sample_ref, proc
         A entity reference object, including a reference to the sample that should be updated with the new process and layers.
     process_entry : object
         The process entry to be added to the sample, populated with metadata from ELN_entry.
+    cache : ArchiveCache, optional
+        If given, the sample is loaded from the cache and only marked as dirty instead of being saved directly.
+        The caller has to flush the cache at the end.
 
     Returns:
     --------
@@ -465,7 +646,7 @@ def add_process_and_layer_to_sample(ELN_entry, archive, logger, sample_ref, proc
     # Retrieve the sample entry using its own class, not the ELN entry class
     resolved_sample = sample_ref.reference.m_resolved()
     mainfile = resolved_sample.m_root().metadata.mainfile
-    sample_entry = get_entry_by_mainfile(resolved_sample, archive, mainfile)
+    sample_entry = get_entry_by_mainfile(resolved_sample, archive, mainfile, cache)
 
     # Merge descriptions from the sample reference and the ELN entry
     if sample_ref.description:
@@ -496,13 +677,16 @@ def add_process_and_layer_to_sample(ELN_entry, archive, logger, sample_ref, proc
     ELN_entry.samples.append(sample_copy)
 
     # Persist the updated sample to keep processes/layers from being lost
-    create_archive(sample_entry, archive, mainfile, overwrite=True)
+    if cache is not None:
+        cache.mark_dirty(mainfile)
+    else:
+        create_archive(sample_entry, archive, mainfile, overwrite=True)
 
     return sample_entry, mainfile
 
 
 
-def create_solar_cell_from_basic_sample(ELN_entry, archive, logger, sample_entry, solar_cell_name, solar_cell_entry):
+def create_solar_cell_from_basic_sample(ELN_entry, archive, logger, sample_entry, solar_cell_name, solar_cell_entry, template_cache=None, writer=None):
     """
     Creates a new solar cell entry in the archive based on an existing basic sample.
 
@@ -520,6 +704,13 @@ def create_solar_cell_from_basic_sample(ELN_entry, archive, logger, sample_entry
         A name or identifier suffix to distinguish the new solar cell.
     solar_cell_entry : object
         The new solar cell entry object that will be initialized and stored.
+    template_cache : dict, optional
+        Cache of SectionTemplates. If given, the sample is serialized only once per sample and
+        every solar cell is created from this template (only name and lab_id are replaced).
+        In this case only name and lab_id are set on the returned solar_cell_entry.
+    writer : BulkArchiveWriter, optional
+        Only used together with template_cache. If given, the solar cell is only staged in the writer
+        and the caller has to flush it. Otherwise it is written directly.
 
     Returns:
     --------
@@ -544,7 +735,33 @@ def create_solar_cell_from_basic_sample(ELN_entry, archive, logger, sample_entry
     # Construct a new name and file path for the solar cell
     solar_cell_name=f"solar_cell_{solar_cell_lab_id}"
     solar_cell_file_name = f'Batch/SolarCells/{solar_cell_name}.archive.json'
-    
+
+    # FAST PATH: Create solar cell from the cached template of this sample
+    if template_cache is not None:
+        def create_prototype():
+            prototype = type(solar_cell_entry)()
+            prototype.m_update_from_dict(sample_entry.m_to_dict())
+            prototype.datetime = ELN_entry.datetime
+            if ELN_entry.solar_cell_settings.architecture:
+                prototype.architecture = ELN_entry.solar_cell_settings.architecture
+            else:
+                log_warning(ELN_entry, logger, f"No architecture given in the solar cell settings for this Process: {ELN_entry}")
+            return prototype
+
+        template = get_section_template(template_cache, (type(solar_cell_entry).__name__, sample_entry.lab_id), create_prototype)
+        solar_cell_entry.name = f"Solar Cell {solar_cell_lab_id}"
+        solar_cell_entry.lab_id = solar_cell_lab_id
+
+        flush_directly = writer is None
+        if flush_directly:
+            writer = BulkArchiveWriter(ELN_entry, archive, logger)
+        solar_cell_entry_id = writer.stage_dict(
+            template.instantiate(name=solar_cell_entry.name, lab_id=solar_cell_lab_id), solar_cell_file_name)
+        if flush_directly:
+            writer.flush()
+
+        return solar_cell_entry_id, solar_cell_entry
+
     # Initialize the solar cell entry using metadata from the basic sample
     solar_cell_entry.m_update_from_dict(sample_entry.m_to_dict())
     solar_cell_entry.name = f"Solar Cell {solar_cell_lab_id}"
@@ -567,7 +784,106 @@ def create_solar_cell_from_basic_sample(ELN_entry, archive, logger, sample_entry
     return solar_cell_entry_id, solar_cell_entry  # return value as input for next method needed
 
 
-def create_solar_cell_references(ELN_entry, archive, logger, sample_ref, list_solar_cell_references):
+def execute_process_on_selected_samples(ELN_entry, archive, logger, process_class, solar_cell_class=None):
+    """
+    Batched version of add_process_and_layer_to_sample (+ solar cell creation) for all selected samples of an ELN process.
+
+    - All selected samples are resolved in one step before anything is changed.
+    - The process is serialized from the ELN entry only once, every sample gets a copy of this prototype.
+      The layers are resolved only once as well.
+    - Samples, batches and substrates are loaded only once (ArchiveCache) and all changed entries
+      and the new solar cells are written in one bulk write at the end.
+
+    Parameters:
+    -----------
+    ELN_entry : object
+        The ELN process entry with the selected_samples.
+    process_class : class
+        Class of the process which is added to the samples (e.g. UMR_SpinCoating).
+    solar_cell_class : class, optional
+        If given, solar cells of this class are created for every sample (names from ELN_entry.solar_cell_settings).
+
+    Returns:
+    --------
+    bool
+        True if all samples were updated and written successfully. Only then the samples are added
+        to ELN_entry.samples, the caller clears the selected_samples only in this case.
+    """
+
+    # Use current datetime if the ELN entry is configured to do so (same datetime for all samples)
+    if ELN_entry.use_current_datetime is True:
+        ELN_entry.datetime = dt.datetime.now()
+
+    # Resolve all selected samples in one step
+    resolved_samples = []
+    for sample_ref in ELN_entry.selected_samples:
+        try:
+            resolved_sample = sample_ref.reference.m_resolved()
+            resolved_samples.append((sample_ref, resolved_sample, resolved_sample.m_root().metadata.mainfile))
+        except Exception as e:
+            log_error(ELN_entry, logger, f"Could not resolve the selected sample {sample_ref.lab_id}. No sample was updated. --- Exception {e}")
+            return False
+
+    # Prototypes shared by all samples
+    process_prototype = process_class()
+    process_prototype.m_update_from_dict(ELN_entry.m_to_dict())
+    layers = [layer.m_resolved() for layer in ELN_entry.layer] if hasattr(ELN_entry, 'layer') else []
+
+    cache = ArchiveCache(ELN_entry, archive, logger)
+    writer = BulkArchiveWriter(ELN_entry, archive, logger)
+    template_cache = {}
+
+    processed_samples = []  # added to ELN_entry.samples only after a successful write
+    for sample_ref, resolved_sample, mainfile in resolved_samples:
+        sample_entry = cache.get(resolved_sample, mainfile)
+
+        # Process (copy of the prototype, a section can only have one parent)
+        process_entry = process_prototype.m_copy(deep=True)
+        if sample_ref.description:
+            if ELN_entry.description:
+                process_entry.description = ELN_entry.description + "\n" + sample_ref.description
+            else:
+                process_entry.description = sample_ref.description
+
+        if sample_entry.processes is None:
+            sample_entry.processes = []
+        sample_entry.processes.append(process_entry)
+
+        # Layers
+        if layers:
+            if sample_entry.layers is None:
+                sample_entry.layers = []
+            for layer in layers:
+                sample_entry.layers.append(layer.m_copy(deep=True))
+
+        processed_samples.append(sample_ref.m_copy(deep=False))
+        cache.mark_dirty(mainfile)
+
+        # Create Solar Cells
+        if solar_cell_class:
+            list_solar_cell_references = []
+            for solar_cell_name in ELN_entry.solar_cell_settings.solar_cell_names:
+                solar_cell_entry_id, solar_cell_entry = create_solar_cell_from_basic_sample(
+                    ELN_entry, archive, logger, sample_entry, solar_cell_name, solar_cell_class(), template_cache, writer)
+                # Same reference class as the selected samples (UMR_EntityReference, not importable here)
+                list_solar_cell_references.append(type(sample_ref)(
+                    name=solar_cell_entry.name,
+                    reference=get_reference(archive.metadata.upload_id, solar_cell_entry_id),
+                    lab_id=solar_cell_entry.lab_id))
+            # Add references to batch and substrate (kept in the cache, not saved yet)
+            processed_samples.extend(create_solar_cell_references(ELN_entry, archive, logger, sample_ref, list_solar_cell_references, cache))
+
+    # Write all samples, batches, substrates and solar cells at once
+    cache.stage(writer)
+    if not writer.flush():
+        return False
+
+    ELN_entry.samples.extend(processed_samples)
+    log_info(ELN_entry, logger, f"Executed {process_class.__name__} on {len(resolved_samples)} samples.")
+    return True
+
+
+def create_solar_cell_references(ELN_entry, archive, logger, sample_ref, list_solar_cell_references, cache=None):
     """
     Adds solar cell references to the batch and substrate associated with a given sample reference.
     
@@ -583,26 +899,25 @@ def create_solar_cell_references(ELN_entry, archive, logger, sample_ref, list_so
         A entity reference object with a reference to the sample from which the batch and the substrates are derived.
     list_solar_cell_references : list
         A list of references to the solar cell entries to be added to the batch and substrate.
+    cache : ArchiveCache, optional
+        If given, batch and substrate are loaded only once for all samples and marked as dirty.
+        Otherwise they are loaded again for every call.
 
     Returns:
     --------
-    None
+    list
+        The solar cell references. The caller adds them to ELN_entry.samples once the entries are written.
 
     Notes:
     ------
     - This function updates both the batch and substrate to include references to newly created solar cells.
     - Errors in resolving batch or substrate references are logged and skipped.
     """
-    # Add solar cell references to sample list (in ELN process entry)
-    ELN_entry.samples.extend(list_solar_cell_references) #.m_resolved().m_copy(deep=True)) # without m_copy it would be a CompositeSystem Reference not a UMR_EntityReference!
-
-
-    # PERFORMANCE: Return batch/substrate info for batched saving later
-    # Don't save here - collect all updates first
+    # Don't save here - batch and substrate are written together with all other entries
     try:
         batch_resolved = sample_ref.reference.batch.m_resolved()
         batch_mainfile = batch_resolved.m_root().metadata.mainfile
-        batch = get_entry_by_mainfile(ELN_entry, archive, batch_mainfile)
+        batch = get_entry_by_mainfile(ELN_entry, archive, batch_mainfile, cache)
         
         # Append all solar cell references to the batch's samples list
         batch.samples.extend(list_solar_cell_references)
@@ -616,26 +931,25 @@ def create_solar_cell_references(ELN_entry, archive, logger, sample_ref, list_so
                 matching_group.samples.extend(list_solar_cell_references)
             else:
                 log_error(ELN_entry, logger, f"Group with number '{group_number}' not found in batch.")
+        if cache is not None:
+            cache.mark_dirty(batch_mainfile)
     except Exception as e:
         log_error(ELN_entry, logger, f"Could not update batch: {e}")
-        batch = None
-        batch_mainfile = None
 
     # Get substrate info
     try:
         substrate_resolved = sample_ref.reference.substrate.m_resolved()
         substrate_mainfile = substrate_resolved.m_root().metadata.mainfile
-        substrate = get_entry_by_mainfile(ELN_entry, archive, substrate_mainfile)
+        substrate = get_entry_by_mainfile(ELN_entry, archive, substrate_mainfile, cache)
         
         # Append all solar cell references to the substrate's samples list
         substrate.samples.extend(list_solar_cell_references)
+        if cache is not None:
+            cache.mark_dirty(substrate_mainfile)
     except Exception as e:
         log_error(ELN_entry, logger, f"Could not update substrate: {e}")
-        substrate = None
-        substrate_mainfile = None
-    
-    # Return entries for batched saving
-    return batch, batch_mainfile, substrate, substrate_mainfile
+
+    return list_solar_cell_references
 
 
 
@@ -660,6 +974,146 @@ def create_directory(ELN_entry, archive, logger, directory_name):
 
 
 
+class BulkArchiveWriter:
+    """
+    Collects archives in memory and writes them all at once with flush().
+    Used when one normalize creates or updates many entries (e.g. batch creation).
+
+    - The entry_ids are known directly after staging (they only depend on upload_id and file name),
+      so references can be built before anything is written.
+    - flush() first serializes everything and checks for conflicts, then writes all raw files and only
+      afterwards triggers the processing. NOMAD processes updated raw files one by one, so the gain is
+      that nothing is written if one archive can not be serialized and that unchanged files are neither
+      written nor processed again.
+    - If any step fails, everything is rolled back: old content restored and processed again and
+      new raw files deleted (their entries disappear with the next processing of the upload).
+    """
+
+    def __init__(self, ELN_entry, archive, logger):
+        self.ELN_entry = ELN_entry
+        self.archive = archive
+        self.logger = logger
+        self._staged = {}  # {file_name: (entity or dict, overwrite)}
+
+    def __len__(self):
+        return len(self._staged)
+
+    def __contains__(self, file_name):
+        return file_name in self._staged
+
+    def stage(self, entity, file_name, overwrite=False):
+        """
+        Stages a section for writing. The section is serialized only in flush(), so later changes
+        (e.g. appended references) are still included. Returns the entry_id of the future entry.
+        """
+        self._staged[file_name] = (entity, overwrite)
+        return self.entry_id(file_name)
+
+    def stage_dict(self, entity_dict, file_name, overwrite=False):
+        """
+        Stages an already serialized section (m_to_dict(with_root_def=True)). Returns the entry_id.
+        """
+        self._staged[file_name] = (entity_dict, overwrite)
+        return self.entry_id(file_name)
+
+    def entry_id(self, file_name):
+        return get_entry_id_from_file_name(file_name, self.archive)
+
+    def reference(self, file_name):
+        return get_reference(self.archive.metadata.upload_id, self.entry_id(file_name))
+
+    def flush(self):
+        """
+        Writes all staged archives. Returns True on success, False if nothing was written
+        (existing files which must not be overwritten) or if the writing failed and was rolled back.
+        """
+        from nomad.datamodel.context import ClientContext
+
+        # Same behaviour as create_archive: nothing is written in a client context
+        if isinstance(self.archive.m_context, ClientContext) or not self._staged:
+            self._staged = {}
+            return True
+
+        context = self.archive.m_context
+        staged, self._staged = self._staged, {}
+
+        # 1. Check for conflicts: existing files which must not be overwritten -> nothing is written
+        existing = {file_name: context.raw_path_exists(file_name) for file_name in staged}
+        conflicts = [file_name for file_name, (_, overwrite) in staged.items() if existing[file_name] and not overwrite]
+        if conflicts:
+            log_error(self.ELN_entry, self.logger, f"{len(conflicts)} files already exist and must not be overwritten: {conflicts}. Nothing was written.")
+            return False
+
+        # 2. Serialize everything before touching any file
+        to_write = []
+        try:
+            for file_name, (entity, overwrite) in staged.items():
+                entity_dict = entity if isinstance(entity, dict) else entity.m_to_dict(with_root_def=True)
+                to_write.append((file_name, json.dumps({'data': entity_dict}), overwrite, existing[file_name]))
+        except Exception as e:
+            log_error(self.ELN_entry, self.logger, f"Could not serialize the staged archives. Nothing was written. --- Exception {e}")
+            return False
+
+        # 3. Write all changed raw files (keep old content for rollback)
+        backups = {}  # {file_name: old content or None for new files}
+        processed = []
+        try:
+            for file_name, content, overwrite, exists in to_write:
+                if exists:
+                    with context.raw_file(file_name, 'r') as file:
+                        old_content = file.read()
+                    if old_content == content:
+                        continue
+                    backups[file_name] = old_content
+                else:
+                    backups[file_name] = None
+                with context.raw_file(file_name, 'w') as file:
+                    file.write(content)
+
+            # 4. Process all written files
+            for file_name in backups:
+                processed.append(file_name)
+                context.process_updated_raw_file(file_name, allow_modify=backups[file_name] is not None)
+
+        except Exception as e:
+            self._rollback(backups, processed)
+            log_error(self.ELN_entry, self.logger, f"Writing of {len(backups)} archives failed and was rolled back. --- Exception {e}")
+            return False
+
+        log_info(self.ELN_entry, self.logger, f"Wrote {len(backups)} archives in one bulk write ({len(to_write) - len(backups)} unchanged).")
+        return True
+
+    def _rollback(self, backups, processed):
+        """
+        Restores the old content of overwritten files and deletes new raw files (through the upload files).
+        Restored files which were already processed are processed again. Entries of new files which were
+        already processed are not touched here: NOMAD removes entries without mainfile when the upload is
+        processed the next time.
+        """
+        from nomad.files import UploadFiles
+
+        context = self.archive.m_context
+        upload = UploadFiles.get(self.archive.metadata.upload_id)
+        orphaned = []
+        for file_name, old_content in backups.items():
+            try:
+                if old_content is None:
+                    upload.delete_rawfiles(file_name)
+                    if file_name in processed:
+                        orphaned.append(file_name)
+                else:
+                    with context.raw_file(file_name, 'w') as file:
+                        file.write(old_content)
+                    if file_name in processed:
+                        context.process_updated_raw_file(file_name, allow_modify=True)
+            except Exception as e:
+                log_warning(self.ELN_entry, self.logger, f"Rollback of '{file_name}' failed. --- Exception {e}")
+
+        if orphaned:
+            log_warning(self.ELN_entry, self.logger, f"Rollback: the raw files {orphaned} were deleted, their entries are removed when the upload is reprocessed.")
+
+
+
 
 
 # Make a boolean out of a string (false, FALSE, true, TRUE)
@@ -238,11 +238,10 @@ class UMR_EtchingELN(UMR_ELNProcess, UMR_Etching):
 
              # Create Process and add it to sample entry
             if self.selected_samples:
-                for sample_ref in self.selected_samples:
-                    process_entry = UMR_Etching()
-                    add_process_and_layer_to_sample(self, archive, logger, sample_ref, process_entry)
-                # Empty selected_samples Section
-                self.selected_samples = []
+                # All selected samples are updated at once (one bulk write)
+                # Empty selected_samples Section only if the samples were updated (otherwise the selection is kept)
+                if execute_process_on_selected_samples(self, archive, logger, UMR_Etching):
+                    self.selected_samples = []
             else:
                 log_error(self, logger, 'No Samples Selected. Please add the samples on which this process should be applied to the selected_samples section')
 
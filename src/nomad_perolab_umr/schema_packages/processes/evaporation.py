@@ -95,26 +95,11 @@ class UMR_EvaporationELN(UMR_ELNProcess, UMR_Evaporation):
                 log_error(self, logger, 'No Samples Selected. Please add the samples on which this process should be applied to the selected_samples section')
                 return
             
-            # Create Process and add it to sample entry 
-            for sample_ref in self.selected_samples:
-                process_entry = UMR_Evaporation()
-                sample_entry = add_process_and_layer_to_sample(self, archive, logger, sample_ref, process_entry)
-                # return new sample entry with new process (because this is not yet saved in the referenced sample (sample_ref))
-                    
-                # Create Solar Cells
-                if self.create_solar_cells:    
-                    for solar_cell_name in self.solar_cell_settings.solar_cell_names:
-                        solar_cell_entry = UMR_InternalSolarCell()
-                        solar_cell_entry_id, solar_cell_entry = create_solar_cell_from_basic_sample(self, archive, logger, sample_entry, solar_cell_name, solar_cell_entry)
-                        # Create references in batch and substrate
-                        solar_cell_reference = UMR_EntityReference(
-                            name = solar_cell_entry.name,
-                            reference=get_reference(archive.metadata.upload_id, solar_cell_entry_id),
-                            lab_id = solar_cell_entry.lab_id)
-                        create_solar_cell_references(self, archive, logger, sample_ref, solar_cell_reference)
-
-            # Empty selected_samples Section
-            self.selected_samples = []
+            # Create Process and add it to all selected samples, create solar cells (one bulk write)
+            solar_cell_class = UMR_InternalSolarCell if self.create_solar_cells else None
+            # Empty selected_samples Section only if the samples were updated (otherwise the selection is kept)
+            if execute_process_on_selected_samples(self, archive, logger, UMR_Evaporation, solar_cell_class):
+                self.selected_samples = []
          
         super().normalize(archive, logger) 
 
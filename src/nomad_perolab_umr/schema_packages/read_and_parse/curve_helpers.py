@@ -0,0 +1,76 @@
+#
+# Copyright The NOMAD Authors.
+#
+# This file is part of NOMAD. See https://nomad-lab.eu for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+### HELPER FUNCTIONS SHARED BY THE CURVE ANALYSES (JV, EQE, ABSOLUTE PL) ###
+# Curves of different length are padded into 2-D arrays (one row per curve, NaN for missing points), so every
+# analysis works on whole rows. Values of the sections may be pint quantities, plain numbers or None.
+
+
+### IMPORTS ###
+import numpy as np
+
+
+### ROW-WISE OPERATIONS ###
+
+def pad_curves(voltages, current_densities):
+    """
+    PADS JV CURVES OF DIFFERENT LENGTH INTO 2-D ARRAYS SORTED BY VOLTAGE
+    (used in the same way for EQE and PL spectra with the wavelength as first array)
+
+    Parameters:
+        voltages (list): voltage arrays in V
+        current_densities (list): current density arrays in mA/cm²
+    Returns:
+        V, J (np.ndarray): arrays with shape (number of curves, longest curve), NaN where there is no point
+        valid (np.ndarray): mask of the real points (always at the beginning of each row)
+    """
+    lengths = [min(len(v), len(j)) for v, j in zip(voltages, current_densities)]
+    V = np.full((len(lengths), max(lengths + [2])), np.nan)
+    J = np.full_like(V, np.nan)
+    for i, (v, j, length) in enumerate(zip(voltages, current_densities, lengths)):
+        V[i, :length] = v[:length]
+        J[i, :length] = j[:length]
+
+    # Sort every row by voltage, invalid points (NaN) go to the end of the row
+    valid = np.isfinite(V) & np.isfinite(J)
+    order = np.argsort(np.where(valid, V, np.inf), axis=1, kind='stable')
+    V = np.take_along_axis(V, order, axis=1)
+    J = np.take_along_axis(J, order, axis=1)
+    valid = np.take_along_axis(valid, order, axis=1)
+    return V, J, valid
+
+
+def take(array, index):
+    """Element index[i] of every row i of a 2-D array"""
+    return np.take_along_axis(array, index[:, None], axis=1)[:, 0]
+
+
+### VALUES OF THE SECTIONS ###
+
+def magnitude(value, unit=None):
+    """Float value of a quantity (converted into unit if given), NaN for None"""
+    if value is None:
+        return np.nan
+    if hasattr(value, 'to'):
+        value = value.to(unit).magnitude if unit else value.magnitude
+    return float(value)
+
+
+def is_missing(value):
+    """True if a quantity is not set (None or NaN)"""
+    return value is None or np.isnan(magnitude(value))
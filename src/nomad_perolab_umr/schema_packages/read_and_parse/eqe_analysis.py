@@ -0,0 +1,181 @@
+#
+# Copyright The NOMAD Authors.
+#
+# This file is part of NOMAD. See https://nomad-lab.eu for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+### EQE ANALYSIS (INTEGRATED Jsc, BANDGAP, URBACH ENERGY) CALCULATED FROM THE EQE ARRAYS ###
+# Works directly on the arrays of UMR_SolarCellEQE (no second parse of the data file). All curves are padded
+# into 2-D arrays like the JV curves (see curve_helpers.pad_curves), so a whole project is evaluated at once.
+# The AM1.5G spectrum (data/am15g_astm_g173.txt) is read and converted into a photon flux only once per process.
+
+
+### IMPORTS ###
+import functools
+import os
+
+import numpy as np
+from nomad.units import ureg
+
+from .curve_helpers import is_missing, pad_curves
+
+# AM1.5G spectrum shipped with this plugin: ASTM G173-03 global tilt from NREL,
+# two columns wavelength (nm) and spectral irradiance (W/(m² nm)), header lines start with #
+AM15G_SPECTRUM_FILE = os.path.join(os.path.dirname(__file__), 'data', 'am15g_astm_g173.txt')
+MIN_SPECTRUM_OVERLAP = 0.9             # part of the EQE wavelength range which must be covered by the spectrum
+
+HC_EV_NM = 1239.841984                 # h*c in eV*nm (E = HC_EV_NM / wavelength)
+PHOTONS_PER_JOULE_NM = 5.034116567e15  # 1 / (h*c) in 1/(J*nm)
+ELEMENTARY_CHARGE = 1.602176634e-19    # C
+
+URBACH_MIN_EQE = 1e-4                  # tail points used for the Urbach fit (relative to the maximum EQE)
+URBACH_MAX_EQE = 0.1
+URBACH_MIN_POINTS = 3
+
+# Quantities of UMR_SolarCellEQE which are filled by this module (quantity name, key in results, unit)
+EQE_PARAMETER_QUANTITIES = [
+    ('integrated_short_circuit_current_density', 'jsc', 'mA/cm^2'),
+    ('bandgap', 'bandgap', 'eV'),
+    ('urbach_energy', 'urbach_energy', 'meV'),
+]
+
+
+### AM1.5G SPECTRUM ###
+
+@functools.lru_cache(maxsize=4)
+def load_am15g_photon_flux(file_path=None):
+    """
+    READS THE AM1.5G SPECTRUM ONCE AND CONVERTS IT INTO A PHOTON FLUX
+
+    Parameters:
+        file_path (str): text file with wavelength (nm) and irradiance (W/(m² nm)) columns, None -> AM15G_SPECTRUM_FILE
+            files with 4 columns are read like the ASTM G173 table (global tilt in the third column)
+    Returns:
+        wavelength (np.ndarray): in nm
+        photon_flux (np.ndarray): in photons/(m² s nm)
+        or None if no spectrum file was found
+    """
+    file_path = file_path or AM15G_SPECTRUM_FILE
+    if not file_path or not os.path.exists(file_path):
+        return None
+    data = np.genfromtxt(file_path, comments='#', invalid_raise=False)
+    data = data[np.isfinite(data).all(axis=1)]
+    wavelength = data[:, 0]
+    irradiance = data[:, 2] if data.shape[1] >= 4 else data[:, 1]
+    order = np.argsort(wavelength)
+    return wavelength[order], irradiance[order] * wavelength[order] * PHOTONS_PER_JOULE_NM
+
+
+### MAIN FUNCTION ###
+
+def compute_eqe_parameters(wavelengths, eqes, spectrum=None):
+    """
+    CALCULATES INTEGRATED Jsc, BANDGAP AND URBACH ENERGY OF MANY EQE CURVES AT ONCE
+
+    Parameters:
+        wavelengths (list): wavelength arrays in nm
+        eqes (list): EQE arrays (0-1)
+        spectrum (tuple): (wavelength, photon flux) from load_am15g_photon_flux, None -> no Jsc
+    Returns:
+        results (dict): arrays with one value per curve (NaN if it could not be determined)
+            jsc (mA/cm², NaN if the spectrum covers less than MIN_SPECTRUM_OVERLAP of the wavelength range), bandgap (eV, inflection point of the absorption edge), urbach_energy (meV), eqe_max
+    """
+    W, Q, valid = pad_curves(wavelengths, eqes)
+    rows = np.arange(W.shape[0])
+    pair_valid = valid[:, :-1] & valid[:, 1:]
+
+    # Integrated Jsc: q * integral of EQE * photon flux (A/m² -> mA/cm²: factor 0.1), one interpolation for all curves
+    jsc = np.full(W.shape[0], np.nan)
+    if spectrum is not None:
+        flux = np.interp(np.where(valid, W, 0.0).ravel(), spectrum[0], spectrum[1], left=0.0, right=0.0).reshape(W.shape)
+        y = np.where(valid, Q * flux, 0.0)
+        area = np.where(pair_valid, (y[:, 1:] + y[:, :-1]) / 2 * np.diff(W, axis=1), 0.0)
+        w_min = np.nanmin(np.where(valid, W, np.inf), axis=1)
+        w_max = np.nanmax(np.where(valid, W, -np.inf), axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            overlap = (np.minimum(w_max, spectrum[0][-1]) - np.maximum(w_min, spectrum[0][0])) / (w_max - w_min)
+        jsc = np.where(valid.any(axis=1) & (overlap >= MIN_SPECTRUM_OVERLAP),
+                       area.sum(axis=1) * ELEMENTARY_CHARGE * 0.1, np.nan)
+
+    # Bandgap: maximum of dEQE/dE on the long wavelength side of the EQE maximum
+    eqe_max = np.nanmax(np.where(valid, Q, -np.inf), axis=1)
+    k_max = np.where(valid, Q, -np.inf).argmax(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        E = HC_EV_NM / W
+        slope = np.diff(Q, axis=1) / np.diff(E, axis=1)
+    edge = pair_valid & (np.arange(W.shape[1] - 1)[None, :] >= k_max[:, None]) & np.isfinite(slope)
+    slope = np.where(edge, slope, -np.inf)
+    k_edge = slope.argmax(axis=1)
+    has_edge = edge.any(axis=1) & (slope[rows, k_edge] > 0)
+    E_mid = (E[:, :-1] + E[:, 1:]) / 2
+    bandgap = np.where(has_edge, E_mid[rows, np.minimum(k_edge, E_mid.shape[1] - 1)], np.nan)
+
+    # Urbach energy: linear fit of ln(EQE) over E in the exponential tail below the bandgap
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = Q / eqe_max[:, None]
+        tail = valid & (E < bandgap[:, None]) & (relative >= URBACH_MIN_EQE) & (relative <= URBACH_MAX_EQE)
+        x = np.where(tail, E, 0.0)
+        y = np.where(tail, np.log(np.where(tail, Q, 1.0)), 0.0)
+        n = tail.sum(axis=1)
+        dx = np.where(tail, x - (x.sum(axis=1) / n)[:, None], 0.0)
+        dy = np.where(tail, y - (y.sum(axis=1) / n)[:, None], 0.0)
+        urbach_slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+        urbach_energy = np.where((n >= URBACH_MIN_POINTS) & (urbach_slope > 0), 1000 / urbach_slope, np.nan)
+
+    return dict(jsc=jsc, bandgap=bandgap, urbach_energy=urbach_energy,
+                eqe_max=np.where(valid.any(axis=1), eqe_max, np.nan))
+
+
+### FUNCTIONS FOR UMR_SolarCellEQE SECTIONS ###
+
+def _magnitude_array(values):
+    return values.magnitude if hasattr(values, 'magnitude') else values
+
+
+def fill_eqe_parameters(eqe_sections, overwrite=False):
+    """
+    CALCULATES INTEGRATED Jsc, BANDGAP AND URBACH ENERGY OF UMR_SolarCellEQE SECTIONS FROM THEIR ARRAYS
+
+    Parameters:
+        eqe_sections (list): UMR_SolarCellEQE sections (may come from many different EQE measurements)
+        overwrite (bool): False -> only missing (None or NaN) values are filled, True -> recalculate all values
+    Returns:
+        number of sections which were evaluated
+    """
+    sections = [section for section in eqe_sections
+                if section is not None and section.wavelength is not None and section.eqe is not None]
+    if not sections:
+        return 0
+
+    results = compute_eqe_parameters(
+        [section.wavelength.to('nm').magnitude for section in sections],
+        [np.asarray(_magnitude_array(section.eqe), dtype=float) for section in sections],
+        spectrum=load_am15g_photon_flux())
+
+    for i, section in enumerate(sections):
+        # Without spectrum (or if it does not cover the EQE) the integration of the measurement software is used
+        if np.isnan(results['jsc'][i]) and section.integrated_current_density is not None:
+            integrated = section.integrated_current_density.to('mA/cm^2').magnitude
+            integrated = integrated[np.isfinite(integrated)]
+            if len(integrated):
+                results['jsc'][i] = abs(integrated[-1])
+
+        for quantity, key, unit in EQE_PARAMETER_QUANTITIES:
+            value = results[key][i]
+            if np.isnan(value) or not (overwrite or is_missing(getattr(section, quantity))):
+                continue
+            setattr(section, quantity, value * ureg(unit))
+
+    return len(sections)
@@ -19,7 +19,6 @@
 
 ### IMPORTS ###
 import numpy as np  # Import numpy for numpy arrays
-from nomad.datamodel.metainfo.eln import SolarCellEQE
 from nomad.units import ureg
 
 from ..characterization.eqe_measurement import UMR_SolarCellEQE
@@ -149,13 +148,8 @@ def parse_eqe_data_to_archive(entry, mainfile, encoding):
         )
     entry.eqe_data = sc_eqe
 
-    # Create SolarCellEQE Object (because data is automatically read from file with EQE_Analyzer)
-    # append to advanced_eqe-data subsection
-    sc_advanced_eqe = SolarCellEQE(
-        eqe_data_file = entry.data_file,
-        header_lines = 23,
-        )
-    entry.advanced_eqe_data = sc_advanced_eqe
+    # Integrated Jsc, bandgap and Urbach energy are calculated from these arrays in the normalizer
+    # (read_and_parse/eqe_analysis.py), the file is not read a second time by the EQE_Analyzer of SolarCellEQE
   
     # Check box "measurement data was extracted from data file"   
     entry.measurement_data_was_extracted_from_data_file = True
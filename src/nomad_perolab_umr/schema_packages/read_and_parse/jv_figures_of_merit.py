@@ -0,0 +1,279 @@
+#
+# Copyright The NOMAD Authors.
+#
+# This file is part of NOMAD. See https://nomad-lab.eu for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+### FIGURES OF MERIT (Voc, Jsc, FF, MPP, Rs, Rsh) CALCULATED FROM JV CURVES ###
+# All curves are evaluated together: they are padded into 2-D arrays (one row per curve, NaN for missing
+# points) and every step works on whole rows, so many curves (e.g. a whole project) are computed at once.
+
+
+### IMPORTS ###
+import numpy as np
+from nomad.units import ureg
+
+from .curve_helpers import is_missing, magnitude, pad_curves, take
+
+# Quantities of UMR_SolarCellJVCurve which are filled by this module (quantity name, key in results, unit)
+JV_PARAMETER_QUANTITIES = [
+    ('open_circuit_voltage', 'voc', 'V'),
+    ('short_circuit_current_density', 'jsc', 'mA/cm^2'),
+    ('fill_factor', 'ff', None),
+    ('efficiency', 'efficiency', None),
+    ('potential_at_maximum_power_point', 'v_mpp', 'V'),
+    ('current_density_at_maximum_power_point', 'j_mpp', 'mA/cm^2'),
+    ('power_density_at_maximum_power_point', 'p_mpp', 'mW/cm^2'),
+    ('series_resistance', 'r_series', 'ohm*cm^2'),
+    ('shunt_resistance', 'r_shunt', 'ohm*cm^2'),
+]
+
+DEFAULT_LIGHT_INTENSITY = 100.0  # mW/cm², 1 sun
+HYSTERESIS_GRID_POINTS = 200     # common voltage grid for the area between reverse and forward curve
+
+
+### HELPER FUNCTIONS FOR ROW-WISE OPERATIONS ###
+
+def _interpolate_at(X, Y, valid, x0):
+    # Y at X = x0 for every row (linear between the two neighbouring points, NaN outside of the curve)
+    count = valid.sum(axis=1)
+    k = (valid & (X <= x0)).sum(axis=1) - 1
+    inside = (k >= 0) & (k < count - 1)
+    k = np.clip(k, 0, X.shape[1] - 2)
+    x1, x2, y1, y2 = take(X, k), take(X, k + 1), take(Y, k), take(Y, k + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = y1 + (x0 - x1) * (y2 - y1) / (x2 - x1)
+    return np.where(inside, y, np.nan), k
+
+
+def _local_slope(X, Y, valid, k, half_width=2):
+    # dY/dX by a linear fit over the points k-half_width ... k+1+half_width of every row
+    index = k[:, None] + np.arange(-half_width, half_width + 2)[None, :]
+    inside = (index >= 0) & (index < X.shape[1])
+    index = np.clip(index, 0, X.shape[1] - 1)
+    weight = inside & np.take_along_axis(valid, index, axis=1)
+    x = np.where(weight, np.take_along_axis(X, index, axis=1), 0.0)
+    y = np.where(weight, np.take_along_axis(Y, index, axis=1), 0.0)
+    n = weight.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = x.sum(axis=1) / n
+        y_mean = y.sum(axis=1) / n
+        dx = np.where(weight, x - x_mean[:, None], 0.0)
+        dy = np.where(weight, y - y_mean[:, None], 0.0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+    return np.where(n >= 2, slope, np.nan)
+
+
+def _interpolate_rows(X, Y, valid, grid):
+    # Y at all x values of grid (one row of x values per curve), NaN outside of the curve
+    rows, n = X.shape
+    count = valid.sum(axis=1)
+    x_min = np.where(count > 0, X[:, 0], 0.0)
+    x_max = np.where(count > 0, take(X, np.maximum(count - 1, 0)), 1.0)
+    span = np.where(x_max > x_min, x_max - x_min, 1.0)
+
+    # One searchsorted for all rows: every row is scaled to [0, 1] and shifted into its own interval
+    offset = 3.0 * np.arange(rows)[:, None]
+    keys = np.where(valid, (X - x_min[:, None]) / span[:, None], 2.0) + offset
+    queries = (grid - x_min[:, None]) / span[:, None] + offset
+    k = np.searchsorted(keys.ravel(), queries.ravel(), side='right').reshape(grid.shape) - 1 - n * np.arange(rows)[:, None]
+    k = np.clip(k, 0, np.maximum(count - 2, 0)[:, None])
+
+    x1, x2 = np.take_along_axis(X, k, axis=1), np.take_along_axis(X, k + 1, axis=1)
+    y1, y2 = np.take_along_axis(Y, k, axis=1), np.take_along_axis(Y, k + 1, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.where(x2 > x1, y1 + (grid - x1) * (y2 - y1) / (x2 - x1), y1)
+    inside = (grid >= x_min[:, None]) & (grid <= x_max[:, None]) & (count >= 2)[:, None]
+    return np.where(inside, y, np.nan)
+
+
+### MAIN FUNCTIONS ###
+
+def compute_jv_parameters(voltages, current_densities, light_intensity=DEFAULT_LIGHT_INTENSITY):
+    """
+    CALCULATES THE FIGURES OF MERIT OF MANY JV CURVES AT ONCE
+
+    Parameters:
+        voltages (list): voltage arrays in V
+        current_densities (list): current density arrays in mA/cm² (photocurrent may be positive or negative)
+        light_intensity (float or array): incident power in mW/cm² (one value or one per curve)
+    Returns:
+        results (dict): arrays with one value per curve (NaN if it could not be determined)
+            voc (V), jsc (mA/cm²), ff (0-1), efficiency (%), v_mpp (V), j_mpp (mA/cm²),
+            p_mpp (mW/cm², positive), r_series and r_shunt (Ohm*cm²)
+            jsc and j_mpp keep the sign of the photocurrent of the curve (negative in the Cicci files)
+    """
+    V, J, valid = pad_curves(voltages, current_densities)
+    rows = np.arange(V.shape[0])
+
+    # Orientation: the photocurrent is made positive in the power generating quadrant
+    j_zero, k_zero = _interpolate_at(V, J, valid, 0.0)
+    j_first = J[:, 0]
+    sign = np.where(np.isfinite(j_zero), np.where(j_zero < 0, -1.0, 1.0), np.where(j_first < 0, -1.0, 1.0))
+    Jp = J * sign[:, None]
+    jsc = np.abs(j_zero)
+
+    # Voc: first crossing from positive to negative photocurrent at positive voltage
+    pair_valid = valid[:, :-1] & valid[:, 1:] & (V[:, 1:] >= 0)
+    crossing = pair_valid & (Jp[:, :-1] > 0) & (Jp[:, 1:] <= 0)
+    has_voc = crossing.any(axis=1)
+    k_voc = crossing.argmax(axis=1)
+    v1, v2 = V[rows, k_voc], V[rows, k_voc + 1]
+    j1, j2 = Jp[rows, k_voc], Jp[rows, k_voc + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        voc = np.where(has_voc, v1 - j1 * (v2 - v1) / (j2 - j1), np.nan)
+
+    # Maximum power point in the power generating quadrant (only if the curve reaches Voc)
+    power = np.where(valid & (V >= 0) & (Jp >= 0), V * Jp, -np.inf)
+    k_mpp = power.argmax(axis=1)
+    p_mpp = power[rows, k_mpp]
+    has_mpp = has_voc & np.isfinite(p_mpp) & (p_mpp > 0)
+    p_mpp = np.where(has_mpp, p_mpp, np.nan)
+    v_mpp = np.where(has_mpp, V[rows, k_mpp], np.nan)
+    j_mpp = np.where(has_mpp, Jp[rows, k_mpp], np.nan)
+
+    light_intensity = np.broadcast_to(np.asarray(light_intensity, dtype=float), p_mpp.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ff = p_mpp / (voc * jsc)
+        efficiency = np.where(light_intensity > 0, p_mpp / light_intensity * 100, np.nan)
+
+        # Resistances from the inverse slope at Voc and at Jsc, V/(mA/cm²) -> Ohm*cm² (factor 1000)
+        slope_voc = _local_slope(V, Jp, valid, k_voc)
+        slope_jsc = _local_slope(V, Jp, valid, k_zero)
+        r_series = np.where(has_voc & (slope_voc < 0), -1000 / slope_voc, np.nan)
+        r_shunt = np.where(np.isfinite(j_zero) & (slope_jsc < 0), -1000 / slope_jsc, np.nan)
+
+    # Current densities are given back with the sign of the curve, so they can be compared with the parsed values
+    return dict(voc=voc, jsc=sign * jsc, ff=ff, efficiency=efficiency, v_mpp=v_mpp, j_mpp=sign * j_mpp, p_mpp=p_mpp,
+                r_series=r_series, r_shunt=r_shunt)
+
+
+def compute_hysteresis(reverse_voltages, reverse_current_densities, forward_voltages, forward_current_densities,
+                       reverse_efficiency, forward_efficiency, open_circuit_voltage=None):
+    """
+    CALCULATES HYSTERESIS INDEX AND AREA BETWEEN REVERSE AND FORWARD CURVE OF MANY MEASUREMENTS AT ONCE
+
+    Parameters:
+        reverse_voltages, reverse_current_densities (list): arrays of the reverse scans in V and mA/cm²
+        forward_voltages, forward_current_densities (list): arrays of the forward scans (same order)
+        reverse_efficiency, forward_efficiency (array): PCE of the scans in %
+        open_circuit_voltage (array): upper voltage limit of the area (e.g. the larger Voc), None -> whole common range
+    Returns:
+        results (dict): arrays with one value per measurement (NaN if it could not be determined)
+            hysteresis_index ((PCE_rev - PCE_fw) / PCE_rev), hysteresis_area (mW/cm², between 0 V and Voc)
+    """
+    Vr, Jr, valid_r = pad_curves(reverse_voltages, reverse_current_densities)
+    Vf, Jf, valid_f = pad_curves(forward_voltages, forward_current_densities)
+    count_r, count_f = valid_r.sum(axis=1), valid_f.sum(axis=1)
+
+    # Common voltage range of both scans in the power generating quadrant
+    low = np.maximum(np.maximum(Vr[:, 0], Vf[:, 0]), 0.0)
+    high = np.minimum(take(Vr, np.maximum(count_r - 1, 0)), take(Vf, np.maximum(count_f - 1, 0)))
+    if open_circuit_voltage is not None:
+        voc = np.asarray(open_circuit_voltage, dtype=float)
+        high = np.where(np.isfinite(voc) & (voc > low), np.minimum(high, voc), high)
+    has_range = (count_r >= 2) & (count_f >= 2) & (high > low)
+
+    grid = low[:, None] + (high - low)[:, None] * np.linspace(0.0, 1.0, HYSTERESIS_GRID_POINTS)[None, :]
+    difference = np.abs(_interpolate_rows(Vr, Jr, valid_r, grid) - _interpolate_rows(Vf, Jf, valid_f, grid))
+    pairs = np.isfinite(difference[:, 1:]) & np.isfinite(difference[:, :-1])
+    area = np.where(pairs, (difference[:, 1:] + difference[:, :-1]) / 2 * np.diff(grid, axis=1), 0.0).sum(axis=1)
+
+    reverse_efficiency = np.asarray(reverse_efficiency, dtype=float)
+    forward_efficiency = np.asarray(forward_efficiency, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hysteresis_index = np.where(reverse_efficiency > 0,
+                                    (reverse_efficiency - forward_efficiency) / reverse_efficiency, np.nan)
+
+    return dict(hysteresis_index=hysteresis_index, hysteresis_area=np.where(has_range, area, np.nan))
+
+
+### FUNCTIONS FOR UMR_SolarCellJVCurve SECTIONS ###
+
+def fill_jv_parameters(jv_curves, area=None, overwrite=False):
+    """
+    CALCULATES THE FIGURES OF MERIT OF UMR_SolarCellJVCurve SECTIONS FROM THEIR VOLTAGE AND CURRENT DENSITY
+
+    Parameters:
+        jv_curves (list): UMR_SolarCellJVCurve sections (may come from many different measurements)
+        area (Quantity): active area, needed for the resistances in Ohm (series/shunt_resistance_ohm)
+        overwrite (bool): False -> only missing (None or NaN) values are filled, True -> recalculate all values
+    Returns:
+        number of curves which were evaluated
+    """
+    curves = [curve for curve in jv_curves
+              if curve.voltage is not None and curve.current_density is not None and not curve.dark]
+    if not curves:
+        return 0
+
+    light_intensity = [DEFAULT_LIGHT_INTENSITY if is_missing(curve.light_intensity)
+                       else magnitude(curve.light_intensity, 'mW/cm^2') for curve in curves]
+    results = compute_jv_parameters(
+        [curve.voltage.to('V').magnitude for curve in curves],
+        [curve.current_density.to('mA/cm^2').magnitude for curve in curves],
+        light_intensity=light_intensity)
+
+    area_cm2 = None if is_missing(area) else magnitude(area, 'cm^2')
+    for i, curve in enumerate(curves):
+        for quantity, key, unit in JV_PARAMETER_QUANTITIES:
+            value = results[key][i]
+            if np.isnan(value) or not (overwrite or is_missing(getattr(curve, quantity))):
+                continue
+            setattr(curve, quantity, value * ureg(unit) if unit else float(value))
+
+        # Resistances in Ohm like in the Cicci files
+        if area_cm2:
+            for quantity, key in [('series_resistance_ohm', 'r_series'), ('shunt_resistance_ohm', 'r_shunt')]:
+                value = results[key][i]
+                if not np.isnan(value) and (overwrite or is_missing(getattr(curve, quantity))):
+                    setattr(curve, quantity, value / area_cm2 * ureg('ohm'))
+
+    return len(curves)
+
+
+def fill_hysteresis(jv_measurements):
+    """
+    CALCULATES HYSTERESIS INDEX AND AREA OF UMR_JVMeasurement SECTIONS FROM THEIR REVERSE AND FORWARD CURVE
+
+    Parameters:
+        jv_measurements (list): UMR_JVMeasurement sections (light curves with scan 'Reverse' and 'Forward')
+    Returns:
+        number of measurements which were evaluated
+    """
+    pairs = []
+    for measurement in jv_measurements:
+        curves = {curve.scan: curve for curve in measurement.jv_curve or []
+                  if not curve.dark and curve.voltage is not None and curve.current_density is not None}
+        if 'Reverse' in curves and 'Forward' in curves:
+            pairs.append((measurement, curves['Reverse'], curves['Forward']))
+    if not pairs:
+        return 0
+
+    results = compute_hysteresis(
+        [rev.voltage.to('V').magnitude for _, rev, _ in pairs],
+        [rev.current_density.to('mA/cm^2').magnitude for _, rev, _ in pairs],
+        [fw.voltage.to('V').magnitude for _, _, fw in pairs],
+        [fw.current_density.to('mA/cm^2').magnitude for _, _, fw in pairs],
+        [magnitude(rev.efficiency) for _, rev, _ in pairs],
+        [magnitude(fw.efficiency) for _, _, fw in pairs],
+        open_circuit_voltage=[np.nanmax([magnitude(rev.open_circuit_voltage, 'V'), magnitude(fw.open_circuit_voltage, 'V')])
+                              if not (is_missing(rev.open_circuit_voltage) and is_missing(fw.open_circuit_voltage)) else np.nan
+                              for _, rev, fw in pairs])
+
+    for i, (measurement, _, _) in enumerate(pairs):
+        hysteresis_index, hysteresis_area = results['hysteresis_index'][i], results['hysteresis_area'][i]
+        measurement.hysteresis_index = None if np.isnan(hysteresis_index) else float(hysteresis_index)
+        measurement.hysteresis_area = None if np.isnan(hysteresis_area) else hysteresis_area * ureg('mW/cm^2')
+    return len(pairs)
@@ -22,6 +22,7 @@ import numpy as np  # Import numpy for numpy arrays
 from nomad.units import ureg
 
 from ..characterization.jv_measurement import UMR_SolarCellJVCurve
+from .jv_figures_of_merit import JV_PARAMETER_QUANTITIES, fill_hysteresis, fill_jv_parameters
 from .read_header_line import read_header_line
 
 
@@ -40,12 +41,10 @@ def read_JVparameter_line(line, jv_dict, measurement, header_params):
     parts=line.split()                         # Split line at tab character
 
     for i, value in enumerate(parts[1:]):
-        # Check if value is NaN -> set value to 0.0 (for some very bad JV curves e.g. Efficiency is NaN)
-        processed_value = 0.0 if value.lower() == 'nan' else value
-    
-        # Add value to jv_dict
+        # NaN values (for some very bad JV curves e.g. Efficiency is NaN) are kept as NaN here,
+        # they are calculated from the JV curve in parse_jv_data_to_archive if possible
         jv_dict[measurement].update({
-            header_params[i+1]: float(processed_value)
+            header_params[i+1]: float(value)
             })
 
     #jv_dict[measurement].update({              # Add key-value pairs to nested dictionaries (Forward and Reverse)
@@ -243,6 +242,20 @@ def parse_jv_data_to_archive(entry, mainfile, encoding):
 
         # Append JV Curve to entry
         entry.jv_curve.append(JVCurve)
+
+    # Calculate missing parameters (not in the file or NaN) from the JV curves
+    fill_jv_parameters(entry.jv_curve, area=entry.active_area)
+
+    # Hysteresis index and area between reverse and forward curve
+    fill_hysteresis([entry])
+
+    # Parameters which could not be calculated either stay empty (like parameters which are not in the file),
+    # a value of 0.0 would be taken for a measured value in the statistics
+    for JVCurve in entry.jv_curve:
+        for quantity, _, _ in JV_PARAMETER_QUANTITIES + [('series_resistance_ohm', None, 'ohm'), ('shunt_resistance_ohm', None, 'ohm')]:
+            value = getattr(JVCurve, quantity)
+            if value is not None and np.isnan(value.magnitude if hasattr(value, 'magnitude') else value):
+                setattr(JVCurve, quantity, None)
         
     # Check box "measurement data was extracted from data file"   
     entry.measurement_data_was_extracted_from_data_file = True
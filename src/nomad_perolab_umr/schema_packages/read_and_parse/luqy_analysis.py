@@ -0,0 +1,219 @@
+#
+# Copyright The NOMAD Authors.
+#
+# This file is part of NOMAD. See https://nomad-lab.eu for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+### ABSOLUTE PL ANALYSIS (PLQY, QFLS, PEAK POSITION, FWHM) CALCULATED FROM THE LUMINESCENCE FLUX ###
+# All spectra are padded into 2-D arrays (see curve_helpers.pad_curves) and evaluated together.
+# QFLS follows from the absolute emitted photon flux and the radiative limit of the bandgap:
+#     QFLS = kT * ln(emitted flux / black body flux above the bandgap)
+# so it does not depend on header values. PLQY needs the generation (header value Jsc = q * absorbed photon flux).
+
+
+### IMPORTS ###
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from nomad.units import ureg
+
+from .curve_helpers import magnitude, pad_curves, take
+
+FLUX_UNIT = '1/(s*cm**2*nm)'              # unit of the luminescence flux density used for the calculation
+TEMPERATURE = 300.0                       # K
+REPROCESS_MAX_WORKERS = None              # processes for reprocess_abspl_files (None: number of CPUs)
+
+HC_EV_NM = 1239.841984                    # h*c in eV*nm
+BOLTZMANN_EV = 8.617333262e-5             # eV/K
+ELEMENTARY_CHARGE = 1.602176634e-19       # C
+# 2*pi / (h^3 c^2) in 1/(s cm² eV³) for the black body photon flux
+BLACK_BODY_PREFACTOR = 2 * np.pi / ((4.135667696e-15) ** 3 * (2.99792458e10) ** 2)
+
+# Quantities of UMR_AbsPLResult which are filled by this module (quantity name, key in results, unit)
+# Values which are also in the header are stored separately (*_calculated), the header values are never replaced
+PL_PARAMETER_QUANTITIES = [
+    ('luminescence_quantum_yield_calculated', 'plqy', None),
+    ('quasi_fermi_level_splitting_calculated', 'qfls', 'eV'),
+    ('i_voc_calculated', 'i_voc', 'V'),
+    ('bandgap_calculated', 'bandgap', 'eV'),
+    ('peak_wavelength', 'peak_wavelength', 'nm'),
+    ('peak_energy', 'peak_energy', 'eV'),
+    ('fwhm', 'fwhm', 'meV'),
+    ('emitted_photon_flux', 'emitted_flux', '1/(s*cm**2)'),
+]
+
+
+### MAIN FUNCTION ###
+
+def radiative_limit_flux(bandgap, temperature=TEMPERATURE):
+    """Black body photon flux above the bandgap in 1/(s cm²) (absorptance 1 above Eg, 0 below)"""
+    kT = BOLTZMANN_EV * temperature
+    bandgap = np.asarray(bandgap, dtype=float)
+    return BLACK_BODY_PREFACTOR * kT * np.exp(-bandgap / kT) * (bandgap ** 2 + 2 * bandgap * kT + 2 * kT ** 2)
+
+
+def compute_pl_parameters(wavelengths, fluxes, generation_current_density=None, bandgap=None, temperature=TEMPERATURE):
+    """
+    CALCULATES PLQY, QFLS, PEAK POSITION AND FWHM OF MANY ABSOLUTE PL SPECTRA AT ONCE
+
+    Parameters:
+        wavelengths (list): wavelength arrays in nm
+        fluxes (list): luminescence flux density arrays in photons/(s cm² nm)
+        generation_current_density (array): q * absorbed photon flux in mA/cm² (header "Jsc"), NaN -> no PLQY
+        bandgap (array): bandgap in eV, NaN -> the PL peak energy is used
+    Returns:
+        results (dict): arrays with one value per spectrum (NaN if it could not be determined)
+            plqy (%, like the header value LuQY), qfls (eV), i_voc (V), bandgap (eV), peak_wavelength (nm), peak_energy (eV),
+            fwhm (meV), emitted_flux (photons/(s cm²))
+    """
+    W, F, valid = pad_curves(wavelengths, fluxes)
+    rows = np.arange(W.shape[0])
+    count = valid.sum(axis=1)
+    has_data = count >= 3
+
+    # Emitted photon flux (trapezoid over wavelength)
+    pair_valid = valid[:, :-1] & valid[:, 1:]
+    emitted = np.where(pair_valid, (F[:, 1:] + F[:, :-1]) / 2 * np.diff(W, axis=1), 0.0).sum(axis=1)
+    emitted = np.where(has_data & (emitted > 0), emitted, np.nan)
+
+    # Peak: maximum with parabolic refinement over the neighbouring points
+    masked = np.where(valid, F, -np.inf)
+    k = masked.argmax(axis=1)
+    peak = masked[rows, k]
+    km, kp = np.clip(k - 1, 0, None), np.minimum(k + 1, np.maximum(count - 1, 0))
+    fm, fp = F[rows, km], F[rows, kp]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        curvature = fm - 2 * peak + fp
+        shift = np.where((km < k) & (kp > k) & (curvature < 0), 0.5 * (fm - fp) / curvature, 0.0)
+    step = np.where(shift >= 0, W[rows, kp] - W[rows, k], W[rows, k] - W[rows, km])
+    peak_wavelength = np.where(has_data & (peak > 0), W[rows, k] + shift * step, np.nan)
+    peak_energy = HC_EV_NM / peak_wavelength
+
+    # FWHM: half maximum crossings left and right of the peak (linear interpolation)
+    index = np.arange(W.shape[1])[None, :]
+    below = valid & (F < peak[:, None] / 2)
+    left = np.where(below & (index < k[:, None]), index, -1).max(axis=1)
+    right = np.where(below & (index > k[:, None]), index, W.shape[1]).min(axis=1)
+    has_fwhm = has_data & (left >= 0) & (right < W.shape[1])
+    left, right = np.clip(left, 0, W.shape[1] - 2), np.clip(right, 1, W.shape[1] - 1)
+    half = peak / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w_left = take(W, left) + (half - take(F, left)) * (take(W, left + 1) - take(W, left)) / (take(F, left + 1) - take(F, left))
+        w_right = take(W, right - 1) + (half - take(F, right - 1)) * (take(W, right) - take(W, right - 1)) / (take(F, right) - take(F, right - 1))
+        fwhm = np.where(has_fwhm, (HC_EV_NM / w_left - HC_EV_NM / w_right) * 1000, np.nan)
+
+    # PLQY and QFLS
+    if bandgap is None:
+        bandgap = np.full(W.shape[0], np.nan)
+    bandgap = np.where(np.isfinite(np.asarray(bandgap, dtype=float)), bandgap, peak_energy)
+    if generation_current_density is None:
+        generation_current_density = np.full(W.shape[0], np.nan)
+    generation = np.asarray(generation_current_density, dtype=float) * 1e-3 / ELEMENTARY_CHARGE
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plqy = np.where(generation > 0, emitted / generation * 100, np.nan)
+        qfls = BOLTZMANN_EV * temperature * np.log(emitted / radiative_limit_flux(bandgap, temperature))
+
+    return dict(plqy=plqy, qfls=qfls, i_voc=qfls, bandgap=bandgap, peak_wavelength=peak_wavelength,
+                peak_energy=peak_energy, fwhm=fwhm, emitted_flux=emitted)
+
+
+### FUNCTIONS FOR UMR_AbsPLResult SECTIONS ###
+
+def _array_magnitude(values, unit):
+    if hasattr(values, 'to'):
+        return values.to(unit).magnitude
+    return np.asarray(values, dtype=float)
+
+
+def fill_pl_parameters(results):
+    """
+    CALCULATES PLQY, QFLS, PEAK POSITION AND FWHM OF UMR_AbsPLResult SECTIONS FROM THEIR LUMINESCENCE FLUX
+
+    Parameters:
+        results (list): UMR_AbsPLResult sections (may come from many different AbsPL measurements)
+            the header values are only read (Jsc, bandgap), the results go into the quantities of PL_PARAMETER_QUANTITIES
+    Returns:
+        number of sections which were evaluated
+    """
+    sections = [section for section in results
+                if section is not None and section.wavelength is not None and section.luminescence_flux_density is not None]
+    if not sections:
+        return 0
+
+    values = compute_pl_parameters(
+        [_array_magnitude(section.wavelength, 'nm') for section in sections],
+        [_array_magnitude(section.luminescence_flux_density, FLUX_UNIT) for section in sections],
+        generation_current_density=[magnitude(getattr(section, 'derived_jsc', None), 'mA/cm^2') for section in sections],
+        bandgap=[magnitude(getattr(section, 'bandgap', None), 'eV') for section in sections])
+
+    for i, section in enumerate(sections):
+        quantities = section.m_def.all_quantities
+        for quantity, key, unit in PL_PARAMETER_QUANTITIES:
+            if quantity not in quantities:
+                continue
+            value = values[key][i]
+            setattr(section, quantity, None if np.isnan(value) else (value * ureg(unit) if unit else float(value)))
+    return len(sections)
+
+
+### REPROCESSING OF MANY FILES (E.G. ALL AbsPL MEASUREMENTS OF A PROJECT) ###
+
+class _SilentLogger:
+    def debug(self, *args, **kwargs):
+        pass
+
+
+def _read_abspl_file(file_path):
+    # Runs in the worker processes: only the parsing, the calculation is done for all files at once
+    from .luqy_parser import parse_header, parse_numeric_data
+
+    with open(file_path, 'rb') as f:
+        lines = f.read().decode('cp1252', errors='replace').splitlines()
+    logger = _SilentLogger()
+    settings_vals, result_vals, data_start_idx = parse_header(lines, logger)
+    wavelengths, lum_flux, _, _ = parse_numeric_data(lines, data_start_idx, logger)
+    return settings_vals, result_vals, wavelengths, lum_flux
+
+
+def reprocess_abspl_files(file_paths, max_workers=REPROCESS_MAX_WORKERS, flux_unit=FLUX_UNIT):
+    """
+    PARSES MANY AbsPL DATA FILES IN A PROCESS POOL AND CALCULATES ALL PARAMETERS IN ONE VECTORIZED STEP
+
+    Parameters:
+        file_paths (list): paths of the AbsPL data files
+        flux_unit (str): unit of the luminescence flux column in the files
+    Returns:
+        list of dicts (one per file): file, header results and calculated values (suffix _calculated)
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        parsed = list(executor.map(_read_abspl_file, file_paths, chunksize=max(1, len(file_paths) // (4 * (os.cpu_count() or 1)))))
+
+    scale = (1 * ureg(flux_unit)).to(FLUX_UNIT).magnitude
+    values = compute_pl_parameters(
+        [wavelengths for _, _, wavelengths, _ in parsed],
+        [lum_flux * scale for _, _, _, lum_flux in parsed],
+        generation_current_density=[result_vals.get('derived_jsc', np.nan) for _, result_vals, _, _ in parsed],
+        bandgap=[result_vals.get('bandgap', np.nan) for _, result_vals, _, _ in parsed])
+
+    rows = []
+    for i, (file_path, (settings_vals, result_vals, _, _)) in enumerate(zip(file_paths, parsed)):
+        row = dict(file=file_path, **settings_vals, **result_vals)
+        row.update({f'{key}_calculated': float(values[key][i]) for key in values})
+        rows.append(row)
+    return rows
@@ -16,6 +16,8 @@
 # limitations under the License.
 #
 
+import numpy as np
+
 
 def parse_abspl_data(data_file, archive, logger):
     """Parses the AbsPL data file and returns extracted settings and spectral arrays."""
@@ -93,28 +95,27 @@ def parse_header(lines, logger):
 
 
 def parse_numeric_data(lines, data_start_idx, logger):
-    wavelengths = []
-    lum_flux = []
-    raw_counts = []
-    dark_counts = []
+    """Reads the data block in one call (np.loadtxt), files with broken rows are read row by row."""
+    MIN_PARTS_COUNT = 3
+    data = np.empty((0, MIN_PARTS_COUNT))
+    dark_counts = None
 
     if data_start_idx is not None and data_start_idx < len(lines):
-        MIN_PARTS_COUNT = 3
-        for line in lines[data_start_idx:]:
-            if not line.strip():
-                continue
-            parts = line.split()
-            if len(parts) < MIN_PARTS_COUNT:
-                continue
+        rows = [line for line in lines[data_start_idx:] if line.strip()]
+        if rows:
             try:
-                wavelengths.append(float(parts[0]))
-                lum_flux.append(float(parts[1]))
-                raw_counts.append(float(parts[2]))
-                if len(parts) == 3:
-                    continue  # Some files may not have dark counts
-                dark_counts.append(float(parts[3]))
+                data = np.loadtxt(rows, dtype=float, ndmin=2)
             except ValueError:
-                logger.debug('Could not parse numeric row', row=line)
+                # Broken rows or rows with a different number of columns
+                data, dark_counts = _parse_numeric_rows(rows, MIN_PARTS_COUNT, logger)
+            if data.shape[1] < MIN_PARTS_COUNT:
+                data = np.empty((0, MIN_PARTS_COUNT))
+
+    wavelengths = data[:, 0]
+    lum_flux = data[:, 1]
+    raw_counts = data[:, 2]
+    if dark_counts is None:
+        dark_counts = data[:, 3] if data.shape[1] > MIN_PARTS_COUNT else np.empty(0)  # Some files may not have dark counts
 
     logger.debug(
         'Parsed numeric data',
@@ -124,4 +125,22 @@ def parse_numeric_data(lines, data_start_idx, logger):
         dc_count=len(dark_counts),
     )
 
-    return wavelengths, lum_flux, raw_counts, dark_counts
\ No newline at end of file
+    return wavelengths, lum_flux, raw_counts, dark_counts
+
+
+def _parse_numeric_rows(rows, min_parts_count, logger):
+    # Row by row: the first three values of every row with at least three numbers are kept,
+    # a dark count only if the row has a readable fourth value
+    data = []
+    dark_counts = []
+    for line in rows:
+        parts = line.split()
+        if len(parts) < min_parts_count:
+            continue
+        try:
+            data.append([float(part) for part in parts[:min_parts_count]])
+            if len(parts) > min_parts_count:
+                dark_counts.append(float(parts[min_parts_count]))
+        except ValueError:
+            logger.debug('Could not parse numeric row', row=line)
+    return np.array(data, dtype=float).reshape(-1, min_parts_count), np.array(dark_counts, dtype=float)
@@ -0,0 +1,144 @@
+#
+# Copyright The NOMAD Authors.
+#
+# This file is part of NOMAD. See https://nomad-lab.eu for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+### DEGRADATION METRICS (T95, T80, T50, BURN-IN, DEGRADATION RATE) OF STABILITY TRACKING DATA ###
+# The tracking data is processed in chunks in one pass: every chunk is smoothed with a running median
+# (robust against spikes of the tracker), the T-times are searched in the smoothed chunk and every
+# SMOOTHING_WINDOW-th smoothed point is kept for the burn-in and linear fit at the end.
+
+
+### IMPORTS ###
+import warnings
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .jv_figures_of_merit import DEFAULT_LIGHT_INTENSITY
+
+SMOOTHING_WINDOW = 25      # points of the running median
+CHUNK_SIZE = 100000        # points which are processed at once
+BURN_IN_TOLERANCE = 0.02   # relative deviation from the linear fit which still counts as stabilized
+T_FRACTIONS = {'t95': 0.95, 't80': 0.80, 't50': 0.50}
+
+
+class StabilityMetrics:
+    """
+    CALCULATES DEGRADATION METRICS FROM TRACKING DATA GIVEN IN CHUNKS
+
+    Usage:
+        metrics = StabilityMetrics()
+        for time, power_density in chunks:
+            metrics.update(time, power_density)
+        results = metrics.result()
+    """
+
+    def __init__(self, window=SMOOTHING_WINDOW, light_intensity=DEFAULT_LIGHT_INTENSITY):
+        self.window = window
+        self.light_intensity = light_intensity
+        self._tail = np.empty(0)      # last window-1 points of the previous chunk (for the running median)
+        self._count = 0               # number of processed points
+        self.initial = None           # initial PCE (median of the first window)
+        self.t_times = dict.fromkeys(T_FRACTIONS)
+        self._reduced_time = []       # every window-th smoothed point
+        self._reduced_pce = []
+        self._start_time = None
+        self._end_time = None
+
+    def update(self, time, power_density):
+        time = np.asarray(time, dtype=float)
+        pce = np.asarray(power_density, dtype=float) / self.light_intensity * 100
+        if not len(time):
+            return
+        if self._start_time is None:
+            self._start_time = time[0]
+        self._end_time = time[-1]
+
+        # Running median over the last window points (the first points use the points available so far)
+        padded = np.concatenate([np.full(self.window - 1 - len(self._tail), np.nan), self._tail, pce])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # windows with only NaN values
+            smoothed = np.nanmedian(sliding_window_view(padded, self.window), axis=1)
+        self._tail = padded[-(self.window - 1):] if self.window > 1 else np.empty(0)
+
+        # Initial PCE: first value with a full window
+        search_from = 0
+        if self.initial is None:
+            search_from = max(self.window - 1 - self._count, 0)
+            if search_from < len(smoothed):
+                self.initial = smoothed[search_from]
+        if self.initial is not None:
+            for key, fraction in T_FRACTIONS.items():
+                if self.t_times[key] is None:
+                    below = np.flatnonzero(smoothed[search_from:] <= fraction * self.initial)
+                    if len(below):
+                        self.t_times[key] = time[search_from + below[0]] - self._start_time
+
+        index = np.arange(self._count, self._count + len(smoothed))
+        keep = (index % self.window == 0) & np.isfinite(smoothed)
+        self._reduced_time.append(time[keep])
+        self._reduced_pce.append(smoothed[keep])
+        self._count += len(smoothed)
+
+    def result(self):
+        """
+        Returns:
+            results (dict): initial_efficiency, stabilized_efficiency (%), burn_in_time (h), burn_in_loss (% of initial),
+                linear_degradation_rate (% of stabilized PCE per hour), t95, t80, t50 (h)
+                None for values which can not be determined (e.g. T50 not reached)
+        """
+        results = dict(initial_efficiency=self.initial, **self.t_times, stabilized_efficiency=None,
+                       burn_in_time=None, burn_in_loss=None, linear_degradation_rate=None)
+        t = np.concatenate(self._reduced_time) if self._reduced_time else np.empty(0)
+        pce = np.concatenate(self._reduced_pce) if self._reduced_pce else np.empty(0)
+
+        # Linear regime: fit over the second half of the test
+        fit_start = self._start_time + (self._end_time - self._start_time) / 2 if len(t) else None
+        in_fit = t >= fit_start if len(t) else np.zeros(0, dtype=bool)
+        if self.initial is None or in_fit.sum() < 2:
+            return results
+        slope, intercept = np.polyfit(t[in_fit], pce[in_fit], 1)
+
+        # Burn-in ends after the last point (before the linear regime) that deviates from the fit
+        fit = slope * t + intercept
+        with np.errstate(divide='ignore', invalid='ignore'):
+            outside = np.flatnonzero((np.abs(pce - fit) > BURN_IN_TOLERANCE * np.abs(fit)) & ~in_fit)
+        burn_in_end = t[outside[-1] + 1] if len(outside) else t[0]
+        stabilized = slope * burn_in_end + intercept
+
+        results.update(
+            stabilized_efficiency=stabilized,
+            burn_in_time=burn_in_end - self._start_time,
+            burn_in_loss=(self.initial - stabilized) / self.initial * 100 if self.initial else None,
+            linear_degradation_rate=-slope / stabilized * 100 if stabilized else None)
+        return results
+
+
+def compute_stability_metrics(time, power_density, chunk_size=CHUNK_SIZE, **kwargs):
+    """
+    CALCULATES THE DEGRADATION METRICS OF ONE TRACKING MEASUREMENT
+
+    Parameters:
+        time (np.ndarray): time in hours
+        power_density (np.ndarray): power density in mW/cm² (PCE = power density / light intensity)
+    Returns:
+        results (dict): see StabilityMetrics.result
+    """
+    metrics = StabilityMetrics(**kwargs)
+    for start in range(0, min(len(time), len(power_density)), chunk_size):
+        metrics.update(time[start:start + chunk_size], power_density[start:start + chunk_size])
+    return metrics.result()
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from nomad.units import ureg
+
+from nomad_perolab_umr.schema_packages.read_and_parse.curve_helpers import is_missing, magnitude, pad_curves, take
+
+
+def test_pad_curves_sorts_rows_and_moves_invalid_points_to_the_end():
+    V, J, valid = pad_curves([np.array([0.2, 0.0, 0.1]), np.array([0.5, np.nan])],
+                             [np.array([2.0, 0.0, 1.0]), np.array([5.0, 6.0])])
+
+    assert V.shape == (2, 3)
+    np.testing.assert_array_equal(V[0], [0.0, 0.1, 0.2])
+    np.testing.assert_array_equal(J[0], [0.0, 1.0, 2.0])
+    np.testing.assert_array_equal(valid, [[True, True, True], [True, False, False]])
+    np.testing.assert_array_equal(take(J, np.array([2, 0])), [2.0, 5.0])
+
+
+def test_magnitude_and_is_missing():
+    assert magnitude(1.5 * ureg('V'), 'mV') == pytest.approx(1500)
+    assert magnitude(2) == 2.0
+    assert np.isnan(magnitude(None))
+    assert is_missing(None) and is_missing(float('nan')) and is_missing(np.nan * ureg('V'))
+    assert not is_missing(0.0)
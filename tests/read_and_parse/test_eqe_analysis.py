@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from nomad_perolab_umr.schema_packages.read_and_parse.eqe_analysis import (
+    HC_EV_NM,
+    compute_eqe_parameters,
+    load_am15g_photon_flux,
+)
+
+
+def eqe_curve(bandgap=1.6, urbach_energy=0.015, wavelength=None):
+    """EQE of 0.8 above the bandgap with an exponential (Urbach) tail below"""
+    wavelength = np.arange(300.0, 1000.0, 1.0) if wavelength is None else wavelength
+    energy = HC_EV_NM / wavelength
+    eqe = 0.8 * np.where(energy >= bandgap, 1.0, np.exp((energy - bandgap) / urbach_energy))
+    return wavelength, eqe
+
+
+def test_shipped_spectrum_is_am15g():
+    wavelength, photon_flux = load_am15g_photon_flux()
+    irradiance = photon_flux / wavelength / 5.034116567e15  # back to W/(m² nm)
+
+    assert wavelength[0] == 280.0 and wavelength[-1] == 4000.0
+    integral = np.sum((irradiance[1:] + irradiance[:-1]) / 2 * np.diff(wavelength))
+    assert integral == pytest.approx(1000, rel=0.01)
+
+
+def test_integrated_jsc_bandgap_and_urbach_energy():
+    wavelength, eqe = eqe_curve()
+    results = compute_eqe_parameters([wavelength], [eqe], spectrum=load_am15g_photon_flux())
+
+    # 0.8 of the AM1.5G photocurrent up to 1.6 eV (about 25.5 mA/cm² for EQE = 1)
+    assert results['jsc'][0] == pytest.approx(0.8 * 25.5, rel=0.03)
+    assert results['bandgap'][0] == pytest.approx(1.6, abs=0.01)
+    assert results['urbach_energy'][0] == pytest.approx(15, rel=0.05)
+    assert results['eqe_max'][0] == pytest.approx(0.8)
+
+
+def test_jsc_is_nan_without_overlapping_spectrum():
+    wavelength, eqe = eqe_curve()
+    spectrum = load_am15g_photon_flux()
+    shifted = (spectrum[0] + 5000, spectrum[1])
+
+    assert np.isnan(compute_eqe_parameters([wavelength], [eqe], spectrum=shifted)['jsc'][0])
+    assert np.isnan(compute_eqe_parameters([wavelength], [eqe], spectrum=None)['jsc'][0])
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from nomad_perolab_umr.schema_packages.read_and_parse.jv_figures_of_merit import compute_jv_parameters
+
+
+def diode_curve(jsc=20.0, j0=1e-9, n_vt=0.05, sign=-1.0):
+    """Ideal diode curve in mA/cm², photocurrent with the given sign (negative like in the Cicci files)"""
+    voltage = np.linspace(-0.1, 1.2, 1301)
+    current_density = jsc - j0 * (np.exp(voltage / n_vt) - 1)
+    return voltage, sign * current_density
+
+
+def test_negative_photocurrent_keeps_sign():
+    voltage, current_density = diode_curve(sign=-1.0)
+    results = compute_jv_parameters([voltage], [current_density])
+
+    voc_expected = 0.05 * np.log(20.0 / 1e-9 + 1)
+    assert results['voc'][0] == pytest.approx(voc_expected, abs=1e-3)
+    assert results['jsc'][0] == pytest.approx(-20.0, rel=1e-6)
+    assert results['j_mpp'][0] < 0
+    assert results['p_mpp'][0] > 0
+    assert results['p_mpp'][0] == pytest.approx(-results['v_mpp'][0] * results['j_mpp'][0])
+    assert 0.7 < results['ff'][0] < 0.9
+    assert results['efficiency'][0] == pytest.approx(results['p_mpp'][0])  # 100 mW/cm² -> PCE (%) = P_mpp
+
+
+def test_positive_photocurrent_gives_same_figures_of_merit():
+    negative = compute_jv_parameters(*map(list, zip(diode_curve(sign=-1.0))))
+    positive = compute_jv_parameters(*map(list, zip(diode_curve(sign=1.0))))
+
+    assert positive['jsc'][0] == pytest.approx(-negative['jsc'][0])
+    assert positive['j_mpp'][0] == pytest.approx(-negative['j_mpp'][0])
+    for key in ['voc', 'ff', 'efficiency', 'p_mpp', 'r_series', 'r_shunt']:
+        assert positive[key][0] == pytest.approx(negative[key][0])
+
+
+def test_curve_without_voc_gives_nan():
+    voltage = np.linspace(0, 0.5, 51)
+    results = compute_jv_parameters([voltage], [np.full(51, -20.0)])
+
+    assert results['jsc'][0] == pytest.approx(-20.0)
+    assert np.isnan(results['voc'][0]) and np.isnan(results['p_mpp'][0])
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from nomad_perolab_umr.schema_packages.read_and_parse.luqy_analysis import (
+    BOLTZMANN_EV,
+    ELEMENTARY_CHARGE,
+    HC_EV_NM,
+    TEMPERATURE,
+    compute_pl_parameters,
+    radiative_limit_flux,
+)
+from nomad_perolab_umr.schema_packages.read_and_parse.luqy_parser import parse_numeric_data
+
+
+class Logger:
+    def debug(self, *args, **kwargs):
+        pass
+
+
+def gaussian_spectrum(peak_energy=1.6, sigma=0.03, emitted_flux=1e12):
+    """PL spectrum in photons/(s cm² nm) with a gaussian peak in energy and the given total flux"""
+    wavelength = np.arange(600.0, 950.0, 0.5)
+    energy = HC_EV_NM / wavelength
+    per_ev = np.exp(-0.5 * ((energy - peak_energy) / sigma) ** 2) / (sigma * np.sqrt(2 * np.pi))
+    return wavelength, emitted_flux * per_ev * energy / wavelength  # dE/dλ = E/λ
+
+
+def test_peak_fwhm_and_emitted_flux():
+    wavelength, flux = gaussian_spectrum()
+    results = compute_pl_parameters([wavelength], [flux])
+
+    assert results['peak_energy'][0] == pytest.approx(1.6, abs=0.005)
+    assert results['peak_wavelength'][0] == pytest.approx(HC_EV_NM / results['peak_energy'][0])
+    assert results['fwhm'][0] == pytest.approx(2.3548 * 30, rel=0.03)
+    assert results['emitted_flux'][0] == pytest.approx(1e12, rel=0.01)
+    assert np.isnan(results['plqy'][0])  # no generation given
+    assert results['bandgap'][0] == results['peak_energy'][0]  # no bandgap given -> PL peak
+
+
+def test_plqy_and_qfls_with_header_values():
+    wavelength, flux = gaussian_spectrum()
+    generation = 1e16  # photons/(s cm²) -> PLQY = 0.01 %
+    results = compute_pl_parameters([wavelength], [flux],
+                                    generation_current_density=[generation * ELEMENTARY_CHARGE * 1e3], bandgap=[1.62])
+
+    kT = BOLTZMANN_EV * TEMPERATURE
+    assert results['plqy'][0] == pytest.approx(0.01, rel=0.01)
+    assert results['bandgap'][0] == 1.62
+    assert results['qfls'][0] == pytest.approx(kT * np.log(1e12 / radiative_limit_flux(1.62)), abs=1e-3)
+    assert results['i_voc'][0] == results['qfls'][0]
+
+
+def test_numeric_data_with_broken_and_longer_rows():
+    lines = ['header', '500 1.0 10 2', '501 2.0 20 3 extra', 'broken row here', '502 3.0 30', '503 x 40 4']
+    wavelengths, lum_flux, raw_counts, dark_counts = parse_numeric_data(lines, 1, Logger())
+
+    # Like the old row by row parser: rows with extra columns keep their first three values
+    assert wavelengths.tolist() == [500, 501, 502]
+    assert lum_flux.tolist() == [1.0, 2.0, 3.0]
+    assert raw_counts.tolist() == [10, 20, 30]
+    assert dark_counts.tolist() == [2, 3]
+
+
+def test_numeric_data_in_one_block():
+    lines = ['500 1.0 10', '501 2.0 20']
+    wavelengths, lum_flux, raw_counts, dark_counts = parse_numeric_data(lines, 0, Logger())
+
+    assert wavelengths.tolist() == [500, 501] and raw_counts.tolist() == [10, 20]
+    assert len(dark_counts) == 0
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from nomad_perolab_umr.schema_packages.read_and_parse.stability_metrics import (
+    SMOOTHING_WINDOW,
+    compute_stability_metrics,
+)
+
+# The running median looks back over one window, so T-times are late by up to one window (0.1 h per point)
+LAG = SMOOTHING_WINDOW * 0.1
+
+
+def test_t_times_of_linear_decay():
+    # PCE 20 % -> linear loss of 0.05 % of the initial PCE per hour, T95 = 100 h, T80 = 400 h, T50 = 1000 h
+    time = np.arange(0, 1200, 0.1)
+    power_density = 20 * (1 - 0.0005 * time)
+    results = compute_stability_metrics(time, power_density)
+
+    assert results['initial_efficiency'] == pytest.approx(20, rel=2e-3)
+    assert results['t95'] == pytest.approx(100, abs=LAG)
+    assert results['t80'] == pytest.approx(400, abs=LAG)
+    assert results['t50'] == pytest.approx(1000, abs=LAG)
+
+
+def test_t50_not_reached_is_none():
+    time = np.arange(0, 100, 0.1)
+    results = compute_stability_metrics(time, 20 * (1 - 0.001 * time))
+
+    assert results['t95'] == pytest.approx(50, abs=LAG)
+    assert results['t80'] is None and results['t50'] is None
+
+
+def test_burn_in_and_linear_regime():
+    # Exponential burn-in of 10 % (time constant 10 h), then 0.01 % of the stabilized PCE per hour
+    time = np.arange(0, 1000, 0.1)
+    power_density = 18 * (1 - 0.0001 * time) + 2 * np.exp(-time / 10)
+    results = compute_stability_metrics(time, power_density)
+
+    assert results['stabilized_efficiency'] == pytest.approx(18, rel=0.01)
+    assert results['burn_in_loss'] == pytest.approx(10, abs=1)
+    assert 10 < results['burn_in_time'] < 60
+    assert results['linear_degradation_rate'] == pytest.approx(0.01, rel=0.05)
+
+
+def test_running_median_ignores_spikes_and_chunks():
+    time = np.arange(0, 200, 0.1)
+    power_density = 20 * (1 - 0.001 * time)
+    spiky = power_density.copy()
+    spiky[::50] = 0.0  # single outliers of the tracker
+
+    reference = compute_stability_metrics(time, power_density)
+    results = compute_stability_metrics(time, spiky, chunk_size=333)
+
+    assert results['t95'] == pytest.approx(reference['t95'], abs=0.5)
+    assert results['t80'] == pytest.approx(reference['t80'], abs=0.5)
+    assert results['initial_efficiency'] == pytest.approx(20, rel=2e-3)
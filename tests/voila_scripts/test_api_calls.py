@@ -0,0 +1,208 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+
+VOILA_SCRIPTS = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'src', 'nomad_perolab_umr', 'example_uploads', 'voila_scripts')
+sys.path.insert(0, os.path.abspath(VOILA_SCRIPTS))
+
+import api_calls  # noqa: E402
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    NOMAD API stub: /fail_once answers 503 once, /entries/query returns 3 pages of 2 entries,
+    GET of a path in server.files returns its content
+    """
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, so reused connections can be counted
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.client_address))
+        if self.path in getattr(self.server, 'files', {}):
+            content = self.server.files[self.path]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif self.path.startswith('/fail_once') and not self.server.failed:
+            self.server.failed = True
+            self._send(503, {'detail': 'busy'})
+        else:
+            self._send(200, {'ok': True})
+
+    def do_POST(self):
+        self.server.requests.append((self.path, self.client_address))
+        query = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        start = int(query['pagination'].get('page_after_value', 0))
+        size = query['pagination']['page_size']
+        entries = [{'entry_id': f'entry_{i}'} for i in range(start, min(start + size, 6))]
+        next_value = str(start + size) if start + size < 6 else None
+        self._send(200, {'data': entries, 'pagination': {'next_page_after_value': next_value}})
+
+
+@pytest.fixture
+def stub_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.requests = []
+    server.failed = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', server
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_retries_on_server_error(stub_url):
+    url, server = stub_url
+    with api_calls.NomadClient(url, token='token', backoff_factor=0) as client:
+        assert client.get('/fail_once') == {'ok': True}
+    assert [path for path, _ in server.requests] == ['/fail_once', '/fail_once']
+
+
+def test_iter_query_follows_cursor_on_one_connection(stub_url):
+    url, server = stub_url
+    entries = list(api_calls.iter_query(url, 'token', {'query': {}}, 'entries/query', page_size=2))
+    assert [entry['entry_id'] for entry in entries] == [f'entry_{i}' for i in range(6)]
+    assert len(server.requests) == 3
+    # pooled session: all pages are sent over the same keep-alive connection
+    assert len({address for _, address in server.requests}) == 1
+
+
+def test_run_concurrently_returns_results_in_call_order(stub_url):
+    url, server = stub_url
+    client = api_calls.get_client(url, 'token')
+    calls = [(client.post, '/entries/query', {'pagination': {'page_size': 2, 'page_after_value': start}})
+             for start in ('4', '0', '2')]
+    results = api_calls.run_concurrently(*calls)
+    assert [[entry['entry_id'] for entry in result['data']] for result in results] == [
+        ['entry_4', 'entry_5'], ['entry_0', 'entry_1'], ['entry_2', 'entry_3']]
+    assert len(server.requests) == 3
+
+
+class MeasurementStubHandler(StubHandler):
+    """
+    NOMAD API stub with samples and JV measurements (server.samples lab_id: entry_id,
+    server.measurements entry_id: (lab_id, last_processing_time, data)) for the LocalStore sync
+    """
+
+    def do_POST(self):
+        query = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.queries.append((self.path, query))
+        search = query['query']
+        measurements = self.server.measurements
+        if 'results.eln.lab_ids:any' in search:
+            entries = [{'entry_id': self.server.samples[lab_id]}
+                       for lab_id in search['results.eln.lab_ids:any'] if lab_id in self.server.samples]
+        elif 'entry_references.target_entry_id:any' in search:
+            targets = set(search['entry_references.target_entry_id:any'])
+            entries = [{'entry_id': entry_id, 'last_processing_time': time}
+                       for entry_id, (lab_id, time, _) in measurements.items() if f'sample_{lab_id}' in targets]
+        else:
+            entries = [{'entry_id': entry_id, 'archive': {
+                'data': {'samples': [{'lab_id': measurements[entry_id][0]}], **measurements[entry_id][2]},
+                'metadata': {'entry_id': entry_id, 'upload_id': 'upload'}}}
+                for entry_id in search['entry_id:any'] if entry_id in measurements]
+        start = int(query['pagination'].get('page_after_value', 0))
+        size = query['pagination']['page_size']
+        next_value = str(start + size) if start + size < len(entries) else None
+        self._send(200, {'data': entries[start:start + size], 'pagination': {'next_page_after_value': next_value}})
+
+
+@pytest.fixture
+def measurement_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MeasurementStubHandler)
+    server.queries = []
+    server.samples = {'S1': 'sample_S1', 'S2': 'sample_S2'}
+    server.measurements = {
+        'jv_1': ('S1', '2024-01-01', {'name': 'jv 1'}),
+        'jv_2': ('S1', '2024-01-01', {'name': 'jv 2'}),
+        'jv_3': ('S2', '2024-01-01', {'name': 'jv 3'}),
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', server
+    server.shutdown()
+    server.server_close()
+
+
+def downloaded_entry_ids(server):
+    return [entry_id for path, query in server.queries if path == '/entries/archive/query'
+            for entry_id in query['query']['entry_id:any']]
+
+
+def test_local_store_refresh_downloads_changed_entries_in_chunks(measurement_stub, tmp_path):
+    local_store = pytest.importorskip('local_store')
+    url, server = measurement_stub
+    with local_store.LocalStore(str(tmp_path / 'store.sqlite')) as store:
+        assert store.refresh(url, 'token', ['S1', 'S2'], 'jv', page_size=2) == (3, 0)
+        # 3 changed entries with page_size 2 are downloaded in 2 chunks
+        chunks = [query['query']['entry_id:any'] for path, query in server.queries if path == '/entries/archive/query']
+        assert chunks == [['jv_1', 'jv_2'], ['jv_3']]
+        assert [(lab_id, data['name']) for lab_id, data, _ in store.iter_measurements('jv', ['S1', 'S2'])] == [
+            ('S1', 'jv 1'), ('S1', 'jv 2'), ('S2', 'jv 3')]
+        assert store.last_sync('jv') is not None
+
+        # nothing changed on the server -> nothing is downloaded
+        server.queries.clear()
+        assert store.refresh(url, 'token', ['S1', 'S2'], 'jv', page_size=2) == (0, 0)
+        assert downloaded_entry_ids(server) == []
+
+
+def test_local_store_refresh_updates_changed_and_removes_deleted_entries(measurement_stub, tmp_path):
+    local_store = pytest.importorskip('local_store')
+    url, server = measurement_stub
+    with local_store.LocalStore(str(tmp_path / 'store.sqlite')) as store:
+        store.refresh(url, 'token', ['S1', 'S2'], 'jv')
+
+        server.measurements['jv_2'] = ('S1', '2024-02-01', {'name': 'jv 2 reprocessed'})
+        del server.measurements['jv_3']
+        server.queries.clear()
+        assert store.refresh(url, 'token', ['S1', 'S2'], 'jv') == (1, 1)
+        assert downloaded_entry_ids(server) == ['jv_2']
+        assert {lab_id: [data['name'] for data, _ in measurements]
+                for lab_id, measurements in store.get_measurements('jv', ['S1', 'S2']).items()} == {
+            'S1': ['jv 1', 'jv 2 reprocessed']}
+
+        # a sample which is not visible anymore -> all its stored entries are removed
+        del server.samples['S1']
+        assert store.refresh(url, 'token', ['S1'], 'jv') == (0, 2)
+        assert list(store.iter_measurements('jv', ['S1', 'S2'])) == []
+
+
+def test_load_hdf5_arrays_downloads_the_arrays_of_the_references(stub_url, tmp_path):
+    h5py = pytest.importorskip('h5py')
+    url, server = stub_url
+    with h5py.File(tmp_path / 'arrays.h5', 'w') as h5:
+        h5['data/jv_curve/0/voltage'] = [0.0, 0.5, 1.0]
+        h5['data/jv_curve/0/current_density'] = [-20.0, -10.0, 5.0]
+    server.files = {'/uploads/upload/raw/JV/a%20b.txt.archive.json.arrays.h5': (tmp_path / 'arrays.h5').read_bytes()}
+    file_name = 'JV/a b.txt.archive.json.arrays.h5'
+    data = {'jv_curve': [
+        {'cell_name': 'a', 'hdf5_arrays': [f'{file_name}#data/jv_curve/0/voltage',
+                                           f'{file_name}#data/jv_curve/0/current_density']},
+        {'cell_name': 'b', 'voltage': [0.0, 1.0]},
+    ]}
+
+    assert api_calls.load_hdf5_arrays(url, 'token', 'upload', data) is data
+    assert data['jv_curve'][0]['voltage'] == [0.0, 0.5, 1.0]
+    assert data['jv_curve'][0]['current_density'] == [-20.0, -10.0, 5.0]
+    assert data['jv_curve'][1] == {'cell_name': 'b', 'voltage': [0.0, 1.0]}
+    assert len(server.requests) == 1  # one download per file
@@ -0,0 +1,167 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip('plotly')
+pytest.importorskip('openpyxl')
+
+JV_ANALYSIS = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'src', 'nomad_perolab_umr', 'example_uploads', 'voila_scripts', 'JV_Analysis')
+sys.path.insert(0, os.path.abspath(JV_ANALYSIS))
+
+import main  # noqa: E402
+
+
+def jv_curve(cell_name, arrays=True):
+    curve = {
+        'cell_name': cell_name, 'open_circuit_voltage': 1.1, 'short_circuit_current_density': -22.0,
+        'fill_factor': 0.8, 'efficiency': 19.4, 'potential_at_maximum_power_point': 0.95,
+        'current_density_at_maximun_power_point': -20.4, 'series_resistance': 3.0, 'shunt_resistance': 2000.0,
+    }
+    if arrays:
+        curve['voltage'] = list(np.linspace(-0.1, 1.2, 5))
+        curve['current_density'] = list(np.linspace(-22, 5, 5))
+    else:
+        curve['hdf5_arrays'] = ['JV/a.txt.archive.json.arrays.h5#data/jv_curve/0/voltage']
+    return curve
+
+
+def measurement(curves, **data):
+    return 'UMR_1_C-1', dict(data_file='JV_a.txt', jv_curve=curves, **data), dict(upload_id='upload')
+
+
+def test_curves_without_arrays_keep_their_parameters():
+    measurements = [measurement([jv_curve('a Rev', arrays=False), jv_curve('a For')])]
+    df_jvc, df_cur = main.jv_frames_from_measurements(measurements)
+
+    assert len(df_jvc) == 2
+    assert df_jvc['Jsc(mA/cm2)'].tolist() == [22.0, 22.0]
+    assert len(df_cur) == 2  # voltage and current density of the forward curve
+    assert set(df_cur['direction']) == {'Forward'}
+
+
+def test_hysteresis_only_on_light_reverse_row():
+    curves = [jv_curve('a Rev'), jv_curve('a For'), jv_curve('a Rev dark'), jv_curve('a For dark')]
+    df_jvc, _ = main.jv_frames_from_measurements(
+        [measurement(curves, hysteresis_index=0.05, hysteresis_area=1.5)])
+
+    has_hi = df_jvc['HI(%)'].notna()
+    assert has_hi.sum() == 1
+    assert df_jvc.loc[has_hi, ['direction', 'ilum']].values.tolist() == [['Reverse', 'Light']]
+    assert df_jvc.loc[has_hi, 'HI(%)'].iloc[0] == pytest.approx(5.0)
+    assert df_jvc['Hysteresis_area(mW/cm2)'].notna().sum() == 1
+
+
+def test_hysteresis_of_folder_frames():
+    # Layout of load_files: one row per scan, the curves as rows with the points in numbered columns
+    pd = main.pd
+    meta = dict(sample='1', batch='b', condition=pd.NA, cell='A')
+    jvc = pd.DataFrame([
+        dict(meta, direction='Reverse', ilum='Light', **{'PCE(%)': 20.0, 'Voc(V)': 1.0}),
+        dict(meta, direction='Forward', ilum='Light', **{'PCE(%)': 18.0, 'Voc(V)': 0.9}),
+        dict(meta, direction='Reverse', ilum='Dark', **{'PCE(%)': 0.0, 'Voc(V)': np.nan}),
+    ])
+    voltage = np.linspace(0, 1, 11)
+    rows = []
+    for direction, offset in [('Reverse', 0.0), ('Forward', 2.0)]:
+        for variable, values in [('Voltage (V)', voltage), ('Current Density(mA/cm2)', -20 + 20 * voltage + offset)]:
+            row = dict(meta, index=variable, variable=variable, direction=direction, ilum='Light')
+            row.update(enumerate(values))
+            rows.append(row)
+    result = main.add_hysteresis(jvc, pd.DataFrame(rows))
+
+    assert result['HI(%)'].tolist()[0] == pytest.approx(10.0)
+    assert result['Hysteresis_area(mW/cm2)'].tolist()[0] == pytest.approx(2.0)  # 2 mA/cm² between 0 and 1 V
+    assert result[['HI(%)', 'Hysteresis_area(mW/cm2)']].iloc[1:].isna().all().all()
+
+
+def test_excel_export_keeps_the_frames_as_they_were_added():
+    pd = main.pd
+    data = pd.DataFrame({'sample': ['a', 'b'], 'PCE(%)': [-19.5, 18.0]})
+    export = main.ExcelExport()
+    export.add_dataframe_sheet('All_data', data)
+    data['PCE(%)'] = data['PCE(%)'].abs()
+    data.loc[0, 'sample'] = 'renamed'
+
+    rows = [list(row) for row in export.iter_rows('All_data')]
+    assert rows[-2:] == [[0, 'a', -19.5], [1, 'b', 18.0]]
+
+
+def test_missing_parameters_are_nan():
+    curve = jv_curve('a Rev')
+    del curve['fill_factor'], curve['series_resistance']
+    df_jvc, _ = main.jv_frames_from_measurements([measurement([curve])])
+
+    assert np.isnan(df_jvc['FF(%)'].iloc[0])
+    assert np.isnan(df_jvc['R_series(Ohmcm2)'].iloc[0])
+    assert df_jvc['PCE(%)'].iloc[0] == pytest.approx(19.4)
+
+
+def test_filter_spec_combines_and_deduplicates_conditions():
+    spec = main.FilterSpec([('PCE(%)', '<', 40), ('FF(%)', '>', ' 24 ')])
+    combined = spec + [('PCE(%)', '<', '40'), ('Voc(V)', '<', 2)]
+
+    assert combined.labels() == ['PCE(%) < 40', 'FF(%) > 24', 'Voc(V) < 2']
+    assert spec + [] == spec and hash(spec + []) == hash(spec)
+    with pytest.raises(ValueError):
+        main.FilterSpec([('PCE(%)', '=>', 1)])
+
+
+def test_filter_engine_sets_one_bit_per_failed_condition():
+    df = main.pd.DataFrame({'PCE(%)': [10.0, 50.0, np.nan, 20.0], 'FF(%)': [80.0, 80.0, 80.0, 20.0]})
+    spec = main.FilterSpec([('PCE(%)', '<', 40), ('FF(%)', '>', 24)])
+    engine = main.FilterEngine(df)
+
+    bits = engine.mask(spec)
+    assert bits.tolist() == [0, 1, 1, 2]  # NaN fails the condition like in the comparison
+    assert engine.mask(spec) is bits
+    assert main.decode_filter_reasons(bits, spec.labels()) == ['', 'PCE(%) < 40', 'PCE(%) < 40', 'FF(%) > 24']
+
+
+def test_filter_engine_recomputes_columns_changed_in_place():
+    df = main.pd.DataFrame({'PCE(%)': [10.0, 50.0], 'FF(%)': [80.0, 80.0]})
+    spec = main.FilterSpec([('PCE(%)', '<', 40), ('FF(%)', '>', 24)])
+    engine = main.get_filter_engine(df)
+    assert engine.mask(spec).tolist() == [0, 1]
+    ff_failed = engine.failed(('FF(%)', '>', '24'))
+
+    df.loc[0, 'PCE(%)'] = 45.0
+    assert main.get_filter_engine(df) is engine
+    assert engine.mask(spec).tolist() == [1, 1]
+    assert engine.failed(('FF(%)', '>', '24')) is ff_failed  # unchanged column is not compared again
+
+
+def group_frame():
+    return main.pd.DataFrame({'sample': ['2', '1', '2', '1'], 'direction': ['Reverse', 'Reverse', 'Forward', 'Reverse'],
+                              'PCE(%)': [18.0, 15.0, np.nan, 17.0], 'FF(%)': [80.0, 70.0, 75.0, 72.0]})
+
+
+def test_group_statistics_match_groupby():
+    data = group_frame()
+    stats = main.GroupStatistics(data, ('sample',))
+
+    assert stats.parameters == ['FF(%)', 'PCE(%)']
+    assert stats.counts('PCE(%)') == {'1': 2, '2': 1}
+    assert stats.values('1', 'PCE(%)').tolist() == [15.0, 17.0]
+    assert stats.values('3', 'PCE(%)').empty
+    assert stats.median('1', 'PCE(%)') == pytest.approx(16.0)
+    assert stats.mean('2', 'FF(%)') == pytest.approx(77.5)
+    main.pd.testing.assert_frame_equal(stats.descriptor('FF(%)'), data.groupby('sample')['FF(%)'].describe())
+
+    paired = main.GroupStatistics(data, ('sample', 'direction'))
+    assert paired.values(('1', 'Reverse'), 'FF(%)').tolist() == [70.0, 72.0]
+
+
+def test_group_statistics_cache_follows_in_place_changes():
+    data, cache = group_frame(), {}
+    stats = main.get_group_statistics(data, 'sample', cache)
+    assert main.get_group_statistics(data, ['sample'], cache) is stats
+    assert main.get_group_statistics(group_frame(), 'sample', cache) is not stats  # other frame, same content
+
+    data['sample'] = data['sample'].astype(int)
+    assert list(main.get_group_statistics(data, 'sample', cache).groups()) == [1, 2]
+    data.loc[0, 'PCE(%)'] = 10.0
+    assert main.get_group_statistics(data, 'sample', cache).mean(2, 'PCE(%)') == pytest.approx(10.0)
+    assert main.get_group_counts(data, 'sample', 'PCE(%)', cache) == {1: 2, 2: 1}